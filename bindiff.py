@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Byte-level binary compare for Beyond Compare + Meld Clone
+Both files are mmapped, the common head and tail are skipped bytewise and
+the middle is cut into content-defined chunks with a rolling hash, so an
+insertion only disturbs the chunks around it; the chunk hashes are diffed
+like lines and changed chunks are narrowed down to the bytes that differ
+"""
+
+import os
+import mmap
+import hashlib
+from dataclasses import dataclass, field
+from typing import List
+
+import numpy as np
+
+from diffcore import get_opcodes
+from streamdiff import _common_prefix, _common_suffix
+
+# Rolling hash window and chunk sizes (average about 2 ** AVG_BITS bytes)
+WINDOW = 32
+AVG_BITS = 12
+MIN_CHUNK = 1 << 10
+MAX_CHUNK = 1 << 16
+
+# Bytes scanned per NumPy block
+BLOCK = 1 << 20
+
+# Changed regions up to this size are narrowed down byte by byte
+REFINE = 1 << 20
+
+# Changed chunks of unequal length up to this size are aligned byte by
+# byte, if at least SIMILAR of the shorter one's SHINGLE-byte substrings
+# also occur in the other; unrelated chunks stay one replace region
+ALIGN = 4096
+SIMILAR = 0.5
+SHINGLE = 4
+
+# Differing bytes closer than this are reported as one region
+GAP = 8
+
+# Bytes per hex view row
+ROW_BYTES = 16
+
+_GEAR = np.random.default_rng(0x5EED).integers(0, 1 << 32, 256, dtype=np.uint32)
+_MASK = np.uint32((1 << AVG_BITS) - 1)
+
+
+@dataclass
+class Region:
+    """A differing byte range: [a0, a1) on the left, [b0, b1) on the right"""
+    tag: str        # "replace", "delete" or "insert"
+    a0: int
+    a1: int
+    b0: int
+    b1: int
+
+
+@dataclass
+class BinDiff:
+    left_size: int
+    right_size: int
+    regions: List[Region] = field(default_factory=list)
+
+    @property
+    def identical(self):
+        return not self.regions
+
+    @property
+    def changed_bytes(self):
+        """Bytes differing on the larger side of each region"""
+        return sum(max(r.a1 - r.a0, r.b1 - r.b0) for r in self.regions)
+
+
+def open_map(path):
+    """Read-only mmap of a file, or b"" if it is empty"""
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _anchors(mm, start, stop, tick=None):
+    """Content-defined cut points between start and stop
+
+    The hash at a position is the sum of gear values of the WINDOW bytes
+    before it, so it depends only on nearby content and cut points move
+    along with inserted or deleted bytes.
+    """
+    cuts = []
+    last = start
+    pos = start
+    while pos < stop:
+        # Each block re-reads WINDOW bytes so hashes carry over block borders
+        lo = max(start, pos - WINDOW)
+        hi = min(stop, pos + BLOCK)
+        # Sliced, not viewed, so no buffer export keeps the mmap from closing
+        data = np.frombuffer(mm[lo:hi], np.uint8)
+        sums = np.zeros(len(data) + 1, np.uint32)
+        np.cumsum(_GEAR[data], dtype=np.uint32, out=sums[1:])
+        # h[k] covers the window ending at lo + WINDOW + k; sums wrap harmlessly
+        h = sums[WINDOW:] - sums[:-WINDOW]
+        first = 0 if lo == start else 1
+        for p in (np.nonzero((h[first:] & _MASK) == 0)[0] + (lo + WINDOW + first)).tolist():
+            while p - last > MAX_CHUNK:
+                last += MAX_CHUNK
+                cuts.append(last)
+            if p - last >= MIN_CHUNK:
+                cuts.append(p)
+                last = p
+        pos = hi
+        if tick:
+            tick(hi - start)
+    while stop - last > MAX_CHUNK:
+        last += MAX_CHUNK
+        cuts.append(last)
+    if last < stop:
+        cuts.append(stop)
+    return cuts
+
+
+def _chunks(mm, start, stop, tick=None):
+    """(offsets, digests) of the content-defined chunks of mm[start:stop]"""
+    offsets, digests = [start], []
+    for cut in _anchors(mm, start, stop, tick):
+        digests.append(hashlib.blake2b(mm[offsets[-1]:cut], digest_size=8).digest())
+        offsets.append(cut)
+    return offsets, digests
+
+
+def _similar(x, y):
+    """Whether two byte strings share most of their short substrings"""
+    sx = {x[k:k + SHINGLE] for k in range(len(x) - SHINGLE + 1)}
+    sy = {y[k:k + SHINGLE] for k in range(len(y) - SHINGLE + 1)}
+    if not (sx and sy):
+        return False
+    return len(sx & sy) >= SIMILAR * min(len(sx), len(sy))
+
+
+def _aligned(x, y, a0, b0, out):
+    """Byte-level regions of two similar chunks, those GAP apart merged"""
+    last = None
+    for tag, i1, i2, j1, j2 in get_opcodes(list(x), list(y)):
+        if tag == "equal":
+            continue
+        if last and a0 + i1 - last.a1 <= GAP and b0 + j1 - last.b1 <= GAP:
+            last.tag, last.a1, last.b1 = "replace", a0 + i2, b0 + j2
+            continue
+        last = Region(tag, a0 + i1, a0 + i2, b0 + j1, b0 + j2)
+        out.append(last)
+
+
+def _refine(a, b, r, out):
+    """Narrow a changed region down to the bytes that differ"""
+    la, lb = r.a1 - r.a0, r.b1 - r.b0
+    if la != lb and max(la, lb) <= REFINE:
+        # Chunks around an insertion or deletion share most of their bytes
+        x, y = a[r.a0:r.a1], b[r.b0:r.b1]
+        p = _common_prefix(x, y, min(la, lb))
+        q = _common_suffix(x, la, y, lb, min(la, lb) - p)
+        r = Region(r.tag, r.a0 + p, r.a1 - q, r.b0 + p, r.b1 - q)
+        la, lb = r.a1 - r.a0, r.b1 - r.b0
+        if not (la and lb):
+            out.append(Region("insert" if lb else "delete", r.a0, r.a1, r.b0, r.b1))
+            return
+    if la != lb or not la or la > REFINE:
+        if la and lb and max(la, lb) <= ALIGN:
+            # Small enough to align byte by byte, if the chunks are related;
+            # the diff engine's cost cap bounds the work either way
+            x, y = a[r.a0:r.a1], b[r.b0:r.b1]
+            if _similar(x, y):
+                _aligned(x, y, r.a0, r.b0, out)
+                return
+        out.append(Region("replace" if la and lb else r.tag, r.a0, r.a1, r.b0, r.b1))
+        return
+    # Same length: compare in place, merging runs of differences GAP apart
+    x = np.frombuffer(a[r.a0:r.a1], np.uint8)
+    y = np.frombuffer(b[r.b0:r.b1], np.uint8)
+    idx = np.nonzero(x != y)[0]
+    if not len(idx):
+        return
+    breaks = np.nonzero(np.diff(idx) > GAP)[0]
+    starts = np.concatenate(([idx[0]], idx[breaks + 1]))
+    ends = np.concatenate((idx[breaks], [idx[-1]])) + 1
+    d = r.b0 - r.a0
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        out.append(Region("replace", r.a0 + s, r.a0 + e, r.a0 + s + d, r.a0 + e + d))
+
+
+def diff_maps(a, b, progress=None):
+    """Compare two byte buffers (mmaps) and return a BinDiff
+
+    progress(done, total), if given, is called as the buffers are chunked
+    and may raise to abort.
+    """
+    na, nb = len(a), len(b)
+    res = BinDiff(na, nb)
+    p = _common_prefix(a, b, min(na, nb))
+    s = _common_suffix(a, na, b, nb, min(na, nb) - p)
+    ea, eb = na - s, nb - s
+    if p == ea and p == eb:
+        return res
+
+    total = (ea - p) + (eb - p)
+    tick_a = tick_b = None
+    if progress:
+        tick_a = lambda done: progress(done, total)
+        tick_b = lambda done: progress(ea - p + done, total)
+    oa, ha = _chunks(a, p, ea, tick_a)
+    ob, hb = _chunks(b, p, eb, tick_b)
+
+    for tag, i1, i2, j1, j2 in get_opcodes(ha, hb, "histogram"):
+        if tag != "equal":
+            _refine(a, b, Region(tag, oa[i1], oa[i2], ob[j1], ob[j2]), res.regions)
+    return res
+
+
+def compare_binary(left_path, right_path, progress=None):
+    """Byte-level compare of two files of any size"""
+    a, b = open_map(left_path), open_map(right_path)
+    try:
+        return diff_maps(a, b, progress)
+    finally:
+        for mm in (a, b):
+            if isinstance(mm, mmap.mmap):
+                mm.close()
+
+
+def hex_row(data, offset):
+    """One hex view row: offset, hex bytes and printable characters"""
+    hexes = " ".join(f"{c:02x}" for c in data).ljust(ROW_BYTES * 3 - 1)
+    text = "".join(chr(c) if 32 <= c < 127 else "." for c in data)
+    return f"{offset:08x}  {hexes}  {text}"
+
+
+def hex_columns(k):
+    """Character columns of byte k of a row in the hex and text parts"""
+    return 10 + 3 * k, 10 + ROW_BYTES * 3 + 1 + k
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Command-line batch mode for Beyond Compare + Meld Clone
+codeCompare --left A --right B [--format unified|json|jsonl|html] [--jobs N]
+codeCompare --left A --right B --base O    (three-way merge; exit 1 on conflicts)
+"""
+
+import os
+import sys
+import json
+import argparse
+from dataclasses import asdict
+from html import escape
+
+from diffcore import (
+    DEFAULT_HASH, DIFF_ALGORITHMS, HASH_ALGORITHMS, DiffOptions, TextDiff,
+    compare_files, detect_type, iter_tree
+)
+from formats import handler, is_table
+from merge3 import merge_files
+from report import (
+    HTML_HEAD, changed_lines, file_patch, line_fields, write_result, write_stream, write_tree
+)
+from streamdiff import LARGE_FILE, line_text, stream_opcodes
+
+# Exit codes, as in diff(1)
+SAME, DIFFERENT, TROUBLE = 0, 1, 2
+
+
+def _parser():
+    p = argparse.ArgumentParser(
+        prog="codeCompare",
+        description="Compare two files or folders without starting the GUI.")
+    p.add_argument("--left", required=True, help="left file or folder")
+    p.add_argument("--right", required=True, help="right file or folder")
+    p.add_argument("--format", choices=("unified", "json", "jsonl", "html"), default="unified",
+                   help="jsonl writes one JSON record per line, so huge diffs stream")
+    p.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                   help="worker processes for folder content comparison")
+    p.add_argument("--output", "-o", help="write to this file instead of stdout")
+    p.add_argument("--algorithm", choices=DIFF_ALGORITHMS, default="myers")
+    p.add_argument("--hash", choices=HASH_ALGORITHMS, default=DEFAULT_HASH,
+                   help="content hash for binary and folder compares")
+    p.add_argument("--no-cache", action="store_true", help="do not use the persistent hash cache")
+    p.add_argument("--context", "-U", type=int, default=3, help="unified context lines")
+    p.add_argument("--ignore-ws", action="store_true", help="ignore whitespace")
+    p.add_argument("--ignore-case", action="store_true", help="ignore case")
+    p.add_argument("--ignore-blank", action="store_true", help="ignore blank lines")
+    p.add_argument("--fast", action="store_true", help="folders: trust size + mtime")
+    p.add_argument("--stream", action="store_true",
+                   help="files: memory-bounded text compare (automatic above "
+                        f"{LARGE_FILE >> 20} MiB)")
+    p.add_argument("--table", action="store_true",
+                   help="files: cell-level compare of CSV/TSV files (automatic for Excel)")
+    p.add_argument("--key", help="table compare: align rows on this column instead of row content")
+    p.add_argument("--base", help="files: three-way merge LEFT and RIGHT against this common "
+                                  "ancestor; writes the merged file, conflicts marked")
+    return p
+
+
+def _report(args):
+    """report.py format for --format (json is the single-document format of this module)"""
+    return "patch" if args.format == "unified" else args.format
+
+
+def _streamed(lp, rp, args):
+    """Whether a file pair is compared in streaming mode"""
+    types = {detect_type(lp), detect_type(rp)}
+    if args.stream:
+        return not types & {"image", "excel", "docx"}
+    large = max(os.path.getsize(lp), os.path.getsize(rp)) > LARGE_FILE
+    return large and types == {"text"}
+
+
+def _tabular(lp, rp, args):
+    """Whether a file pair is compared cell by cell"""
+    types = {detect_type(lp), detect_type(rp)}
+    if types == {"excel"}:
+        return True
+    return args.table and is_table(lp) and is_table(rp)
+
+
+# ----------------------------------------------------------------------
+# File pair output
+# ----------------------------------------------------------------------
+
+def _file_json(res, args, out):
+    doc = {"left": args.left, "right": args.right, "identical": res.identical}
+    if isinstance(res, TextDiff):
+        doc["algorithm"] = res.algorithm
+        # Lines of the files, as in the jsonl records, not rows of the panes
+        doc["differences"] = [line_fields(*line) for line in changed_lines(res.align, res.items)]
+    else:
+        doc["left_hash"], doc["right_hash"] = res.left_hash, res.right_hash
+    json.dump(doc, out, ensure_ascii=False, indent=1)
+    out.write("\n")
+
+
+def _file_merge(args, out):
+    """Three-way merge output; returns True if no conflicts remain"""
+    res = merge_files(args.base, args.left, args.right, args.algorithm)
+    if args.format == "json":
+        doc = {"base": args.base, "left": args.left, "right": args.right,
+               "conflicts": len(res.conflicts),
+               "hunks": [asdict(h) for h in res.hunks if h.tag != "same"]}
+        json.dump(doc, out, ensure_ascii=False, indent=1)
+        out.write("\n")
+    elif args.format == "jsonl":
+        out.write(json.dumps({"record": "merge", "base": args.base, "left": args.left,
+                              "right": args.right}, ensure_ascii=False) + "\n")
+        for h in res.hunks:
+            if h.tag != "same":
+                out.write(json.dumps({"record": "hunk", **asdict(h)}) + "\n")
+        out.write(json.dumps({"record": "summary", "conflicts": len(res.conflicts)}) + "\n")
+    elif args.format == "html":
+        out.write(HTML_HEAD.format(title=escape(f"{args.left} ↔ {args.right} (base {args.base})")))
+        out.write("<table>\n")
+        css = {"same": "same", "left": "removed", "right": "added", "both": "changed", "conflict": "moved"}
+        n = 0
+        for h in res.hunks:
+            for line in res.hunk_lines(h):
+                n += 1
+                out.write(f'<tr><td class="num">{n}</td><td class="{css[h.tag]}">{escape(line)}</td></tr>\n')
+        out.write("</table>\n</body></html>\n")
+    else:
+        res.write(out)
+    return not res.conflicts
+
+
+def _file_stream(args, opts, out):
+    """Streamed output for a large file pair; returns True if identical"""
+    if args.format != "json":
+        return write_stream(out, _report(args), args.left, args.right, opts, args.context)
+
+    # Hunks are written as they are found, so the document is never held whole
+    ops = (op for op in stream_opcodes(args.left, args.right, opts, 0) if op[0] != "equal")
+    out.write("{\n" f' "left": {json.dumps(args.left, ensure_ascii=False)},\n'
+              f' "right": {json.dumps(args.right, ensure_ascii=False)},\n'
+              f' "algorithm": {json.dumps(opts.algorithm)},\n'
+              ' "hunks": [')
+    same = True
+    for tag, i1, i2, j1, j2, la, lb in ops:
+        hunk = {"type": tag, "left": [i1 + 1, i2], "right": [j1 + 1, j2],
+                "removed": [line_text(x) for x in la], "added": [line_text(x) for x in lb]}
+        out.write(("\n  " if same else ",\n  ") + json.dumps(hunk, ensure_ascii=False))
+        same = False
+    out.write(f'\n ],\n "identical": {json.dumps(same)}\n}}\n')
+    return same
+
+
+def _file_table(args, out):
+    """Cell-level output for two spreadsheets; returns True if identical"""
+    # pandas is only loaded here, so plain text compares do not pay for it
+    res = handler("table").compare_tables(args.left, args.right, args.key)
+    if args.format == "json":
+        doc = asdict(res)
+        doc["identical"] = res.identical
+        json.dump(doc, out, ensure_ascii=False, indent=1)
+        out.write("\n")
+    elif args.format == "jsonl":
+        out.write(json.dumps({"record": "table", "left": args.left, "right": args.right,
+                              "key": args.key}, ensure_ascii=False) + "\n")
+        fields = ("sheet", "change", "row", "column", "left", "right")
+        for change in res.changes():
+            out.write(json.dumps({"record": "cell", **dict(zip(fields, change))},
+                                 ensure_ascii=False) + "\n")
+        out.write(json.dumps({"record": "summary", "identical": res.identical}) + "\n")
+    elif args.format == "html":
+        out.write(HTML_HEAD.format(title=escape(f"{args.left} ↔ {args.right}")))
+        out.write("<table>\n<tr><th>Sheet</th><th>Change</th><th>Row</th><th>Column</th>"
+                  "<th>Left</th><th>Right</th></tr>\n")
+        for change in res.changes():
+            # "Row added" -> class "added", and so on
+            cells = "".join(f"<td>{escape(str(c))}</td>" for c in change)
+            out.write(f'<tr class="{change[1].split()[-1]}">{cells}</tr>\n')
+        out.write("</table>\n")
+        if res.identical:
+            out.write("<p>Identical</p>\n")
+        out.write("</body></html>\n")
+    elif not res.identical:
+        out.write(f"--- {args.left}\n+++ {args.right}\n")
+        for line in res.report():
+            out.write(line + "\n")
+    return res.identical
+
+
+# ----------------------------------------------------------------------
+# Folder output
+# ----------------------------------------------------------------------
+
+def _tree_json(entries, args, out):
+    # Entries are written as they arrive; the verdict comes last
+    out.write("{\n" f' "left": {json.dumps(args.left, ensure_ascii=False)},\n'
+              f' "right": {json.dumps(args.right, ensure_ascii=False)},\n'
+              ' "entries": [')
+    same = first = True
+    for e in entries:
+        same = same and e.status == "Identical"
+        out.write(("\n  " if first else ",\n  ") + json.dumps(asdict(e), ensure_ascii=False))
+        first = False
+    out.write(f'\n ],\n "identical": {json.dumps(same)}\n}}\n')
+    return same
+
+
+def run(args, out):
+    """Run one comparison and write it to out; returns the exit code"""
+    opts = DiffOptions(args.ignore_ws, args.ignore_case, args.ignore_blank, args.algorithm)
+
+    if os.path.isdir(args.left) and os.path.isdir(args.right):
+        entries = iter_tree(args.left, args.right, args.fast, max(1, args.jobs),
+                            args.hash, not args.no_cache)
+        if args.format == "json":
+            same = _tree_json(entries, args, out)
+        else:
+            same = write_tree(out, _report(args), args.left, args.right, entries,
+                              lambda lp, rp: file_patch(lp, rp, opts, args.context, args.hash,
+                                                        not args.no_cache, args.stream))
+        return SAME if same else DIFFERENT
+
+    if os.path.isfile(args.left) and os.path.isfile(args.right):
+        if args.base:
+            return SAME if _file_merge(args, out) else DIFFERENT
+        if _tabular(args.left, args.right, args):
+            return SAME if _file_table(args, out) else DIFFERENT
+        if _streamed(args.left, args.right, args):
+            return SAME if _file_stream(args, opts, out) else DIFFERENT
+        res = compare_files(args.left, args.right, opts, args.hash, not args.no_cache)
+        if args.format == "json":
+            _file_json(res, args, out)
+        else:
+            write_result(out, _report(args), res, args.left, args.right, args.context)
+        return SAME if res.identical else DIFFERENT
+
+    raise ValueError("--left and --right must both be files or both be folders")
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    try:
+        if args.output:
+            with open(args.output, "w", encoding="utf-8", newline="\n") as out:
+                return run(args, out)
+        return run(args, sys.stdout)
+    except (OSError, ValueError) as e:
+        print(f"codeCompare: {e}", file=sys.stderr)
+        return TROUBLE
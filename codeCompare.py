@@ -5,27 +5,436 @@ Proper alignment, blank line handling, and move detection
 """
 
 import os
-import re
-import hashlib
-import zipfile
-import mimetypes
+import sys
+import time
+
+# Taken before the imports below, so --bench-startup counts them
+_STARTED = time.perf_counter()
+
 import threading
-import xml.etree.ElementTree as ET
+import multiprocessing
+from bisect import bisect_right
 from datetime import datetime
-from difflib import SequenceMatcher, unified_diff
+from itertools import islice
 from tkinter import (
     filedialog, messagebox, ttk, Toplevel,
     StringVar, BooleanVar, Canvas,
-    END, LEFT, RIGHT, TOP, BOTTOM,
+    END, LEFT, RIGHT, TOP, BOTTOM, LAST,
     X, Y, BOTH, HORIZONTAL, VERTICAL
 )
+from tkinter import font as tkfont
 from tkinter.scrolledtext import ScrolledText
 import ttkbootstrap as tb
 from ttkbootstrap.constants import (
     PRIMARY, SUCCESS, WARNING, SECONDARY, INFO, OUTLINE, DANGER
 )
-import pandas as pd
-from PIL import Image, ImageTk
+
+from diffcore import (
+    DEFAULT_HASH, DIFF_ALGORITHMS, HASH_ALGORITHMS, Alignment, Cancelled,
+    DiffItems, DiffOptions, FolderCompare, MergeJournal, compare_files, compare_text,
+    detect_type, extract_lines, inline_diff, iter_tree, read_lines, write_lines
+)
+from formats import handler, is_table
+from merge3 import merge3
+from report import file_patch, report_format, write_diff, write_result, write_stream, write_tree
+from streamdiff import LARGE_FILE, stream_unified
+from syntax import TAGS as SYNTAX_TAGS, Highlighter, lexer_for
+
+# Lines of a streamed diff shown before the view is cut off
+STREAM_LINES = 100_000
+
+# Milliseconds from launch to a drawn window, checked by --bench-startup
+STARTUP_BUDGET = 300
+
+# Loaded by format handlers on demand; importing them at startup is a bug
+LAZY_MODULES = ("pandas", "numpy", "tabular", "imagediff", "bindiff")
+
+
+class VirtualPane:
+    """Renders a window of one Alignment side into a Text widget
+
+    Only the visible rows plus MARGIN rows either side are inserted, so
+    memory and redraw time depend on the screen height, not the file size.
+    """
+
+    MARGIN = 100
+
+    def __init__(self, text, nums, side):
+        self.text = text
+        self.nums = nums
+        self.side = side            # Alignment side: 0 = left, 1 = right
+        self.start = self.stop = 0  # rendered rows [start, stop)
+        self.rendered = None        # rendered row texts, for edit detection
+        self.line_height = tkfont.Font(font=text["font"]).metrics("linespace")
+
+    def visible_rows(self):
+        return max(1, self.text.winfo_height() // self.line_height)
+
+    def covers(self, top, height):
+        return self.rendered is not None and self.start <= top and top + height <= self.stop
+
+    def render(self, align, top, height):
+        """Insert rows around top, keeping the cursor on its row"""
+        w = self.text
+        ins_line, ins_col = map(int, w.index("insert").split("."))
+        ins_row = self.start + ins_line - 1
+
+        self.start = max(0, top - self.MARGIN)
+        self.stop = min(len(align), top + height + self.MARGIN)
+        lines = align.texts(self.side, self.start, self.stop)
+
+        w.delete("1.0", END)
+        w.insert("1.0", "\n".join(lines))
+        ranges = {}
+        tags = align.row_tags(self.side, self.start, self.stop)
+        other = align.row_tags(1 - self.side, self.start, self.stop)
+        for i, tag in enumerate(tags, 1):
+            if tag:
+                ranges.setdefault(tag, []).extend((f"{i}.0", f"{i}.end"))
+            if tag == other[i - 1] == "changed":
+                # Differing words of a paired line, diffed only once rendered
+                mine, theirs = lines[i - 1], align.text(1 - self.side, self.start + i - 1)
+                pair = (mine, theirs) if self.side == 0 else (theirs, mine)
+                for a, b in inline_diff(*pair)[self.side]:
+                    ranges.setdefault("inline", []).extend((f"{i}.{a}", f"{i}.{b}"))
+        for tag, idx in ranges.items():
+            w.tag_add(tag, *idx)
+        if self.start <= ins_row < self.stop:
+            w.mark_set("insert", f"{ins_row - self.start + 1}.{ins_col}")
+        w.edit_reset()
+        self.rendered = lines
+
+        nums = align.line_numbers(self.side, self.start, self.stop)
+        self.nums.config(state="normal")
+        self.nums.delete("1.0", END)
+        self.nums.insert("1.0", "\n".join("" if n is None else str(n) for n in nums))
+        self.nums.config(state="disabled")
+        self.scroll_to(top)
+
+    def scroll_to(self, top):
+        frac = (top - self.start) / max(1, self.stop - self.start)
+        self.text.yview_moveto(frac)
+        self.nums.yview_moveto(frac)
+
+    def top_row(self):
+        """Row shown at the top of the widget"""
+        return self.start + int(self.text.index("@0,0").split(".")[0]) - 1
+
+    def line(self, row):
+        """Widget line number of a rendered row"""
+        return row - self.start + 1
+
+    def edited(self):
+        """Window text if the user changed it since the last render, else None"""
+        if self.rendered is None:
+            return None
+        lines = self.text.get("1.0", "end-1c").split("\n")
+        return None if lines == self.rendered else lines
+
+
+class VirtualList:
+    """Treeview showing a window of a Python-side row store
+
+    The store is any sequence of rows. Only the rows that fit on screen
+    exist as Treeview items and scrolling rewrites their values; sorting
+    and filtering work on a list of store indexes, never on the widget.
+    """
+
+    def __init__(self, tree, fmt=tuple, vsb=None):
+        self.tree = tree
+        self.fmt = fmt            # row -> displayed values
+        self.vsb = vsb
+        self.rows = []
+        self.view = None          # store indexes shown, or None for every row in order
+        self.top = 0
+        self.sel_pos = None       # view position of the selected row
+        self._filter = None
+        self._sort = None         # (key, reverse)
+        self._resort_job = None
+        if vsb:
+            vsb.config(command=self._yview)
+        tree.configure(selectmode="browse")
+        tree.bind("<Configure>", lambda e: self.refresh())
+        tree.bind("<MouseWheel>", self._wheel)
+        tree.bind("<Button-4>", self._wheel)
+        tree.bind("<Button-5>", self._wheel)
+        tree.bind("<Up>", lambda e: self._move(-1))
+        tree.bind("<Down>", lambda e: self._move(1))
+        tree.bind("<Prior>", lambda e: self._move(-self.capacity()))
+        tree.bind("<Next>", lambda e: self._move(self.capacity()))
+        tree.bind("<<TreeviewSelect>>", self._on_select, add="+")
+
+    def __len__(self):
+        return len(self.rows) if self.view is None else len(self.view)
+
+    def index(self, pos):
+        """Store index of the row at a view position"""
+        return pos if self.view is None else self.view[pos]
+
+    def set_rows(self, rows):
+        self.rows = rows
+        self.top = 0
+        self.sel_pos = None
+        self._rebuild()
+
+    def append(self, rows):
+        """Add rows to a list store, e.g. while a scan is still running"""
+        start = len(self.rows)
+        self.rows.extend(rows)
+        if self.view is not None:
+            self.view.extend(i for i in range(start, len(self.rows))
+                             if not self._filter or self._filter(self.rows[i]))
+            if self._sort and not self._resort_job:
+                # Re-sorting a big store per batch would stall; do it twice a second
+                self._resort_job = self.tree.after(500, self._resort)
+        self.refresh()
+
+    def set_filter(self, pred):
+        """Show only rows for which pred(row) is true; None shows all"""
+        self._filter = pred
+        self._rebuild()
+
+    def sort_by(self, key, reverse=False):
+        """Order rows by key(row); None restores store order"""
+        self._sort = (key, reverse) if key else None
+        self._rebuild()
+
+    def _resort(self):
+        self._resort_job = None
+        selected = self.selected_index()
+        key, reverse = self._sort
+        self.view.sort(key=lambda i: key(self.rows[i]), reverse=reverse)
+        self._reselect(selected)
+
+    def _rebuild(self):
+        selected = self.selected_index()
+        if not self._filter and not self._sort:
+            self.view = None
+        else:
+            rows, pred = self.rows, self._filter
+            self.view = [i for i in range(len(rows)) if not pred or pred(rows[i])]
+            if self._sort:
+                key, reverse = self._sort
+                self.view.sort(key=lambda i: key(rows[i]), reverse=reverse)
+        self._reselect(selected)
+
+    def _reselect(self, selected):
+        if selected is None:
+            self.sel_pos = None
+        elif self.view is None:
+            self.sel_pos = selected
+        else:
+            self.sel_pos = self.view.index(selected) if selected in self.view else None
+        if self.sel_pos is not None:
+            self.see(self.sel_pos)
+        self.refresh()
+
+    def capacity(self):
+        """Rows that fit in the widget"""
+        kids = self.tree.get_children()
+        box = self.tree.bbox(kids[0]) if kids else None
+        if not box:
+            return max(1, int(self.tree.cget("height")))
+        return max(1, (self.tree.winfo_height() - box[1]) // box[3])
+
+    def refresh(self):
+        """Write the rows from self.top into the widget's items"""
+        n, cap = len(self), self.capacity()
+        self.top = max(0, min(self.top, n - cap))
+        count = min(cap, n - self.top)
+        kids = self.tree.get_children()
+        if len(kids) > count:
+            self.tree.delete(*kids[count:])
+        for k in range(len(kids), count):
+            self.tree.insert("", END, iid=str(k))
+        for k in range(count):
+            self.tree.item(str(k), values=self.fmt(self.rows[self.index(self.top + k)]))
+
+        slot = None if self.sel_pos is None else self.sel_pos - self.top
+        if slot is not None and 0 <= slot < count:
+            if self.tree.selection() != (str(slot),):
+                self.tree.selection_set(str(slot))
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+        if self.vsb:
+            self.vsb.set(self.top / max(1, n), (self.top + count) / max(1, n))
+
+    def scroll_to(self, top):
+        self.top = top
+        self.refresh()
+
+    def see(self, pos):
+        cap = self.capacity()
+        if not self.top <= pos < self.top + cap:
+            self.top = pos - cap // 3
+        self.refresh()
+
+    def selected_index(self):
+        """Store index of the selected row, or None"""
+        return None if self.sel_pos is None or self.sel_pos >= len(self) else self.index(self.sel_pos)
+
+    def _on_select(self, event=None):
+        sel = self.tree.selection()
+        if sel:
+            self.sel_pos = self.top + int(sel[0])
+
+    def _move(self, step):
+        if not len(self):
+            return "break"
+        pos = 0 if self.sel_pos is None else self.sel_pos + step
+        self.sel_pos = max(0, min(pos, len(self) - 1))
+        self.see(self.sel_pos)
+        return "break"
+
+    def _yview(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self)))
+        elif args[0] == "scroll":
+            self.scroll_to(self.top + int(args[1]) * (self.capacity() if args[2] == "pages" else 1))
+
+    def _wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.top - 3)
+        elif event.num == 5 or event.delta < 0:
+            self.scroll_to(self.top + 3)
+        return "break"
+
+
+class HexView:
+    """Text widget paging hex rows out of a mapped file
+
+    Only the rows on screen are formatted. Bytes inside the changed
+    regions of this side are tagged; a peer view, if set, scrolls along.
+    """
+
+    def __init__(self, text, mm, regions, side, vsb=None):
+        self.text = text
+        self.mm = mm
+        self.vsb = vsb
+        self.peer = None
+        self.top = 0
+        self.fmt = handler("binary")
+        self.rows = max(1, -(-len(mm) // self.fmt.ROW_BYTES))
+        self.spans = []           # (start, stop, tag) in file order
+        for r in regions:
+            start, stop = (r.a0, r.a1) if side == 0 else (r.b0, r.b1)
+            if stop > start:
+                self.spans.append((start, stop, "changed" if r.tag == "replace" else
+                                   ("removed" if side == 0 else "added")))
+        self._ends = [s[1] for s in self.spans]
+        self.line_height = tkfont.Font(font=text["font"]).metrics("linespace")
+        if vsb:
+            vsb.config(command=self._yview)
+        text.bind("<Configure>", lambda e: self.refresh())
+        text.bind("<MouseWheel>", self._wheel)
+        text.bind("<Button-4>", self._wheel)
+        text.bind("<Button-5>", self._wheel)
+
+    def capacity(self):
+        return max(1, self.text.winfo_height() // self.line_height)
+
+    def refresh(self):
+        cap = self.capacity()
+        self.top = max(0, min(self.top, self.rows - cap))
+        row_bytes = self.fmt.ROW_BYTES
+        start = self.top * row_bytes
+        data = self.mm[start:start + cap * row_bytes]
+        stop = start + len(data)
+
+        w = self.text
+        w.config(state="normal")
+        w.delete("1.0", END)
+        w.insert("1.0", "\n".join(self.fmt.hex_row(data[i:i + row_bytes], start + i)
+                                  for i in range(0, len(data), row_bytes)))
+        ranges = {}
+        for lo, hi, tag in self.spans[bisect_right(self._ends, start):]:
+            if lo >= stop:
+                break
+            for pos in range(max(lo, start), min(hi, stop)):
+                line, k = divmod(pos - start, row_bytes)
+                h, t = self.fmt.hex_columns(k)
+                ranges.setdefault(tag, []).extend(
+                    (f"{line + 1}.{h}", f"{line + 1}.{h + 2}", f"{line + 1}.{t}", f"{line + 1}.{t + 1}"))
+        for tag, idx in ranges.items():
+            w.tag_add(tag, *idx)
+        w.config(state="disabled")
+        if self.vsb:
+            self.vsb.set(self.top / self.rows, (self.top + cap) / self.rows)
+
+    def scroll_to(self, top, follow=True):
+        step = top - self.top
+        self.top = top
+        self.refresh()
+        if follow and self.peer:
+            self.peer.scroll_to(self.peer.top + step, False)
+
+    def goto(self, offset):
+        """Show the row holding offset a third of the way down"""
+        self.top = offset // self.fmt.ROW_BYTES - self.capacity() // 3
+        self.refresh()
+
+    def _yview(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * self.rows))
+        elif args[0] == "scroll":
+            self.scroll_to(self.top + int(args[1]) * (self.capacity() if args[2] == "pages" else 1))
+
+    def _wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.top - 3)
+        elif event.num == 5 or event.delta < 0:
+            self.scroll_to(self.top + 3)
+        return "break"
+
+
+class CompareJob:
+    """Runs work(job) in a worker thread; results reach Tk through after()
+
+    work may call job.progress(fraction), which raises Cancelled once the
+    job is cancelled, and job.post(fn, *args) to run fn on the Tk thread.
+    Posted calls of a cancelled or finished job are dropped.
+    """
+
+    def __init__(self, app, work, done):
+        self.app = app
+        self.work = work
+        self.done = done
+        self.cancelled = threading.Event()
+        self._pct = -1
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            res = self.work(self)
+        except Cancelled:
+            return
+        except Exception as e:
+            self.post(self.app._job_failed, e)
+        else:
+            self.post(self.app._job_done, self.done, res)
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise Cancelled
+
+    def progress(self, fraction):
+        self.check()
+        pct = int(fraction * 100)
+        if pct != self._pct:
+            self._pct = pct
+            self.post(lambda: self.app.prog.config(value=pct))
+
+    def post(self, fn, *args):
+        try:
+            self.app.after(0, self._call, fn, args)
+        except:
+            pass
+
+    def _call(self, fn, args):
+        if self.app._job is self:
+            fn(*args)
 
 
 class BeyondCompareClone(tb.Window):
@@ -42,21 +451,46 @@ class BeyondCompareClone(tb.Window):
         self.ignore_case = BooleanVar(value=False)
         self.ignore_blank = BooleanVar(value=False)
         self.fast_compare = BooleanVar(value=False)
+        self.lazy_folders = BooleanVar(value=False)
+        self.table_cells = BooleanVar(value=True)
+        self.table_key = StringVar()
+        self.diff_algo = StringVar(value="myers")
+        self.hash_algo = StringVar(value=DEFAULT_HASH)
         self.diff_mode = StringVar(value="side")
         self.search_var = StringVar()
-        self.diff_items = []
         self.current_diff = 0
         self.move_arrows = []
+        self.search_term = ""
+        self._find_row = -1
+
+        # Aligned document model, its diff hunks and the first visible row
+        self.align = Alignment.plain([""], [""])
+        self.diff_items = DiffItems(self.align)
+        self.top = 0
+
+        # Hunk copies that can be undone, and the sides changed since saving
+        self.journal = MergeJournal()
+        self._unsaved = set()
 
         # Defensive flags
         self._suspend_events = False
-        self._syntax_job = None
-        self._in_compare = False
+        self._rediff_job = None
+        self._rendering = False
+        self._diffed = False      # panes show a side-by-side diff result
+
+        # Per-side syntax highlighters
+        self._highlighters = [None, None]
+
+        # Running comparison, and a counter of edits to spot stale results
+        self._job = None
+        self._edits = 0
+        self._unified_fill = None
 
         # Build UI
         self._build_ui()
         self._apply_styles()
         self._bind_events()
+        self._render(force=True)
 
     def _build_ui(self):
         toolbar = tb.Frame(self, bootstyle=INFO)
@@ -67,6 +501,12 @@ class BeyondCompareClone(tb.Window):
         tb.Button(toolbar, text="Compare", bootstyle=SUCCESS, command=self.compare).pack(side=LEFT, padx=4)
         tb.Button(toolbar, text="Merge to Left", bootstyle=WARNING, command=self.merge_left).pack(side=LEFT, padx=2)
         tb.Button(toolbar, text="Merge to Right", bootstyle=WARNING, command=self.merge_right).pack(side=LEFT, padx=2)
+        tb.Button(toolbar, text="← Hunk", bootstyle=(WARNING, OUTLINE), command=self.copy_hunk_left).pack(side=LEFT, padx=1)
+        tb.Button(toolbar, text="Hunk →", bootstyle=(WARNING, OUTLINE), command=self.copy_hunk_right).pack(side=LEFT, padx=1)
+        tb.Button(toolbar, text="Undo", bootstyle=OUTLINE, command=self.undo_merge).pack(side=LEFT, padx=1)
+        tb.Button(toolbar, text="Redo", bootstyle=OUTLINE, command=self.redo_merge).pack(side=LEFT, padx=1)
+        tb.Button(toolbar, text="Save", bootstyle=SUCCESS, command=self.save_files).pack(side=LEFT, padx=2)
+        tb.Button(toolbar, text="3-Way Merge", bootstyle=WARNING, command=self.merge_three_way).pack(side=LEFT, padx=2)
         tb.Button(toolbar, text="Clear", bootstyle=SECONDARY, command=self.clear).pack(side=LEFT, padx=2)
 
         tb.Label(toolbar, text="Diff:").pack(side=LEFT, padx=(10, 2))
@@ -89,6 +529,16 @@ class BeyondCompareClone(tb.Window):
         tb.Checkbutton(opts, text="Ignore Case", variable=self.ignore_case).pack(side=LEFT, padx=5)
         tb.Checkbutton(opts, text="Ignore Blank Lines", variable=self.ignore_blank).pack(side=LEFT, padx=5)
         tb.Checkbutton(opts, text="Fast Compare", variable=self.fast_compare).pack(side=LEFT, padx=5)
+        tb.Checkbutton(opts, text="Lazy Folders", variable=self.lazy_folders).pack(side=LEFT, padx=5)
+        tb.Checkbutton(opts, text="Table Cells", variable=self.table_cells).pack(side=LEFT, padx=5)
+        tb.Label(opts, text="Key:").pack(side=LEFT, padx=(5, 2))
+        tb.Entry(opts, textvariable=self.table_key, width=10).pack(side=LEFT, padx=2)
+        tb.Label(opts, text="Algorithm:").pack(side=LEFT, padx=(15, 2))
+        tb.Combobox(opts, textvariable=self.diff_algo, values=DIFF_ALGORITHMS,
+                    width=10, state="readonly").pack(side=LEFT, padx=2)
+        tb.Label(opts, text="Hash:").pack(side=LEFT, padx=(15, 2))
+        tb.Combobox(opts, textvariable=self.hash_algo, values=HASH_ALGORITHMS,
+                    width=8, state="readonly").pack(side=LEFT, padx=2)
 
         # Paned window
         self.paned = tb.Panedwindow(self, orient=HORIZONTAL)
@@ -125,6 +575,9 @@ class BeyondCompareClone(tb.Window):
         self.r_text = ScrolledText(ri, wrap="none", font=("Consolas", 11), undo=True)
         self.r_text.pack(side=LEFT, fill=BOTH, expand=True)
 
+        self.panes = (VirtualPane(self.l_text, self.l_nums, 0),
+                      VirtualPane(self.r_text, self.r_nums, 1))
+
         # Unified View
         self.unified = ScrolledText(self, wrap="none", font=("Consolas", 11), state="disabled")
         self.unified.tag_configure("added", background="#355E3B", foreground="white")
@@ -136,7 +589,8 @@ class BeyondCompareClone(tb.Window):
         bottom.pack(fill=X, side=BOTTOM, padx=5, pady=2)
         self.status = tb.Label(bottom, text="Ready", anchor="w", bootstyle=INFO)
         self.status.pack(side=LEFT, fill=X, expand=True)
-        self.prog = tb.Progressbar(bottom, mode="indeterminate", bootstyle=SUCCESS)
+        self.prog = tb.Progressbar(bottom, mode="determinate", length=200, bootstyle=SUCCESS)
+        self.cancel_btn = tb.Button(bottom, text="Cancel", bootstyle=DANGER, command=self.cancel_compare)
 
         # Diff Tree
         self.tree = ttk.Treeview(self, columns=("Type", "L", "R", "Text"), show="headings", height=6)
@@ -149,6 +603,8 @@ class BeyondCompareClone(tb.Window):
         self.tree.column("R", width=60)
         self.tree.column("Text", width=400)
         self.tree.bind("<Double-1>", self._jump_to)
+        self.diff_list = VirtualList(
+            self.tree, lambda d: (d.type.capitalize(), d.l or "-", d.r or "-", d.text[:50]))
 
         self._menu()
 
@@ -158,6 +614,7 @@ class BeyondCompareClone(tb.Window):
             w.tag_configure("removed", background="#78281F", foreground="white")
             w.tag_configure("moved", background="#D4AC0D", foreground="black")
             w.tag_configure("changed", background="#5B4A8A", foreground="white")
+            w.tag_configure("inline", background="#8E6FD8", foreground="white")
             w.tag_configure("same", background="", foreground="")
             w.tag_configure("keyword", foreground="#569CD6")
             w.tag_configure("string", foreground="#CE9178")
@@ -166,113 +623,202 @@ class BeyondCompareClone(tb.Window):
             w.tag_configure("sel", background="#264F78")
 
     def _bind_events(self):
-        for w in (self.l_text, self.r_text):
+        for pane in self.panes:
+            w = pane.text
             w.bind("<KeyRelease>", self._on_key_release)
             w.bind("<MouseWheel>", self._sync_scroll)
             w.bind("<Button-4>", self._sync_scroll)
             w.bind("<Button-5>", self._sync_scroll)
-            
+            w.bind("<Configure>", lambda e: self._render())
+            w.configure(yscrollcommand=lambda *a, p=pane: self._on_text_scroll(p))
+
         self.l_text.vbar.config(command=self._sync_yview)
         self.r_text.vbar.config(command=self._sync_yview)
 
     def _sync_scroll(self, event):
         """Synchronize scrolling between panels"""
-        widget = event.widget
         try:
             if event.num == 4 or event.delta > 0:
-                widget.yview_scroll(-1, "units")
+                self._scroll_to(self.top - 1)
             elif event.num == 5 or event.delta < 0:
-                widget.yview_scroll(1, "units")
-                
-            # Sync the other panel
-            pos = widget.yview()[0]
-            if widget == self.l_text:
-                self.r_text.yview_moveto(pos)
-            else:
-                self.l_text.yview_moveto(pos)
-                
+                self._scroll_to(self.top + 1)
         except:
             pass
         return "break"
 
     def _sync_yview(self, *args):
         """Synchronize vertical scrollbar"""
-        self.l_text.yview(*args)
-        self.r_text.yview(*args)
+        height = self.panes[0].visible_rows()
+        if args[0] == "moveto":
+            self._scroll_to(int(float(args[1]) * len(self.align)))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (height if args[2] == "pages" else 1)
+            self._scroll_to(self.top + step)
+
+    def _on_text_scroll(self, pane):
+        """A pane scrolled itself (cursor keys, selection drag)"""
+        if self._rendering:
+            return
+        top = pane.top_row()
+        if top != self.top:
+            self.top = top
+            self._render()
+        else:
+            self._update_scrollbar()
+
+    def _scroll_to(self, top):
+        height = self.panes[0].visible_rows()
+        self.top = max(0, min(top, len(self.align) - height))
+        self._render()
+
+    def _render(self, force=False):
+        """Render the rows around self.top into both panes"""
+        if self._rendering:
+            return
+        self._rendering = True
+        try:
+            force = self._commit_edits() or force
+            height = self.panes[0].visible_rows()
+            self.top = max(0, min(self.top, len(self.align) - 1))
+            redrawn = False
+            for pane in self.panes:
+                if force or not pane.covers(self.top, height):
+                    pane.render(self.align, self.top, height)
+                    redrawn = True
+                else:
+                    pane.scroll_to(self.top)
+            self._update_scrollbar()
+            self._draw_arrows()
+            if redrawn:
+                self._mark_search()
+                self._syntax()
+        finally:
+            self._rendering = False
+
+    def _update_scrollbar(self):
+        n = max(1, len(self.align))
+        height = self.panes[0].visible_rows()
+        first, last = self.top / n, min(1.0, (self.top + height) / n)
+        self.l_text.vbar.set(first, last)
+        self.r_text.vbar.set(first, last)
+
+    def _commit_edits(self):
+        """Write typed changes of the rendered windows back into the model
+
+        Returns True if the row layout changed and the panes need redrawing.
+        """
+        relayout = False
+        for pane in self.panes:
+            new = pane.edited()
+            if new is None:
+                continue
+            idx = self.align.index[pane.side]
+            before = idx[pane.start:pane.stop]
+            first = self.align.doc_pos(pane.side, pane.start)
+            added = self.align.edit(pane.side, pane.start, pane.stop, new)
+            hl = self._highlighters[pane.side]
+            if hl and hl.doc is self.align.docs[pane.side]:
+                hl.invalidate(first)
+            if added:
+                self.diff_items.shift(pane.stop, added)
+            # Journal entries point at rows, which typing moves
+            self.journal.clear()
+            self._unsaved.add(pane.side)
+            self._edits += 1
+            if added or idx[pane.start:pane.stop] != before:
+                relayout = True
+            else:
+                pane.rendered = new
+        if relayout:
+            for pane in self.panes:
+                pane.rendered = None
+        return relayout
 
     def _on_key_release(self, event=None):
         if self._suspend_events:
             return
-        if self._syntax_job:
-            try:
-                self.after_cancel(self._syntax_job)
-            except:
-                pass
-        self._syntax_job = self.after(400, self._syntax)
+        if self._commit_edits():
+            self._render(force=True)
+        else:
+            self._syntax()
+        if self._diffed and self.align.dirty:
+            if self._rediff_job:
+                try:
+                    self.after_cancel(self._rediff_job)
+                except:
+                    pass
+            self._rediff_job = self.after(250, self._rediff)
+
+    def _rediff(self):
+        """Re-diff just the edited hunks and patch tags and diff items"""
+        self._rediff_job = None
+        if self._job or not self._diffed:
+            return
+        self._commit_edits()
+        if self.align.rediff(self._options(), self.diff_items):
+            self._render(force=True)
+            self._populate_tree()
+            self.status.config(text=f"Updated - {len(self.diff_items)} differences")
 
     def open_left(self):
         p = filedialog.askopenfilename()
         if p:
             self.left_path = p
-            self._load(self.l_text, p, 1)
+            self._load(p, 1)
             self.status.config(text=f"Left: {os.path.basename(p)}")
 
     def open_right(self):
         p = filedialog.askopenfilename()
         if p:
             self.right_path = p
-            self._load(self.r_text, p, 2)
+            self._load(p, 2)
             self.status.config(text=f"Right: {os.path.basename(p)}")
 
-    def _load(self, widget, path, side):
-        widget.delete("1.0", END)
+    def _load(self, path, side):
         self._detect(path, side)
         typ = self.left_type if side == 1 else self.right_type
 
         try:
-            if typ == "image":
-                self._show_img(path)
-                widget.insert("1.0", f"[Image] {os.path.basename(path)}")
-            elif typ == "excel":
-                widget.insert("1.0", pd.read_excel(path).to_string(index=False))
-            elif typ == "docx":
-                txt = self._docx_text(path)
-                widget.insert("1.0", txt or "[DOCX read error]")
+            if typ == "text" and os.path.getsize(path) > LARGE_FILE:
+                # Too big to hold in memory: compared by streaming from disk
+                setattr(self, f"{'left' if side==1 else 'right'}_type", "large")
+                size = os.path.getsize(path) >> 20
+                txt = f"[Large file] {os.path.basename(path)} ({size} MiB), compared as a stream"
             else:
-                with open(path, "r", encoding="utf-8", errors="replace") as f:
-                    widget.insert("1.0", f.read())
+                # Each format's handler gives its text; office documents
+                # and workbooks come from the extraction cache when seen before
+                if typ == "image":
+                    self._show_img(path)
+                self._set_doc(side, extract_lines(path, typ))
+                return
         except Exception as e:
-            widget.insert("1.0", f"[Error: {e}]")
+            txt = f"[Error: {e}]"
             setattr(self, f"{'left' if side==1 else 'right'}_type", "binary")
 
-        self._update_nums()
-        self._syntax()
+        self._set_doc(side, txt.split("\n"))
+
+    def _set_doc(self, side, lines):
+        """Replace one side's document and show both sides unaligned"""
+        self.cancel_compare()
+        self._commit_edits()
+        self._edits += 1
+        self._diffed = False
+        docs = list(self.align.docs)
+        docs[side - 1] = lines
+        self.align = Alignment.plain(*docs)
+        self.diff_items = DiffItems(self.align)
+        self.journal.clear()
+        self._unsaved.discard(side - 1)
+        self._populate_tree()
+        self.top = 0
+        self._render(force=True)
 
     def _detect(self, path, side):
-        mime, _ = mimetypes.guess_type(path)
-        if mime and mime.startswith("image"):
-            t = "image"
-        elif path.lower().endswith((".xlsx", ".xls")):
-            t = "excel"
-        elif path.lower().endswith(".docx"):
-            t = "docx"
-        elif mime and mime.startswith("text"):
-            t = "text"
-        else:
-            t = "binary"
-        setattr(self, f"{'left' if side==1 else 'right'}_type", t)
-
-    def _docx_text(self, path):
-        try:
-            with zipfile.ZipFile(path) as z:
-                xml = z.read("word/document.xml")
-            tree = ET.fromstring(xml)
-            ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-            return "\n".join(t.text or "" for t in tree.iterfind('.//w:t', ns))
-        except:
-            return None
+        setattr(self, f"{'left' if side==1 else 'right'}_type", detect_type(path))
 
     def _show_img(self, path):
+        from PIL import Image, ImageTk
+
         try:
             img = Image.open(path).copy()
             img.thumbnail((800, 600), Image.Resampling.LANCZOS)
@@ -285,236 +831,157 @@ class BeyondCompareClone(tb.Window):
         except Exception as e:
             messagebox.showerror("Image", str(e))
 
-    def _update_nums(self):
-        """Update line numbers"""
-        for txt, num in [(self.l_text, self.l_nums), (self.r_text, self.r_nums)]:
-            try:
-                num.config(state="normal")
-                num.delete("1.0", END)
-                cnt = int(txt.index("end-1c").split('.')[0])
-                num.insert("1.0", "\n".join(str(i) for i in range(1, cnt + 1)))
-                num.config(state="disabled")
-            except:
-                pass
-
     def _syntax(self):
-        """Apply syntax highlighting"""
+        """Highlight the rendered rows of both panes, lexing only those lines"""
         if self._suspend_events:
             return
-        self._syntax_job = None
-
-        for w in (self.l_text, self.r_text):
-            try:
-                data = w.get("1.0", "end-1c")
-            except:
-                continue
 
-            if len(data) > 200_000:
-                continue
+        for pane, path in zip(self.panes, (self.left_path, self.right_path)):
+            doc = self.align.docs[pane.side]
+            hl = self._highlighters[pane.side]
+            if hl is None or hl.doc is not doc:
+                hl = self._highlighters[pane.side] = Highlighter(doc, lexer_for(path))
 
-            for tag in ("keyword", "string", "comment"):
-                try:
-                    w.tag_remove(tag, "1.0", "end")
-                except:
-                    pass
+            ranges = {}
+            for n, i in enumerate(self.align.index[pane.side][pane.start:pane.stop], 1):
+                if i >= 0:
+                    for start, end, tag in hl.spans(i):
+                        ranges.setdefault(tag, []).extend((f"{n}.{start}", f"{n}.{end}"))
 
-            patterns = [
-                (r'\b(def|class|if|else|elif|for|while|try|except|finally|with|import|from|as|return|yield|lambda|None|True|False|and|or|not|in|is)\b', "keyword"),
-                (r'\"(\\.|[^\"])*\"|\'(\\.|[^\'])*\'', "string"),
-                (r'#.*', "comment")
-            ]
-
-            for pat, tag in patterns:
-                for m in re.finditer(pat, data):
-                    try:
-                        s = w.index(f"1.0 + {m.start()} chars")
-                        e = w.index(f"1.0 + {m.end()} chars")
-                        w.tag_add(tag, s, e)
-                    except:
-                        continue
+            w = pane.text
+            for tag in SYNTAX_TAGS:
+                w.tag_remove(tag, "1.0", END)
+            for tag, idx in ranges.items():
+                w.tag_add(tag, *idx)
 
     def compare(self):
-        """Main comparison method"""
-        if self._in_compare:
+        """Start comparing the two documents in the background"""
+        if self._job:
             return
 
-        self._in_compare = True
-        self._suspend_events = True
-
         try:
-            left = self.l_text.get("1.0", "end-1c")
-            right = self.r_text.get("1.0", "end-1c")
+            self._commit_edits()
+            left, right = self.align.docs
 
-            if not left and not right:
+            if not any(left) and not any(right):
                 messagebox.showwarning("Empty", "Both sides must contain data.")
                 return
 
+            if self.left_type == self.right_type == "image":
+                self._image_compare()
+                return
+
             if self.left_type in ("binary", "image") or self.right_type in ("binary", "image"):
                 self._binary_compare()
                 return
 
-            # Split into lines
-            l_lines = left.split("\n")
-            r_lines = right.split("\n")
+            if "large" in (self.left_type, self.right_type):
+                self._stream_compare()
+                return
+
+            if self.table_cells.get() and is_table(self.left_path) and is_table(self.right_path):
+                self._table_compare()
+                return
+
+            self._text_compare()
+
+        except Exception as e:
+            messagebox.showerror("Compare Error", f"Error during comparison: {e}")
+
+    def _text_compare(self):
+        """Diff the two documents line by line"""
+        try:
+            # The worker diffs a snapshot; the panes stay editable meanwhile
+            left, right = map(list, self.align.docs)
+            opts, edits = self._options(), self._edits
 
-            # Apply options
-            l_processed = self._process_lines(l_lines)
-            r_processed = self._process_lines(r_lines)
+            def work(job):
+                return compare_text(left, right, opts, lambda done, total: job.progress(done / max(1, total)))
 
-            self.diff_items = []
+            def done(res):
+                if self._edits != edits:
+                    # Edited while diffing: the result is stale, diff again
+                    self._text_compare()
+                else:
+                    self._show_result(res)
+
+            self._start_job(work, done, "Comparing...")
+
+        except Exception as e:
+            messagebox.showerror("Compare Error", f"Error during comparison: {e}")
+
+    def _show_result(self, res):
+        """Display a finished TextDiff"""
+        self._suspend_events = True
+        try:
+            self.diff_items = res.items
+            self.journal.clear()
             self._clear_tags()
 
-            if self.diff_mode.get() == "side":
-                self._side_by_side_diff(l_processed, r_processed, l_lines, r_lines)
+            self._diffed = self.diff_mode.get() == "side"
+            if self._diffed:
+                self._side_by_side_diff(res)
             else:
-                self._unified_diff(l_processed, r_processed)
+                self._unified_diff(res)
 
-            self._update_nums()
             self._populate_tree()
             self.after(100, self._draw_arrows)
             self.after(200, self._syntax)
             self.status.config(text=f"Comparison complete - {len(self.diff_items)} differences")
-            
+
         except Exception as e:
             messagebox.showerror("Compare Error", f"Error during comparison: {e}")
         finally:
             self._suspend_events = False
-            self._in_compare = False
 
-    def _process_lines(self, lines):
-        """Apply comparison options to lines"""
-        processed = []
-        for line in lines:
-            if self.ignore_blank.get() and not line.strip():
-                continue
-            pline = line
-            if self.ignore_ws.get():
-                pline = pline.strip()
-            if self.ignore_case.get():
-                pline = pline.lower()
-            processed.append(pline)
-        return processed
-
-    def _side_by_side_diff(self, l_proc, r_proc, l_orig, r_orig):
-        """Perform side-by-side comparison with proper alignment"""
-        self.paned.pack(fill=BOTH, expand=True)
-        self.l_text.delete("1.0", END)
-        self.r_text.delete("1.0", END)
-
-        # Get diff operations
-        matcher = SequenceMatcher(None, l_proc, r_proc)
-        opcodes = matcher.get_opcodes()
-
-        # Build output with proper alignment
-        left_lines = []
-        right_lines = []
-        left_tags = []
-        right_tags = []
-
-        line_num = 0
-
-        for op, i1, i2, j1, j2 in opcodes:
-            if op == "equal":
-                # Lines are the same
-                for k in range(i2 - i1):
-                    left_lines.append(l_orig[i1 + k] if i1 + k < len(l_orig) else "")
-                    right_lines.append(r_orig[j1 + k] if j1 + k < len(r_orig) else "")
-                    left_tags.append("same")
-                    right_tags.append("same")
-                    line_num += 1
-
-            elif op == "delete":
-                # Lines only in left
-                for k in range(i2 - i1):
-                    line = l_orig[i1 + k] if i1 + k < len(l_orig) else ""
-                    left_lines.append(line)
-                    right_lines.append("")
-                    left_tags.append("removed")
-                    right_tags.append("")
-                    line_num += 1
-                    self.diff_items.append({
-                        "type": "removed",
-                        "l": line_num,
-                        "r": None,
-                        "text": line
-                    })
-
-            elif op == "insert":
-                # Lines only in right
-                for k in range(j2 - j1):
-                    line = r_orig[j1 + k] if j1 + k < len(r_orig) else ""
-                    left_lines.append("")
-                    right_lines.append(line)
-                    left_tags.append("")
-                    right_tags.append("added")
-                    line_num += 1
-                    self.diff_items.append({
-                        "type": "added",
-                        "l": None,
-                        "r": line_num,
-                        "text": line
-                    })
-
-            elif op == "replace":
-                # Lines are different - align them
-                l_count = i2 - i1
-                r_count = j2 - j1
-                max_count = max(l_count, r_count)
-
-                for k in range(max_count):
-                    l_line = l_orig[i1 + k] if (i1 + k < len(l_orig) and k < l_count) else ""
-                    r_line = r_orig[j1 + k] if (j1 + k < len(r_orig) and k < r_count) else ""
-
-                    left_lines.append(l_line)
-                    right_lines.append(r_line)
-
-                    if l_line and r_line:
-                        left_tags.append("changed")
-                        right_tags.append("changed")
-                    elif l_line:
-                        left_tags.append("removed")
-                        right_tags.append("")
-                    else:
-                        left_tags.append("")
-                        right_tags.append("added")
-
-                    line_num += 1
-
-                    # Record the difference
-                    if l_line and r_line:
-                        self.diff_items.append({
-                            "type": "changed",
-                            "l": line_num,
-                            "r": line_num,
-                            "text": f"{l_line} → {r_line}"
-                        })
-                    elif l_line:
-                        self.diff_items.append({
-                            "type": "removed",
-                            "l": line_num,
-                            "r": None,
-                            "text": l_line
-                        })
-                    elif r_line:
-                        self.diff_items.append({
-                            "type": "added",
-                            "l": None,
-                            "r": line_num,
-                            "text": r_line
-                        })
-
-        # Insert all lines
-        self.l_text.insert("1.0", "\n".join(left_lines))
-        self.r_text.insert("1.0", "\n".join(right_lines))
-
-        # Apply tags
-        for i, tag in enumerate(left_tags, 1):
-            if tag:
-                self.l_text.tag_add(tag, f"{i}.0", f"{i}.end")
+    def _start_job(self, work, done, label, determinate=True):
+        """Run work in a CompareJob, showing progress and a Cancel button"""
+        self._job = CompareJob(self, work, done)
+        self.prog.config(mode="determinate" if determinate else "indeterminate", value=0)
+        self.cancel_btn.pack(side=RIGHT, padx=2)
+        self.prog.pack(side=RIGHT, padx=5)
+        if not determinate:
+            self.prog.start()
+        self.status.config(text=label)
+        self._job.start()
+
+    def _end_job(self):
+        self._job = None
+        self.prog.stop()
+        self.prog.pack_forget()
+        self.cancel_btn.pack_forget()
+
+    def _job_done(self, done, res):
+        self._end_job()
+        done(res)
+
+    def _job_failed(self, e):
+        self._end_job()
+        messagebox.showerror("Compare Error", f"Error during comparison: {e}")
+
+    def cancel_compare(self):
+        """Abandon the running comparison, if any"""
+        if not self._job:
+            return
+        self._job.cancelled.set()
+        self._end_job()
+        self.status.config(text="Comparison cancelled")
+
+    def _options(self):
+        """Comparison options from the UI"""
+        return DiffOptions(
+            ignore_ws=self.ignore_ws.get(),
+            ignore_case=self.ignore_case.get(),
+            ignore_blank=self.ignore_blank.get(),
+            algorithm=self.diff_algo.get(),
+        )
 
-        for i, tag in enumerate(right_tags, 1):
-            if tag:
-                self.r_text.tag_add(tag, f"{i}.0", f"{i}.end")
+    def _side_by_side_diff(self, res):
+        """Show an aligned diff result side by side"""
+        self.paned.pack(fill=BOTH, expand=True)
+        self.align = res.align
+        self.top = 0
+        self._render(force=True)
 
     def _draw_arrows(self):
         """Draw connection arrows between panels"""
@@ -522,20 +989,14 @@ class BeyondCompareClone(tb.Window):
         self.move_arrows = []
 
         try:
-            # Get line height
-            info = self.l_text.dlineinfo("1.0")
-            if not info:
-                return
-            line_height = info[3]
-
-            # Draw arrows for changed lines
-            for item in self.diff_items:
-                if item["type"] == "changed" and item.get("l") and item.get("r"):
-                    l_line = item["l"]
-                    r_line = item["r"]
+            line_height = self.panes[0].line_height
+            height = self.panes[0].visible_rows()
 
-                    y1 = (l_line - 1) * line_height + line_height // 2
-                    y2 = (r_line - 1) * line_height + line_height // 2
+            # Draw arrows for changed lines in the viewport
+            for item in self.diff_items.in_rows(self.top, self.top + height):
+                if item.type == "changed" and item.l and item.r:
+                    y1 = (item.l - 1 - self.top) * line_height + line_height // 2
+                    y2 = (item.r - 1 - self.top) * line_height + line_height // 2
 
                     # Draw connecting line
                     self.arrow_canvas.create_line(
@@ -543,22 +1004,71 @@ class BeyondCompareClone(tb.Window):
                         fill="#5B4A8A", width=2, smooth=True
                     )
 
+            # Moved blocks: source on the left to destination on the right,
+            # drawn while either end is on screen and clipped to the canvas
+            if self._diffed:
+                bottom = height * line_height
+                for mv in self.align.moves:
+                    ends = (mv.left_row, mv.right_row)
+                    if not any(self.top - mv.size < r < self.top + height for r in ends):
+                        continue
+                    y1, y2 = ((r - self.top) * line_height + mv.size * line_height // 2 for r in ends)
+                    arrow = self.arrow_canvas.create_line(
+                        5, max(-5, min(y1, bottom + 5)), 55, max(-5, min(y2, bottom + 5)),
+                        fill="#D4AC0D", width=2, arrow=LAST
+                    )
+                    self.move_arrows.append((arrow, mv))
+
         except Exception as e:
             pass
 
     def _on_arrow_click(self, event):
-        """Handle arrow clicks"""
-        pass  # Can be implemented for specific merge operations
+        """Follow a move arrow, or copy the hunk beside the click across
+
+        A click on the left half of the gutter copies the hunk from left
+        to right, one on the right half from right to left.
+        """
+        c = self.arrow_canvas
+        hit = set(c.find_overlapping(event.x - 3, event.y - 3, event.x + 3, event.y + 3))
+        height = self.panes[0].visible_rows()
+        for arrow, mv in self.move_arrows:
+            if arrow in hit:
+                # Show whichever end of the move is off screen
+                shown = self.top <= mv.left_row < self.top + height
+                self._scroll_to((mv.right_row if shown else mv.left_row) - height // 3)
+                return
+        row = self.top + event.y // self.panes[0].line_height
+        self._copy_hunk(0 if event.x < c.winfo_width() // 2 else 1, row)
 
-    def _unified_diff(self, l_lines, r_lines):
+    def _unified_diff(self, res):
         """Show unified diff view"""
+        self._show_unified()
+        lines = res.unified(n=3)
+        token = self._unified_fill = object()
+
+        def fill():
+            # A batch of lines per callback keeps the window responsive
+            if self._unified_fill is not token:
+                return
+            batch = list(islice(lines, 2000))
+            self._append_unified(batch)
+            if len(batch) == 2000:
+                self.after(1, fill)
+
+        fill()
+
+    def _show_unified(self):
         self.paned.pack_forget()
         self.unified.pack(fill=BOTH, expand=True, padx=5, pady=5)
         self.unified.config(state="normal")
         self.unified.delete("1.0", END)
+        self.unified.config(state="disabled")
+        self._unified_fill = None
 
-        for line in unified_diff(l_lines, r_lines, n=3, lineterm=''):
-            if line.startswith(("+++", "---", "@@")):
+    def _append_unified(self, lines):
+        self.unified.config(state="normal")
+        for line in lines:
+            if line.startswith(("+++", "---", "@@", "...")):
                 self.unified.insert(END, line + "\n", "header")
             elif line.startswith("+"):
                 self.unified.insert(END, line + "\n", "added")
@@ -566,31 +1076,218 @@ class BeyondCompareClone(tb.Window):
                 self.unified.insert(END, line + "\n", "removed")
             else:
                 self.unified.insert(END, line + "\n")
-
         self.unified.config(state="disabled")
 
+    def _stream_compare(self):
+        """Unified diff of files too large to load, read from disk as a stream"""
+        if not (self.left_path and self.right_path):
+            messagebox.showinfo("Large file", "Load two files first.")
+            return
+        self._show_unified()
+        self.diff_items = DiffItems(self.align)
+        self.journal.clear()
+        lp, rp, opts = self.left_path, self.right_path, self._options()
+
+        def work(job):
+            count = 0
+            batch = []
+            for line in stream_unified(lp, rp, opts):
+                job.check()
+                if count == STREAM_LINES:
+                    batch.append(f"... output truncated at {STREAM_LINES} lines "
+                                 "(use the command line for the full diff)")
+                    break
+                batch.append(line)
+                count += 1
+                if len(batch) == 2000:
+                    job.post(self._append_unified, batch)
+                    batch = []
+            job.post(self._append_unified, batch)
+            return count
+
+        def done(count):
+            self.status.config(text="Identical" if not count else "Large file comparison complete")
+
+        self._start_job(work, done, "Comparing large files...", determinate=False)
+
     def toggle_view(self):
         """Toggle between views"""
-        if self.l_text.get("1.0", "end-1c").strip() or self.r_text.get("1.0", "end-1c").strip():
+        self._commit_edits()
+        if any(l.strip() for doc in self.align.docs for l in doc):
             self.compare()
 
     def _binary_compare(self):
-        """Compare binary files"""
+        """Compare binary files byte by byte"""
         if not (self.left_path and self.right_path):
             messagebox.showinfo("Binary", "Load two files first.")
             return
-        h1 = self._hash(self.left_path)
-        h2 = self._hash(self.right_path)
-        msg = "Identical" if h1 == h2 else "Different"
-        messagebox.showinfo("Binary", f"{msg}\n\nMD5 Left: {h1}\nMD5 Right: {h2}")
-
-    def _hash(self, p):
-        """Calculate MD5 hash"""
-        h = hashlib.md5()
-        with open(p, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                h.update(chunk)
-        return h.hexdigest()
+        lp, rp = self.left_path, self.right_path
+
+        def work(job):
+            return handler("binary").compare_binary(lp, rp, lambda done, total: job.progress(done / max(1, total)))
+
+        def done(res):
+            if res.identical:
+                self.status.config(text="Binary comparison complete - Identical")
+                messagebox.showinfo("Binary", f"Identical\n\n{res.left_size:,} bytes")
+            else:
+                self.status.config(text=f"Binary comparison complete - {len(res.regions)} differences")
+                self._show_binary_diff(res, lp, rp)
+
+        self._start_job(work, done, "Comparing bytes...")
+
+    def _show_binary_diff(self, res, lp, rp):
+        """Hex views of both files with the list of differing regions"""
+        try:
+            maps = [handler("binary").open_map(p) for p in (lp, rp)]
+        except OSError as e:
+            messagebox.showerror("Binary", str(e))
+            return
+
+        win = Toplevel(self)
+        win.title(f"Binary Compare - {os.path.basename(lp)} ↔ {os.path.basename(rp)}")
+        win.geometry("1500x800")
+        tb.Label(win, text=f"{res.left_size:,} ↔ {res.right_size:,} bytes   "
+                           f"{len(res.regions)} differences, {res.changed_bytes:,} bytes").pack(fill=X, padx=5, pady=3)
+
+        tree = ttk.Treeview(win, columns=("Kind", "Left", "Left Size", "Right", "Right Size"),
+                            show="headings", height=8)
+        for col, w in zip(tree["columns"], [90, 140, 100, 140, 100]):
+            tree.heading(col, text=col)
+            tree.column(col, width=w)
+        tree.pack(fill=X, padx=5, pady=3)
+        kinds = {"replace": "Changed", "delete": "Only Left", "insert": "Only Right"}
+        regions = VirtualList(tree, lambda r: (kinds[r.tag], f"{r.a0:08x}", r.a1 - r.a0,
+                                               f"{r.b0:08x}", r.b1 - r.b0))
+        regions.set_rows(res.regions)
+
+        panes = tb.Frame(win)
+        panes.pack(fill=BOTH, expand=True)
+        views = []
+        for side, path in enumerate((lp, rp)):
+            frame = tb.LabelFrame(panes, text=os.path.basename(path), padding=3)
+            frame.pack(side=LEFT, fill=BOTH, expand=True, padx=3)
+            vsb = ttk.Scrollbar(frame)
+            vsb.pack(side=RIGHT, fill=Y)
+            text = tb.Text(frame, wrap="none", font=("Consolas", 11), state="disabled")
+            text.pack(fill=BOTH, expand=True)
+            text.tag_configure("added", background="#355E3B", foreground="white")
+            text.tag_configure("removed", background="#78281F", foreground="white")
+            text.tag_configure("changed", background="#5B4A8A", foreground="white")
+            views.append(HexView(text, maps[side], res.regions, side, vsb))
+        views[0].peer, views[1].peer = views[1], views[0]
+
+        def on_select(e):
+            idx = regions.selected_index()
+            if idx is not None:
+                r = res.regions[idx]
+                views[0].goto(r.a0)
+                views[1].goto(r.b0)
+
+        def close():
+            win.destroy()
+            for mm in maps:
+                if hasattr(mm, "close"):
+                    mm.close()
+
+        tree.bind("<<TreeviewSelect>>", on_select, add="+")
+        win.protocol("WM_DELETE_WINDOW", close)
+        tb.Button(win, text="Close", bootstyle=DANGER, command=close).pack(pady=5)
+
+    def _image_compare(self):
+        """Compare two images pixel by pixel"""
+        lp, rp = self.left_path, self.right_path
+
+        def work(job):
+            return handler("image").compare_images(lp, rp, progress=lambda done, total: job.progress(done / total))
+
+        def done(res):
+            self._show_image_diff(res, lp, rp)
+
+        self._start_job(work, done, "Comparing images...")
+
+    def _show_image_diff(self, res, lp, rp):
+        """Show both images, the difference heatmap, metrics and changed regions"""
+        msg = "Identical" if res.identical else f"{len(res.boxes)} changed regions"
+        self.status.config(text=f"Image comparison complete - {msg}")
+
+        win = Toplevel(self)
+        win.title(f"Image Compare - {os.path.basename(lp)} ↔ {os.path.basename(rp)}")
+        win.geometry("1400x800")
+
+        pct = 100 * res.changed / max(1, res.total)
+        psnr = "∞" if res.mse == 0 else f"{res.psnr:.2f} dB"
+        info = (f"{res.left_size[0]}x{res.left_size[1]} ↔ {res.right_size[0]}x{res.right_size[1]}   "
+                f"Changed: {res.changed:,} px ({pct:.3f}%)   PSNR: {psnr}   SSIM: {res.ssim:.4f}")
+        tb.Label(win, text=info).pack(fill=X, padx=5, pady=3)
+
+        from PIL import ImageTk
+
+        views = tb.Frame(win)
+        views.pack(fill=BOTH, expand=True)
+        size = 440
+        try:
+            preview, open_image = handler("image").preview, handler("image").open_image
+            with open_image(lp) as li, open_image(rp) as ri:
+                left, right = preview(li, size), preview(ri, size)
+            images = [("Left", left), ("Right", right), ("Difference", res.heatmap(right))]
+        except Exception as e:
+            messagebox.showerror("Image", str(e))
+            return
+        win.photos = []
+        for title, img in images:
+            img = img.copy()
+            img.thumbnail((size, size))
+            photo = ImageTk.PhotoImage(img)
+            win.photos.append(photo)
+            frame = tb.LabelFrame(views, text=title, padding=3)
+            frame.pack(side=LEFT, fill=BOTH, expand=True, padx=3)
+            tb.Label(frame, image=photo).pack()
+
+        tree = ttk.Treeview(win, columns=("Region", "Box", "Size"), show="headings", height=6)
+        for col, w in zip(tree["columns"], [80, 300, 150]):
+            tree.heading(col, text=col)
+            tree.column(col, width=w)
+        tree.pack(fill=X, padx=5, pady=3)
+        rows = VirtualList(tree, lambda b: (b[0], f"({b[1][0]}, {b[1][1]}) - ({b[1][2]}, {b[1][3]})",
+                                            f"{b[1][2] - b[1][0]}x{b[1][3] - b[1][1]}"))
+        rows.set_rows(list(enumerate(res.boxes, 1)))
+        tb.Button(win, text="Close", bootstyle=DANGER, command=win.destroy).pack(pady=5)
+
+    def _table_compare(self):
+        """Compare two spreadsheets cell by cell, then diff the panes as text"""
+        lp, rp, key = self.left_path, self.right_path, self.table_key.get().strip() or None
+
+        def work(job):
+            return handler("table").compare_tables(lp, rp, key)
+
+        def done(res):
+            self._show_table(res)
+            self._text_compare()
+
+        self._start_job(work, done, "Comparing cells...", determinate=False)
+
+    def _show_table(self, res):
+        """List the cell, row, column and sheet changes of a TableDiff"""
+        changes = list(res.changes())
+        win = Toplevel(self)
+        win.title(f"Table Compare - {os.path.basename(res.left)} ↔ {os.path.basename(res.right)}")
+        win.geometry("1000x500")
+
+        cols = ("Sheet", "Change", "Row", "Column", "Left", "Right")
+        tb.Label(win, text=f"{len(changes)} differences" + (f" (key: {res.key})" if res.key else "")
+                 ).pack(fill=X, padx=5, pady=3)
+        tree = ttk.Treeview(win, columns=cols, show="headings")
+        vsb = ttk.Scrollbar(win)
+        vsb.pack(side=RIGHT, fill=Y)
+        tree.pack(fill=BOTH, expand=True, side=LEFT)
+        for col, w in zip(cols, [120, 110, 120, 150, 220, 220]):
+            tree.heading(col, text=col)
+            tree.column(col, width=w)
+
+        rows = VirtualList(tree, tuple, vsb)
+        rows.set_rows(changes)
+        self.status.config(text=f"Table comparison complete - {len(changes)} differences")
 
     def merge_left(self):
         """Merge from right to left"""
@@ -599,14 +1296,7 @@ class BeyondCompareClone(tb.Window):
             return
         if not messagebox.askyesno("Confirm", "Merge all from Right to Left?"):
             return
-        try:
-            content = self.r_text.get("1.0", "end-1c")
-            with open(self.left_path, "w", encoding="utf-8") as f:
-                f.write(content)
-            messagebox.showinfo("Success", "Merged to left file.")
-            self._load(self.l_text, self.left_path, 1)
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self._merge_all(1)
 
     def merge_right(self):
         """Merge from left to right"""
@@ -615,40 +1305,213 @@ class BeyondCompareClone(tb.Window):
             return
         if not messagebox.askyesno("Confirm", "Merge all from Left to Right?"):
             return
+        self._merge_all(0)
+
+    def _merge_all(self, src):
+        """Copy every row from side src to the other side and save that file
+
+        This goes through the journal like a hunk copy, so it can be undone.
+        """
+        dst = 1 - src
+        name = ("left", "right")[dst]
+        if (self.left_type, self.right_type)[dst] != "text":
+            messagebox.showerror("Error", f"Only a text file can be merged into; the {name} one is not.")
+            return
         try:
-            content = self.l_text.get("1.0", "end-1c")
-            with open(self.right_path, "w", encoding="utf-8") as f:
-                f.write(content)
-            messagebox.showinfo("Success", "Merged to right file.")
-            self._load(self.r_text, self.right_path, 2)
+            self._flush_edits()
+            self._merged(self.journal.copy(self.align, self.diff_items, src, 0, len(self.align)))
+            write_lines((self.left_path, self.right_path)[dst], self.align.docs[dst])
+            self._unsaved.discard(dst)
+            messagebox.showinfo("Success", f"Merged to {name} file.")
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
-    def _populate_tree(self):
-        """Populate diff tree"""
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-
-        for idx, d in enumerate(self.diff_items, 1):
-            text = d.get("text", "")[:50]  # Truncate long lines
-            self.tree.insert("", END, values=(
-                d["type"].capitalize(),
-                d.get("l") or "-",
-                d.get("r") or "-",
-                text
-            ), iid=idx)
+    def copy_hunk_left(self):
+        """Copy the current hunk from right to left"""
+        self._copy_hunk(1)
+
+    def copy_hunk_right(self):
+        """Copy the current hunk from left to right"""
+        self._copy_hunk(0)
 
+    def _copy_hunk(self, src, row=None):
+        """Copy the hunk on row (the current diff's by default) from side src across"""
+        if not self._diffed or self._job or not self.diff_items:
+            return
+        self._flush_edits()
+        if not self.diff_items:
+            return
+        if row is None:
+            row = self.diff_items.row(min(self.current_diff, len(self.diff_items) - 1))
+        span = self.diff_items.hunk_at(row)
+        if span:
+            self._merged(self.journal.copy(self.align, self.diff_items, src, *span))
+
+    def undo_merge(self):
+        """Undo the latest hunk copy"""
+        self._flush_edits()
+        rec = self.journal.undo(self.align, self.diff_items)
+        if rec:
+            self._merged(rec)
+
+    def redo_merge(self):
+        """Redo the latest undone hunk copy"""
+        self._flush_edits()
+        rec = self.journal.redo(self.align, self.diff_items)
+        if rec:
+            self._merged(rec)
+
+    def _flush_edits(self):
+        """Commit typed edits and settle their diff, so rows are current"""
+        if self._rediff_job:
+            try:
+                self.after_cancel(self._rediff_job)
+            except:
+                pass
+            self._rediff_job = None
+        self._commit_edits()
+        if self._diffed and self.align.dirty:
+            self.align.rediff(self._options(), self.diff_items)
+
+    def _merged(self, rec):
+        """Redraw after a hunk copy, or its undo, described by a RowCopy
+
+        The copied rows come out the same on both sides, so nothing is
+        re-diffed; only the diff list and the visible rows are refreshed.
+        """
+        dst = 1 - rec.src
+        self._unsaved.add(dst)
+        hl = self._highlighters[dst]
+        if hl and hl.doc is self.align.docs[dst]:
+            hl.invalidate(rec.doc_start)
+        self._populate_tree()
+        if self.diff_items:
+            self.current_diff = min(self.diff_items.index_at(rec.start), len(self.diff_items) - 1)
+        self._render(force=True)
+        self.status.config(text=f"{len(self.diff_items)} differences left - "
+                                f"{'unsaved changes' if self._unsaved else 'saved'}")
+
+    def save_files(self):
+        """Write the panes changed by merges or edits back to their files"""
+        self._commit_edits()
+        for side in sorted(self._unsaved):
+            path = (self.left_path, self.right_path)[side]
+            if not path or (self.left_type, self.right_type)[side] != "text":
+                continue
+            try:
+                write_lines(path, self.align.docs[side])
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+                return
+            self._unsaved.discard(side)
+            self.status.config(text=f"Saved {os.path.basename(path)}")
+
+    def merge_three_way(self):
+        """Merge the left and right panes against a common ancestor file"""
+        if not (self.left_path and self.right_path):
+            messagebox.showinfo("3-Way Merge", "Load two files first.")
+            return
+        base = filedialog.askopenfilename(title="Common Ancestor (Base)")
+        if not base:
+            return
+        # The panes' documents are merged as they are, unsaved edits included
+        self._commit_edits()
+        left, right = self.align.docs
+        algo = self.diff_algo.get()
+        names = tuple(os.path.basename(p) for p in (self.left_path, base, self.right_path))
+
+        def work(job):
+            res = merge3(read_lines(base), left, right, algo,
+                         lambda done, total: job.progress(done / max(1, total)))
+            res.names = names
+            return res
+
+        self._start_job(work, self._show_merge3, "Merging...")
+
+    def _show_merge3(self, res):
+        """List the merged hunks, resolve conflicts and save the merged file"""
+        kinds = {"left": "Left", "right": "Right", "both": "Both Alike", "conflict": "Conflict"}
+        hunks = [h for h in res.hunks if h.tag != "same"]
+        self.status.config(text=f"3-way merge complete - {len(hunks)} changes, "
+                                f"{len(res.conflicts)} conflicts")
+
+        win = Toplevel(self)
+        win.title(f"3-Way Merge - {res.names[0]} ↔ {res.names[2]} (base {res.names[1]})")
+        win.geometry("1100x700")
+        summary = tb.Label(win)
+        summary.pack(fill=X, padx=5, pady=3)
+
+        def span(a, b):
+            return f"{a + 1}-{b}" if b > a else f"after {a}"
+
+        top = tb.Frame(win)
+        top.pack(fill=BOTH, expand=True)
+        cols = ("Kind", "Base", "Left", "Right", "Resolution")
+        tree = ttk.Treeview(top, columns=cols, show="headings", height=12)
+        vsb = ttk.Scrollbar(top)
+        vsb.pack(side=RIGHT, fill=Y)
+        tree.pack(fill=BOTH, expand=True)
+        for col, w in zip(cols, [110, 150, 150, 150, 120]):
+            tree.heading(col, text=col)
+            tree.column(col, width=w)
+        rows = VirtualList(tree, lambda h: (kinds[h.tag], span(h.b0, h.b1), span(h.l0, h.l1),
+                                            span(h.r0, h.r1),
+                                            (h.choice or "unresolved").title() if h.tag == "conflict" else ""), vsb)
+        rows.set_rows(hunks)
+
+        preview = ScrolledText(win, wrap="none", font=("Consolas", 11), height=14)
+        preview.pack(fill=BOTH, expand=True, padx=5, pady=3)
+
+        def show(e=None):
+            idx = rows.selected_index()
+            preview.delete("1.0", END)
+            if idx is not None:
+                preview.insert("1.0", "\n".join(res.hunk_lines(hunks[idx])))
+            summary.config(text=f"{len(hunks)} changes, {len(res.conflicts)} conflicts, "
+                                f"{res.unresolved} unresolved")
+
+        def take(choice):
+            idx = rows.selected_index()
+            if idx is not None and hunks[idx].tag == "conflict":
+                hunks[idx].choice = choice
+                rows.refresh()
+                show()
+
+        def save():
+            if res.unresolved and not messagebox.askyesno(
+                    "3-Way Merge", f"{res.unresolved} conflicts are unresolved. Save with conflict markers?"):
+                return
+            path = filedialog.asksaveasfilename(title="Save Merged File", initialfile=res.names[0])
+            if not path:
+                return
+            try:
+                write_lines(path, res.lines())
+                self.status.config(text=f"Merged file saved: {os.path.basename(path)}")
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+
+        tree.bind("<<TreeviewSelect>>", show, add="+")
+        bar = tb.Frame(win)
+        bar.pack(fill=X, padx=5, pady=5)
+        for text, choice in (("Take Left", "left"), ("Take Right", "right"),
+                             ("Take Both", "both"), ("Take Base", "base")):
+            tb.Button(bar, text=text, bootstyle=WARNING,
+                      command=lambda c=choice: take(c)).pack(side=LEFT, padx=2)
+        tb.Button(bar, text="Close", bootstyle=DANGER, command=win.destroy).pack(side=RIGHT, padx=2)
+        tb.Button(bar, text="Save Merged...", bootstyle=SUCCESS, command=save).pack(side=RIGHT, padx=2)
+        show()
+
+    def _populate_tree(self):
+        """Point the diff tree at the current diff items"""
+        self.diff_list.set_rows(self.diff_items)
         self.diff_lbl.config(text=f"{len(self.diff_items)} diffs")
         if self.diff_items:
             self.current_diff = 0
 
     def _jump_to(self, ev):
         """Jump to selected diff"""
-        sel = self.tree.selection()
-        if not sel:
-            return
-        idx = int(sel[0]) - 1
-        if 0 <= idx < len(self.diff_items):
+        idx = self.diff_list.selected_index()
+        if idx is not None and 0 <= idx < len(self.diff_items):
             self.current_diff = idx
             self._go_to_diff()
 
@@ -671,50 +1534,66 @@ class BeyondCompareClone(tb.Window):
 
         d = self.diff_items[self.current_diff]
 
-        # Clear previous selections
-        self.l_text.tag_remove("sel", "1.0", END)
-        self.r_text.tag_remove("sel", "1.0", END)
+        # Scroll the diff into the upper third of the viewport
+        self._scroll_to((d.l or d.r) - 1 - self.panes[0].visible_rows() // 3)
 
-        # Highlight and scroll to diff
-        if d.get("l"):
-            self.l_text.see(f"{d['l']}.0")
-            self.l_text.tag_add("sel", f"{d['l']}.0", f"{d['l']}.end")
-
-        if d.get("r"):
-            self.r_text.see(f"{d['r']}.0")
-            self.r_text.tag_add("sel", f"{d['r']}.0", f"{d['r']}.end")
+        # Highlight it
+        for pane, num in zip(self.panes, (d.l, d.r)):
+            pane.text.tag_remove("sel", "1.0", END)
+            if num:
+                ln = pane.line(num - 1)
+                pane.text.tag_add("sel", f"{ln}.0", f"{ln}.end")
 
         self.diff_lbl.config(text=f"{self.current_diff + 1}/{len(self.diff_items)}")
 
     def find_next(self):
-        """Find text in both panels"""
+        """Find the next row containing the search text in either panel"""
         term = self.search_var.get().strip()
         if not term:
             return
 
-        for w in (self.l_text, self.r_text):
+        self._commit_edits()
+        needle = term.lower()
+        if needle != self.search_term:
+            self.search_term = needle
+            self._find_row = -1
+
+        found = None
+        n = len(self.align)
+        for k in range(1, n + 1):
+            row = (self._find_row + k) % n
+            if needle in self.align.text(0, row).lower() or needle in self.align.text(1, row).lower():
+                found = row
+                break
+
+        if found is None:
+            self._mark_search()
+            messagebox.showinfo("Find", f"'{term}' not found.")
+            return
+
+        self._find_row = found
+        self._scroll_to(found - self.panes[0].visible_rows() // 3)
+        self._mark_search()
+
+    def _mark_search(self):
+        """Highlight search hits inside the rendered windows"""
+        for pane in self.panes:
+            w = pane.text
             try:
                 w.tag_remove("search", "1.0", "end")
             except:
                 pass
-
-        found = False
-        for w in (self.l_text, self.r_text):
+            if not self.search_term:
+                continue
             start = "1.0"
             while True:
-                pos = w.search(term, start, stopindex=END, nocase=True)
+                pos = w.search(self.search_term, start, stopindex=END, nocase=True)
                 if not pos:
                     break
-                end = f"{pos}+{len(term)}c"
+                end = f"{pos}+{len(self.search_term)}c"
                 w.tag_add("search", pos, end)
-                if not found:
-                    w.see(pos)
-                    found = True
                 start = end
 
-        if not found:
-            messagebox.showinfo("Find", f"'{term}' not found.")
-
     def compare_folders(self):
         """Compare two folders"""
         l = filedialog.askdirectory(title="Select Left Folder")
@@ -726,97 +1605,244 @@ class BeyondCompareClone(tb.Window):
         win.title("Folder Compare")
         win.geometry("1000x600")
 
+        bar = tb.Frame(win)
+        bar.pack(fill=X, padx=5, pady=3)
+        tb.Label(bar, text="Show:").pack(side=LEFT, padx=(0, 2))
+        show = StringVar(value="All")
+        tb.Combobox(bar, textvariable=show, width=12, state="readonly",
+                    values=("All", "Not Identical", "Different", "Only Left", "Only Right",
+                            "Identical")).pack(side=LEFT)
+        count_lbl = tb.Label(bar, text="")
+        count_lbl.pack(side=RIGHT)
+        tb.Button(bar, text="Export Report...", bootstyle=(INFO, OUTLINE),
+                  command=lambda: self.export_folder_report(l, r, list(rows.rows))).pack(side=RIGHT, padx=5)
+
+        prog_bar = tb.Progressbar(win, mode="indeterminate", bootstyle=SUCCESS)
+        prog_bar.pack(side=BOTTOM, fill=X, padx=5, pady=2)
+
         tree = ttk.Treeview(win, columns=("Status", "Path", "Size", "Mod"), show="headings")
+        vsb = ttk.Scrollbar(win)
+        vsb.pack(side=RIGHT, fill=Y)
+        tree.pack(fill=BOTH, expand=True, side=LEFT)
+
+        rows = VirtualList(tree, lambda e: (e.status, e.path, self._format_size(e.size),
+                                            self._fmt_time(e.mtime)), vsb)
+        rows.set_rows([])
+
+        keys = {
+            "Status": lambda e: e.status,
+            "Path": lambda e: e.path.split(os.sep),
+            "Size": lambda e: e.size,
+            "Mod": lambda e: e.mtime,
+        }
+        order = {"col": None, "reverse": False}
+
+        def sort(col):
+            # Click once to sort, again to reverse
+            order["reverse"] = order["col"] == col and not order["reverse"]
+            order["col"] = col
+            rows.sort_by(keys[col], order["reverse"])
+
         for col, w in zip(tree["columns"], [100, 500, 100, 150]):
-            tree.heading(col, text=col)
+            tree.heading(col, text=col, command=lambda c=col: sort(c))
             tree.column(col, width=w)
-        tree.pack(fill=BOTH, expand=True, side=LEFT)
 
-        vsb = ttk.Scrollbar(win, command=tree.yview)
-        vsb.pack(side=RIGHT, fill=Y)
-        tree.configure(yscrollcommand=vsb.set)
+        def refilter(*_):
+            choice = show.get()
+            if choice == "All":
+                rows.set_filter(None)
+            elif choice == "Not Identical":
+                rows.set_filter(lambda e: e.status != "Identical")
+            else:
+                rows.set_filter(lambda e: e.status == choice)
+            count_lbl.config(text=f"{len(rows)} of {len(rows.rows)} files")
+
+        show.trace_add("write", refilter)
 
         def dbl(e):
-            sel = tree.selection()
-            if not sel:
-                return
-            item = sel[0]
-            vals = tree.item(item, "values")
-            if not vals:
+            idx = rows.selected_index()
+            if idx is None:
                 return
-            rel = vals[1]
+            rel = rows.rows[idx].path
             lp = os.path.join(l, rel)
             rp = os.path.join(r, rel)
 
             if os.path.isfile(lp) and os.path.isfile(rp):
                 self.left_path, self.right_path = lp, rp
-                self._load(self.l_text, lp, 1)
-                self._load(self.r_text, rp, 2)
+                self._load(lp, 1)
+                self._load(rp, 2)
                 self.compare()
                 win.destroy()
 
         tree.bind("<Double-1>", dbl)
-        
-        prog_bar = tb.Progressbar(win, mode="indeterminate", bootstyle=SUCCESS)
-        prog_bar.pack(side=BOTTOM, fill=X, padx=5, pady=2)
+
+        def add(entries):
+            if not win.winfo_exists():
+                return
+            rows.append(entries)
+            count_lbl.config(text=f"{len(rows)} of {len(rows.rows)} files")
+
         prog_bar.start()
-        
-        threading.Thread(target=self._folder_worker, args=(l, r, tree, prog_bar, win), daemon=True).start()
+        threading.Thread(target=self._folder_worker, args=(l, r, add, prog_bar), daemon=True).start()
+
+    def compare_folder_tree(self):
+        """Compare two folders as a tree; subfolders are compared lazily"""
+        l = filedialog.askdirectory(title="Select Left Folder")
+        r = filedialog.askdirectory(title="Select Right Folder")
+        if not (l and r):
+            return
+
+        win = Toplevel(self)
+        win.title("Folder Compare")
+        win.geometry("1000x600")
+
+        bar = tb.Frame(win)
+        bar.pack(fill=X, padx=5, pady=3)
+        summary = tb.Label(bar, text="Comparing...", anchor="w")
+        summary.pack(side=LEFT, fill=X, expand=True)
+
+        tree = ttk.Treeview(win, columns=("Status", "Files", "LSize", "RSize"), show="tree headings")
+        tree.heading("#0", text="Name")
+        tree.column("#0", width=400)
+        for col, text, w in (("Status", "Status", 100), ("Files", "Differences", 120),
+                             ("LSize", "Left Size", 100), ("RSize", "Right Size", 100)):
+            tree.heading(col, text=text)
+            tree.column(col, width=w)
+        tree.tag_configure("Different", foreground="#E0B040")
+        tree.tag_configure("Only Left", foreground="#E07070")
+        tree.tag_configure("Only Right", foreground="#70C070")
+        tree.tag_configure("Pending", foreground="#888888")
+        vsb = ttk.Scrollbar(win, command=tree.yview)
+        vsb.pack(side=RIGHT, fill=Y)
+        tree.configure(yscrollcommand=vsb.set)
+        tree.pack(fill=BOTH, expand=True, side=LEFT)
+
+        changed = set()
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def on_change(node):
+            with lock:
+                changed.add(node)
+
+        fc = FolderCompare(l, r, self.fast_compare.get(), self.hash_algo.get(),
+                           background=not self.lazy_folders.get(), on_change=on_change)
+        nodes = {}      # iid -> FolderNode
+
+        def values(node):
+            if node.is_dir:
+                more = "" if node.complete else "+"
+                return (node.status, f"{node.differences} of {node.files}{more}",
+                        self._format_size(node.left_bytes), self._format_size(node.right_bytes))
+            return (node.status, "",
+                    self._format_size(node.left.st_size) if node.left else "",
+                    self._format_size(node.right.st_size) if node.right else "")
+
+        def add_children(node):
+            parent = "" if node is fc.root else str(id(node))
+            tree.delete(*tree.get_children(parent))
+            for ch in node.children:
+                iid = str(id(ch))
+                nodes[iid] = ch
+                tree.insert(parent, END, iid=iid, text=ch.name + (os.sep if ch.is_dir else ""),
+                            values=values(ch), tags=(ch.status,))
+                if ch.is_dir:
+                    # Placeholder so the folder can be expanded before it is listed
+                    tree.insert(iid, END, iid=iid + ":", text="Loading...")
+
+        def on_open(e):
+            node = nodes.get(tree.focus())
+            if node is None or not node.is_dir:
+                return
+            if node.children is None:
+                fc.prioritize(node)
+            elif tree.exists(str(id(node)) + ":"):
+                add_children(node)
+
+        def flush():
+            if not win.winfo_exists():
+                stop.set()
+                return
+            with lock:
+                batch = list(changed)
+                changed.clear()
+            for node in batch:
+                if node is fc.root:
+                    if node.children is not None and not tree.get_children(""):
+                        add_children(node)
+                    continue
+                iid = str(id(node))
+                if not tree.exists(iid):
+                    continue
+                tree.item(iid, values=values(node), tags=(node.status,))
+                if node.children is not None and tree.exists(iid + ":") and tree.item(iid, "open"):
+                    add_children(node)
+            root = fc.root
+            state = "" if root.complete else " (comparing...)"
+            summary.config(text=f"{root.status}: {root.differences} of {root.files} files differ, "
+                                f"{self._format_size(root.left_bytes)} left / "
+                                f"{self._format_size(root.right_bytes)} right{state}")
+            win.after(100, flush)
 
-    def _folder_worker(self, l, r, tree, prog_bar, win):
-        """Worker thread for folder comparison"""
-        def ins(st, p, sz="", m=""):
+        def dbl(e):
+            node = nodes.get(tree.focus())
+            if node is None or node.is_dir or not (node.left and node.right):
+                return
+            lp, rp = os.path.join(l, node.path), os.path.join(r, node.path)
+            self.left_path, self.right_path = lp, rp
+            self._load(lp, 1)
+            self._load(rp, 2)
+            self.compare()
+            win.destroy()
+
+        def close():
+            stop.set()
+            win.destroy()
+
+        def export():
+            # A finished compare is reported from its results, else run again in full
+            self.export_folder_report(l, r, list(fc.entries()) if fc.root.complete else None)
+
+        tb.Button(bar, text="Export Report...", bootstyle=(INFO, OUTLINE), command=export).pack(side=RIGHT)
+        tree.bind("<<TreeviewOpen>>", on_open)
+        tree.bind("<Double-1>", dbl)
+        win.protocol("WM_DELETE_WINDOW", close)
+        threading.Thread(target=fc.run, args=(stop,), daemon=True).start()
+        flush()
+
+    def _folder_worker(self, l, r, add, prog_bar):
+        """Worker thread for folder comparison; entries reach the list in batches"""
+        def post(entries):
             try:
-                self.after(0, lambda: tree.insert("", END, values=(st, p, sz, m)))
+                self.after(0, add, entries)
             except:
                 pass
 
-        # Scan left folder
-        left_files = {}
-        for root, _, files in os.walk(l):
-            rel = os.path.relpath(root, l)
-            for f in files:
-                path = os.path.join(rel, f) if rel != "." else f
-                left_files[path] = os.path.join(root, f)
-
-        # Scan right folder
-        right_files = {}
-        for root, _, files in os.walk(r):
-            rel = os.path.relpath(root, r)
-            for f in files:
-                path = os.path.join(rel, f) if rel != "." else f
-                right_files[path] = os.path.join(root, f)
-
-        # Compare
-        all_paths = set(left_files.keys()) | set(right_files.keys())
-
-        for path in sorted(all_paths):
-            if path in left_files and path not in right_files:
-                lp = left_files[path]
-                ins("Only Left", path, self._format_size(os.path.getsize(lp)), self._fmt(lp))
-
-            elif path not in left_files and path in right_files:
-                rp = right_files[path]
-                ins("Only Right", path, self._format_size(os.path.getsize(rp)), self._fmt(rp))
-
-            else:
-                lp = left_files[path]
-                rp = right_files[path]
+        def failed(e):
+            self.status.config(text="Folder compare failed")
+            messagebox.showerror("Folder Compare", f"Error during folder comparison: {e}")
 
-                if self.fast_compare.get():
-                    same = (os.path.getsize(lp) == os.path.getsize(rp) and
-                            abs(os.path.getmtime(lp) - os.path.getmtime(rp)) < 2)
-                else:
-                    same = self._hash(lp) == self._hash(rp)
-
-                ins("Identical" if same else "Different",
-                    path,
-                    self._format_size(os.path.getsize(lp)),
-                    self._fmt(lp))
+        batch = []
+        flushed = time.monotonic()
+        error = None
+        try:
+            for e in iter_tree(l, r, self.fast_compare.get(), hash_algo=self.hash_algo.get()):
+                batch.append(e)
+                if len(batch) >= 1000 or time.monotonic() - flushed > 0.1:
+                    post(batch)
+                    batch = []
+                    flushed = time.monotonic()
+        except Exception as e:
+            error = e
+        # Whatever was found before a failure is still listed
+        post(batch)
 
         try:
             self.after(0, lambda: prog_bar.stop())
-            self.after(0, lambda: self.status.config(text="Folder compare finished"))
+            if error is not None:
+                self.after(0, failed, error)
+            else:
+                self.after(0, lambda: self.status.config(text="Folder compare finished"))
         except:
             pass
 
@@ -828,10 +1854,10 @@ class BeyondCompareClone(tb.Window):
             size /= 1024
         return f"{size:.1f} TB"
 
-    def _fmt(self, p):
+    def _fmt_time(self, ts):
         """Format file modification time"""
         try:
-            return datetime.fromtimestamp(os.path.getmtime(p)).strftime("%Y-%m-%d %H:%M")
+            return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
         except:
             return ""
 
@@ -849,71 +1875,114 @@ class BeyondCompareClone(tb.Window):
         m.add_cascade(label="File", menu=file_menu)
 
         tools = tb.Menu(m, tearoff=0)
-        tools.add_command(label="Compare Folders", command=self.compare_folders)
-        tools.add_command(label="Generate Report", command=self._report)
+        tools.add_command(label="Compare Folders", command=self.compare_folder_tree)
+        tools.add_command(label="Compare Folders (Flat List)", command=self.compare_folders)
+        tools.add_command(label="Generate Report", command=self.export_report)
         m.add_cascade(label="Tools", menu=tools)
 
         self.config(menu=m)
 
-    def _report(self):
-        """Generate comparison report"""
-        if self.diff_mode.get() != "side":
-            messagebox.showinfo("Report", "Only available in Side-by-Side mode.")
+    def _ask_report(self):
+        """Ask where to save a report; the extension picks its format"""
+        return filedialog.asksaveasfilename(
+            title="Save Report", defaultextension=".html",
+            filetypes=[("HTML Report", "*.html"), ("Patch", "*.patch *.diff"),
+                       ("JSON Lines", "*.jsonl"), ("All Files", "*.*")])
+
+    def _write_report(self, path, write):
+        """Run write(out) in the background on the report file at path"""
+        if self._job:
+            messagebox.showinfo("Report", "Wait for the running comparison to finish.")
             return
 
-        if not self.diff_items:
-            messagebox.showinfo("Report", "No differences to report. Run comparison first.")
+        def work(job):
+            with open(path, "w", encoding="utf-8", newline="\n") as out:
+                write(out)
+
+        def done(_):
+            self.status.config(text=f"Report saved to {path}")
+
+        self._start_job(work, done, "Writing report...", determinate=False)
+
+    def export_report(self):
+        """Write the current comparison to an HTML, patch or JSON lines report
+
+        Reports are streamed to the file while the diff is walked, so very
+        large diffs are saved without building the report in memory.
+        """
+        self._flush_edits()
+        left, right = self.align.docs
+        if not any(left) and not any(right):
+            messagebox.showinfo("Report", "Nothing to report. Load two files first.")
+            return
+        p = self._ask_report()
+        if not p:
             return
+        fmt = report_format(p)
+        lp, rp = self.left_path or "Left", self.right_path or "Right"
+        opts, types = self._options(), {self.left_type, self.right_type}
 
-        lines = [
-            f"Beyond Compare Clone – Comparison Report",
-            f"Generated: {datetime.now():%Y-%m-%d %H:%M:%S}",
-            "=" * 70,
-            f"Left : {self.left_path or 'N/A'}",
-            f"Right: {self.right_path or 'N/A'}",
-            "",
-            f"Total Differences: {len(self.diff_items)}",
-            "=" * 70,
-            ""
-        ]
-
-        for d in self.diff_items:
-            dtype = d["type"]
-            if dtype == "removed":
-                lines.append(f"[-] Line {d.get('l', '?')}: {d['text']}")
-            elif dtype == "added":
-                lines.append(f"[+] Line {d.get('r', '?')}: {d['text']}")
-            elif dtype == "changed":
-                lines.append(f"[~] Line {d.get('l', '?')} ↔ {d.get('r', '?')}: {d['text']}")
-
-        p = filedialog.asksaveasfilename(
-            defaultextension=".txt",
-            filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
-        )
+        if types & {"large", "binary", "image"}:
+            if not (self.left_path and self.right_path):
+                messagebox.showinfo("Report", "Load two files first.")
+                return
+            if types & {"binary", "image"}:
+                algo = self.hash_algo.get()
+                write = lambda out: write_result(out, fmt, compare_files(lp, rp, opts, algo), lp, rp)
+            else:
+                write = lambda out: write_stream(out, fmt, lp, rp, opts)
+        elif self._diffed:
+            # The worker reads a copy, so the panes stay editable meanwhile
+            al, items = self.align.snapshot(self.diff_items)
+            write = lambda out: write_diff(out, fmt, al, items, lp, rp)
+        else:
+            left, right = list(left), list(right)
 
-        if p:
-            try:
-                with open(p, "w", encoding="utf-8") as f:
-                    f.write("\n".join(lines))
-                messagebox.showinfo("Saved", f"Report saved to:\n{p}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save report: {e}")
+            def write(out):
+                res = compare_text(left, right, opts)
+                write_diff(out, fmt, res.align, res.items, lp, rp)
+
+        self._write_report(p, write)
+
+    def export_folder_report(self, l, r, entries=None):
+        """Write a folder compare to a report
+
+        Without entries the folders are compared again while the report is
+        written, a file at a time.
+        """
+        p = self._ask_report()
+        if not p:
+            return
+        fmt, opts = report_format(p), self._options()
+        fast, algo = self.fast_compare.get(), self.hash_algo.get()
+
+        def write(out):
+            rows = iter_tree(l, r, fast, hash_algo=algo) if entries is None else entries
+            write_tree(out, fmt, l, r, rows, lambda lp, rp: file_patch(lp, rp, opts, hash_algo=algo))
+
+        self._write_report(p, write)
 
     def clear(self):
         """Clear both panels"""
-        self.l_text.delete("1.0", END)
-        self.r_text.delete("1.0", END)
+        self.cancel_compare()
+        self._diffed = False
         self.left_path = self.right_path = ""
         self.left_type = self.right_type = ""
-        self.diff_items = []
+        self.align = Alignment.plain([""], [""])
+        self.top = 0
+        for pane in self.panes:
+            pane.rendered = None
+        self.diff_items = DiffItems(self.align)
+        self.journal.clear()
+        self._unsaved.clear()
         self.current_diff = 0
+        self.search_term = ""
         self._clear_tags()
-        self._update_nums()
+        self._render(force=True)
         self.arrow_canvas.delete("all")
         self.move_arrows = []
 
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+        self.diff_list.set_rows([])
 
         self.diff_lbl.config(text="0/0")
         self.status.config(text="Ready")
@@ -921,16 +1990,41 @@ class BeyondCompareClone(tb.Window):
     def _clear_tags(self):
         """Clear all tags from text widgets"""
         for w in (self.l_text, self.r_text):
-            for t in ("added", "removed", "moved", "changed", "same", "search", "sel"):
+            for t in ("added", "removed", "moved", "changed", "inline", "same", "search", "sel"):
                 try:
                     w.tag_remove(t, "1.0", END)
                 except:
                     pass
 
+        self._unified_fill = None
         if self.unified.winfo_ismapped():
             self.unified.pack_forget()
 
 
+def bench_startup(budget=STARTUP_BUDGET):
+    """Open the main window, report how long that took and return 1 over budget
+
+    Startup also fails if a module in LAZY_MODULES was imported on the way.
+    """
+    app = BeyondCompareClone()
+    app.update()
+    elapsed = (time.perf_counter() - _STARTED) * 1000
+    eager = [m for m in LAZY_MODULES if m in sys.modules]
+    app.destroy()
+    print(f"Window shown in {elapsed:.0f} ms (budget {budget:.0f} ms)")
+    if eager:
+        print(f"Imported at startup: {', '.join(eager)}")
+    return 0 if elapsed <= budget and not eager else 1
+
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    if sys.argv[1:2] == ["--bench-startup"]:
+        # codeCompare --bench-startup [budget in ms]
+        sys.exit(bench_startup(*map(float, sys.argv[2:3])))
+    if len(sys.argv) > 1:
+        # Headless batch mode: codeCompare --left A --right B ...
+        from cli import main
+        sys.exit(main())
     app = BeyondCompareClone()
     app.mainloop()
\ No newline at end of file
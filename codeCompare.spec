@@ -6,7 +6,8 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # Format handlers are imported by name on first use (see formats.py)
+    hiddenimports=['tabular', 'doctext', 'imagediff', 'bindiff'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,1953 @@
+# -*- coding: utf-8 -*-
+"""
+Headless diff core for Beyond Compare + Meld Clone
+Diff engines (Myers, patience, histogram), text/file/tree comparison and
+typed results – no Tk, ttkbootstrap, pandas or PIL imports
+"""
+
+import os
+import re
+import time
+import queue
+import shutil
+import hashlib
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from itertools import count
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from formats import FORMATS, detect_type, handler
+from hashcache import Recorder, cache_dir, get_cache
+
+try:
+    import xxhash
+except ImportError:  # optional, falls back to hashlib
+    xxhash = None
+
+DIFF_ALGORITHMS = ("myers", "patience", "histogram", "difflib")
+
+# Histogram diff gives up on lines that repeat more often than this
+MAX_CHAIN = 64
+
+# Myers search depth (edit distance D) past which a region is split at the
+# furthest point reached instead of on an optimal path, as in GNU diff
+TOO_EXPENSIVE = 64
+
+# Moved blocks need this many non-blank lines; shorter ones stay plain edits
+MIN_MOVE = 3
+
+# Replace blocks up to this many line pairs are paired by similarity,
+# larger ones by position; lines less similar than PAIR_CUTOFF stay unpaired
+PAIR_LIMIT = 40_000
+PAIR_CUTOFF = 0.5
+
+# Intra-line diff: longer lines only get their common ends trimmed, and
+# replaced token runs up to CHAR_LEVEL characters are diffed by character
+INLINE_MAX = 20_000
+CHAR_LEVEL = 64
+
+_TOKEN = re.compile(r"\w+|\s+|[^\w\s]")
+
+# Content hashing
+HASH_ALGORITHMS = (("xxh3_64", "xxh64") if xxhash else ()) + ("blake2b", "md5", "sha1")
+DEFAULT_HASH = HASH_ALGORITHMS[0]
+READ_SIZE = 1 << 20       # 1 MiB reads
+EDGE_SIZE = 64 * 1024     # head/tail bytes hashed before a full hash
+
+# Folder compare: content checks sent to a worker process at a time, and
+# the longest a partial batch waits for more
+CHECK_BATCH = 64
+CHECK_WAIT = 0.2
+MAX_PENDING = 10_000      # scanned entries held back waiting for checks
+
+# Rows (or hunks) after an edit beyond which they are shifted with NumPy
+SHIFT_ROWS = 50_000
+
+# Extracted document texts kept in the disk cache, and lines of them in memory
+TEXT_CACHE_FILES = 200
+TEXT_CACHE_LINES = 2_000_000
+
+
+class Cancelled(Exception):
+    """Raised from a progress callback to abort a running comparison"""
+
+
+def _size(region):
+    alo, ahi, blo, bhi = region
+    return ahi - alo + bhi - blo
+
+
+def _intern(a, b):
+    """Map lines to small ints so the engines compare ints, not strings"""
+    ids = {}
+    a = [ids.setdefault(x, len(ids)) for x in a]
+    b = [ids.setdefault(x, len(ids)) for x in b]
+    return a, b
+
+
+def _trim(a, b, alo, ahi, blo, bhi, out):
+    """Strip common prefix/suffix of a region, recording them as matches"""
+    s = alo
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        alo += 1
+        blo += 1
+    if alo > s:
+        out.append((s, blo - (alo - s), alo - s))
+    e = ahi
+    while ahi > alo and bhi > blo and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+    if e > ahi:
+        out.append((ahi, bhi, e - ahi))
+    return alo, ahi, blo, bhi
+
+
+def _furthest(v, off, d, n, m):
+    """(x, y) reached furthest along the diagonals of one search direction"""
+    best, bx, by = -1, 0, 0
+    for k in range(-d, d + 1, 2):
+        x = v[off + k]
+        y = x - k
+        if 0 <= x <= n and 0 <= y <= m and x + y > best:
+            best, bx, by = x + y, x, y
+    return bx, by
+
+
+def _middle_snake(a, alo, ahi, b, blo, bhi, tick=None):
+    """Find the middle snake of an optimal edit path (Myers 1986, section 4b)
+
+    Past a search depth of TOO_EXPENSIVE the optimal path is given up: an
+    empty snake is returned at the point either direction got furthest, so
+    badly diverging regions cost O((N + M) * TOO_EXPENSIVE), not O(N * M).
+    """
+    n = ahi - alo
+    m = bhi - blo
+    delta = n - m
+    odd = delta & 1
+    maxd = (n + m + 1) // 2
+    off = maxd + 1
+    vf = [0] * (2 * off + 1)
+    vb = [0] * (2 * off + 1)
+
+    for d in range(maxd + 1):
+        if tick and not d & 255:
+            tick(0)     # long searches still honour cancellation
+
+        # Forward pass
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and vf[off + k - 1] < vf[off + k + 1]):
+                x = vf[off + k + 1]
+            else:
+                x = vf[off + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            vf[off + k] = x
+            if odd and delta - d < k < delta + d and vf[off + k] + vb[off + delta - k] >= n:
+                return alo + x0, blo + y0, alo + x, blo + y
+
+        # Backward pass, in reversed coordinates
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and vb[off + k - 1] < vb[off + k + 1]):
+                x = vb[off + k + 1]
+            else:
+                x = vb[off + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                x += 1
+                y += 1
+            vb[off + k] = x
+            if not odd and -d <= delta - k <= d and vb[off + k] + vf[off + delta - k] >= n:
+                return ahi - x, bhi - y, ahi - x0, bhi - y0
+
+        if d >= TOO_EXPENSIVE:
+            fx, fy = _furthest(vf, off, d, n, m)
+            bx, by = _furthest(vb, off, d, n, m)
+            if bx + by > fx + fy:
+                fx, fy = n - bx, m - by
+            if 0 < fx + fy < n + m:
+                return alo + fx, blo + fy, alo + fx, blo + fy
+
+    raise AssertionError("middle snake not found")
+
+
+def _myers_blocks(a, b, alo, ahi, blo, bhi, out, tick=None):
+    """Linear-space Myers diff; appends matching blocks to out
+
+    tick(k), if given, is told each time k more lines are settled.
+    """
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        region = stack.pop()
+        alo, ahi, blo, bhi = _trim(a, b, *region, out)
+        if alo == ahi or blo == bhi:
+            if tick:
+                tick(_size(region))
+            continue
+        x, y, u, v = _middle_snake(a, alo, ahi, b, blo, bhi, tick)
+        if u > x:
+            out.append((x, y, u - x))
+        stack.append((alo, x, blo, y))
+        stack.append((u, ahi, v, bhi))
+        if tick:
+            tick(_size(region) - _size(stack[-1]) - _size(stack[-2]))
+
+
+def _lis(pairs):
+    """Longest increasing subsequence of pairs (sorted by j) on i"""
+    tails = []
+    tail_idx = []
+    prev = [-1] * len(pairs)
+    for idx, (i, _) in enumerate(pairs):
+        pos = bisect_left(tails, i)
+        if pos == len(tails):
+            tails.append(i)
+            tail_idx.append(idx)
+        else:
+            tails[pos] = i
+            tail_idx[pos] = idx
+        prev[idx] = tail_idx[pos - 1] if pos else -1
+
+    result = []
+    idx = tail_idx[-1] if tail_idx else -1
+    while idx >= 0:
+        result.append(pairs[idx])
+        idx = prev[idx]
+    result.reverse()
+    return result
+
+
+def _patience_blocks(a, b, alo, ahi, blo, bhi, out, tick=None):
+    """Patience diff: anchor on lines unique to both sides, Myers in between"""
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        region = stack.pop()
+        alo, ahi, blo, bhi = _trim(a, b, *region, out)
+        if alo == ahi or blo == bhi:
+            if tick:
+                tick(_size(region))
+            continue
+        if tick:
+            tick(_size(region) - _size((alo, ahi, blo, bhi)))
+
+        # line -> index in a, or -1 once it is seen twice
+        uniq = {}
+        for i in range(alo, ahi):
+            uniq[a[i]] = -1 if a[i] in uniq else i
+        seen = {}
+        for j in range(blo, bhi):
+            x = b[j]
+            if uniq.get(x, -1) >= 0:
+                seen[x] = -1 if x in seen else j
+        pairs = [(uniq[x], j) for x, j in seen.items() if j >= 0]
+
+        if not pairs:
+            _myers_blocks(a, b, alo, ahi, blo, bhi, out, tick)
+            continue
+
+        pairs.sort(key=lambda p: p[1])
+        pi, pj = alo, blo
+        anchors = _lis(pairs)
+        for i, j in anchors:
+            stack.append((pi, i, pj, j))
+            out.append((i, j, 1))
+            pi, pj = i + 1, j + 1
+        stack.append((pi, ahi, pj, bhi))
+        if tick:
+            tick(2 * len(anchors))
+
+
+def _histogram_blocks(a, b, alo, ahi, blo, bhi, out, tick=None):
+    """Histogram diff (as in git/JGit): split on the rarest common run"""
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        region = stack.pop()
+        alo, ahi, blo, bhi = _trim(a, b, *region, out)
+        if alo == ahi or blo == bhi:
+            if tick:
+                tick(_size(region))
+            continue
+        if tick:
+            tick(_size(region) - _size((alo, ahi, blo, bhi)))
+
+        index = {}
+        for i in range(alo, ahi):
+            index.setdefault(a[i], []).append(i)
+
+        best = None
+        best_len = 0
+        best_cnt = MAX_CHAIN + 1
+        j = blo
+        while j < bhi:
+            occ = index.get(b[j])
+            if occ is None or len(occ) > best_cnt:
+                j += 1
+                continue
+            nxt = j + 1
+            for i in occ:
+                cnt = len(occ)
+                sa, sb = i, j
+                while sa > alo and sb > blo and a[sa - 1] == b[sb - 1]:
+                    sa -= 1
+                    sb -= 1
+                    cnt = min(cnt, len(index[a[sa]]))
+                ea, eb = i + 1, j + 1
+                while ea < ahi and eb < bhi and a[ea] == b[eb]:
+                    cnt = min(cnt, len(index[a[ea]]))
+                    ea += 1
+                    eb += 1
+                if ea - sa > best_len or cnt < best_cnt:
+                    best = (sa, sb, ea - sa)
+                    best_len = ea - sa
+                    best_cnt = cnt
+                nxt = max(nxt, eb)
+            j = nxt
+
+        if best is None:
+            _myers_blocks(a, b, alo, ahi, blo, bhi, out, tick)
+            continue
+
+        sa, sb, size = best
+        out.append(best)
+        stack.append((alo, sa, blo, sb))
+        stack.append((sa + size, ahi, sb + size, bhi))
+        if tick:
+            tick(2 * size)
+
+
+_ENGINES = {
+    "myers": _myers_blocks,
+    "patience": _patience_blocks,
+    "histogram": _histogram_blocks,
+}
+
+
+def _opcodes(blocks, n, m):
+    """Turn matching blocks into SequenceMatcher-style opcodes"""
+    blocks.sort()
+    merged = []
+    for blk in blocks:
+        if not blk[2]:
+            continue
+        if merged and merged[-1][0] + merged[-1][2] == blk[0] and merged[-1][1] + merged[-1][2] == blk[1]:
+            i, j, size = merged[-1]
+            merged[-1] = (i, j, size + blk[2])
+        else:
+            merged.append(blk)
+    merged.append((n, m, 0))
+
+    codes = []
+    i = j = 0
+    for ai, bj, size in merged:
+        if i < ai and j < bj:
+            codes.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            codes.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            codes.append(("insert", i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            codes.append(("equal", ai, i, bj, j))
+    return codes
+
+
+def _ticker(progress, total):
+    """Turn progress(done, total) into the engines' tick(k) callback"""
+    done = 0
+
+    def tick(k):
+        nonlocal done
+        done += k
+        progress(done, total)
+    return tick
+
+
+def _discard(ia, ib):
+    """Drop lines the other side lacks, as GNU diff does; they can never match
+
+    Returns the kept lines of each side and their indexes in the originals.
+    """
+    sa, sb = set(ia), set(ib)
+    amap = [i for i, x in enumerate(ia) if x in sb]
+    bmap = [j for j, x in enumerate(ib) if x in sa]
+    return [ia[i] for i in amap], [ib[j] for j in bmap], amap, bmap
+
+
+def _restore(blocks, amap, bmap):
+    """Matching blocks of the discarded lists, in the original line numbers"""
+    out = []
+    for i, j, size in blocks:
+        if not size:
+            continue
+        if amap[i + size - 1] - amap[i] == bmap[j + size - 1] - bmap[j] == size - 1:
+            out.append((amap[i], bmap[j], size))
+            continue
+        # Discarded lines broke the run up
+        start = 0
+        for k in range(1, size + 1):
+            if k == size or amap[i + k] != amap[i + k - 1] + 1 or bmap[j + k] != bmap[j + k - 1] + 1:
+                out.append((amap[i + start], bmap[j + start], k - start))
+                start = k
+    return out
+
+
+def get_opcodes(a, b, algorithm="myers", progress=None):
+    """Diff two line lists; returns (tag, i1, i2, j1, j2) like SequenceMatcher
+
+    progress(done, total), if given, is called as lines are settled; it may
+    raise Cancelled to abort the diff. Lines found on one side only are
+    dropped before the engine runs, so heavily edited files stay cheap.
+    """
+    total = len(a) + len(b)
+    if algorithm == "difflib":
+        codes = SequenceMatcher(None, a, b).get_opcodes()
+        if progress:
+            progress(total, total)
+        return codes
+    try:
+        engine = _ENGINES[algorithm]
+    except KeyError:
+        raise ValueError(f"Unknown diff algorithm: {algorithm}") from None
+
+    ia, ib = _intern(a, b)
+    n, m = len(ia), len(ib)
+    ia, ib, amap, bmap = _discard(ia, ib)
+    tick = _ticker(progress, total) if progress else None
+    if tick and len(ia) + len(ib) < total:
+        tick(total - len(ia) - len(ib))
+    blocks = []
+    engine(ia, ib, 0, len(ia), 0, len(ib), blocks, tick)
+    if len(ia) < n or len(ib) < m:
+        blocks = _restore(blocks, amap, bmap)
+    return _opcodes(blocks, n, m)
+
+
+def grouped_opcodes(codes, n=3):
+    """Group opcodes into hunks with n lines of context (difflib semantics)"""
+    codes = list(codes)
+    if not codes:
+        codes = [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    nn = n + n
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > nn:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _range(start, stop):
+    """Unified diff range, 1-based (difflib format)"""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def unified_diff(a, b, fromfile="", tofile="", n=3, algorithm="myers"):
+    """Unified diff lines (no line terminators) using the selected engine"""
+    return _unified(a, b, get_opcodes(a, b, algorithm), fromfile, tofile, n)
+
+
+def _unified(a, b, opcodes, fromfile, tofile, n):
+    started = False
+    for group in grouped_opcodes(opcodes, n):
+        if not started:
+            started = True
+            yield f"--- {fromfile}"
+            yield f"+++ {tofile}"
+        first, last = group[0], group[-1]
+        yield f"@@ -{_range(first[1], last[2])} +{_range(first[3], last[4])} @@"
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in a[i1:i2]:
+                    yield " " + line
+                continue
+            if tag in ("replace", "delete"):
+                for line in a[i1:i2]:
+                    yield "-" + line
+            if tag in ("replace", "insert"):
+                for line in b[j1:j2]:
+                    yield "+" + line
+
+
+# ----------------------------------------------------------------------
+# Results
+# ----------------------------------------------------------------------
+
+@dataclass
+class DiffOptions:
+    ignore_ws: bool = False
+    ignore_case: bool = False
+    ignore_blank: bool = False
+    algorithm: str = "myers"
+    detect_moves: bool = True
+
+
+@dataclass
+class Move:
+    """Block of lines deleted in one place and inserted in another
+
+    i1:i2 and j1:j2 are processed line ranges; left_row and right_row are
+    the first aligned rows of the block on each side, filled in when the
+    rows are built.
+    """
+    i1: int
+    i2: int
+    j1: int
+    j2: int
+    left_row: int = -1
+    right_row: int = -1
+
+    @property
+    def size(self):
+        return self.i2 - self.i1
+
+
+@dataclass
+class DiffItem:
+    type: str                 # "added" | "removed" | "changed"
+    l: Optional[int]          # 1-based aligned row in the left pane
+    r: Optional[int]          # 1-based aligned row in the right pane
+    text: str
+
+
+def _shift_array(arr, start, n, real_only=False):
+    """Add n to arr[start:] in place; with real_only, -1 fillers are kept"""
+    if not n or start >= len(arr):
+        return
+    np = None
+    if len(arr) - start > SHIFT_ROWS:
+        try:
+            import numpy as np
+        except ImportError:
+            pass
+    if np is None:
+        arr[start:] = array(arr.typecode, (v + n if v >= 0 or not real_only else v
+                                           for v in arr[start:]))
+        return
+    # Long tails are shifted in place through a NumPy view of the array
+    view = np.frombuffer(arr, np.dtype(arr.typecode))[start:]
+    if real_only:
+        view[view >= 0] += n
+    else:
+        view += n
+    del view
+
+
+class DiffItems:
+    """Per-line differences of an Alignment, stored as hunks of rows
+
+    Only hunk boundaries are kept (array('i') columns); the DiffItem for
+    a line is built on demand from the alignment's tags and documents.
+    """
+
+    __slots__ = ("align", "starts", "stops", "offsets")
+
+    def __init__(self, align):
+        self.align = align
+        self.starts = array("i")     # first row of each hunk (0-based)
+        self.stops = array("i")      # row after the last one
+        self.offsets = array("q")    # items before each hunk
+
+    def add_hunk(self, start, stop):
+        if stop <= start:
+            return
+        if self.stops and self.stops[-1] == start:
+            self.stops[-1] = stop
+            return
+        self.offsets.append(len(self))
+        self.starts.append(start)
+        self.stops.append(stop)
+
+    def __len__(self):
+        if not self.starts:
+            return 0
+        return self.offsets[-1] + self.stops[-1] - self.starts[-1]
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    def row(self, k):
+        """Aligned row (0-based) of item k"""
+        if not 0 <= k < len(self):
+            raise IndexError(k)
+        h = bisect_right(self.offsets, k) - 1
+        return self.starts[h] + k - self.offsets[h]
+
+    def index_at(self, row):
+        """Index of the first item on or after row"""
+        h = bisect_right(self.starts, row) - 1
+        if h < 0:
+            return 0
+        return self.offsets[h] + min(max(0, row - self.starts[h]), self.stops[h] - self.starts[h])
+
+    def item_at_row(self, row):
+        al = self.align
+        ltag, rtag = al.tag(0, row), al.tag(1, row)
+        n = row + 1
+        if ltag == "removed" or (rtag != "added" and al.index[1][row] < 0):
+            return DiffItem("removed", n, None, al.text(0, row))
+        if rtag == "added" or al.index[0][row] < 0:
+            return DiffItem("added", None, n, al.text(1, row))
+        return DiffItem("changed", n, n, f"{al.text(0, row)} → {al.text(1, row)}")
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += len(self)
+        return self.item_at_row(self.row(k))
+
+    def __iter__(self):
+        for start, stop in zip(self.starts, self.stops):
+            for row in range(start, stop):
+                yield self.item_at_row(row)
+
+    def in_rows(self, start, stop):
+        """Items on rows [start, stop), e.g. the viewport"""
+        for k in range(self.index_at(start), self.index_at(stop)):
+            yield self[k]
+
+    def splice(self, start, stop, sub):
+        """Replace the hunks on rows [start, stop) with those of sub
+
+        sub holds the hunks of the rebuilt rows, counted from start; later
+        hunks move by the change in row count.
+        """
+        n = len(sub.align) - (stop - start)
+        a = bisect_right(self.stops, start)
+        b = bisect_left(self.starts, stop)
+        self.starts[a:b] = array("i", (r + start for r in sub.starts))
+        self.stops[a:b] = array("i", (r + start for r in sub.stops))
+        self.offsets[a:b] = array("q", bytes(8 * len(sub.starts)))
+        c = a + len(sub.starts)
+        _shift_array(self.starts, c, n)
+        _shift_array(self.stops, c, n)
+        for h in range(a, c):
+            self.offsets[h] = self._offset_after(h - 1)
+        # Later hunks keep their sizes, so their offsets move together
+        if c < len(self.offsets):
+            _shift_array(self.offsets, c, self._offset_after(c - 1) - self.offsets[c])
+
+    def _offset_after(self, h):
+        """Items in hunks up to and including h"""
+        return self.offsets[h] + self.stops[h] - self.starts[h] if h >= 0 else 0
+
+    def hunk_at(self, row):
+        """(start, stop) rows of the hunk holding row, or None on an unchanged row"""
+        h = bisect_right(self.starts, row) - 1
+        if h >= 0 and row < self.stops[h]:
+            return self.starts[h], self.stops[h]
+        return None
+
+    def shift(self, row, n):
+        """Rows at or after row moved by n (after an edit inserted rows)"""
+        h = bisect_left(self.starts, row)
+        _shift_array(self.starts, h, n)
+        _shift_array(self.stops, h, n)
+        if h and self.stops[h - 1] > row:
+            # The hunk holding row grows, and so do the offsets after it
+            self.stops[h - 1] += n
+            _shift_array(self.offsets, h, n)
+
+
+# Row tags of an Alignment, stored as indexes into this tuple
+ROW_TAGS = ("", "same", "removed", "added", "changed", "moved")
+_TAG_CODE = {t: i for i, t in enumerate(ROW_TAGS)}
+
+
+class Alignment:
+    """Side-by-side rows of two documents, kept as compact arrays
+
+    Row r of side s shows docs[s][index[s][r]], or a blank filler row when
+    the index is -1; tags[s][r] is an index into ROW_TAGS. Rows are 0-based.
+    dirty is the [start, stop) span of rows edited since the last rediff().
+    moves are the Move blocks shown, with rows kept in step with edits.
+    """
+
+    __slots__ = ("docs", "index", "tags", "dirty", "moves")
+
+    def __init__(self, left, right):
+        self.docs = (left, right)
+        self.index = (array("i"), array("i"))
+        self.tags = (array("b"), array("b"))
+        self.dirty = None
+        self.moves = []
+
+    def _shift_moves(self, row, n):
+        for mv in self.moves:
+            if mv.left_row >= row:
+                mv.left_row += n
+            if mv.right_row >= row:
+                mv.right_row += n
+
+    @classmethod
+    def plain(cls, left, right):
+        """Unaligned view: row r is line r of each document"""
+        al = cls(left, right)
+        n = max(len(left), len(right))
+        for side, doc in enumerate(al.docs):
+            al.index[side].extend(range(len(doc)))
+            al.index[side].extend([-1] * (n - len(doc)))
+            al.tags[side].extend(bytes(n))
+        return al
+
+    def __len__(self):
+        return len(self.index[0])
+
+    def append(self, li, ri, ltag, rtag):
+        self.index[0].append(li)
+        self.index[1].append(ri)
+        self.tags[0].append(_TAG_CODE[ltag])
+        self.tags[1].append(_TAG_CODE[rtag])
+
+    def text(self, side, row):
+        i = self.index[side][row]
+        return self.docs[side][i] if i >= 0 else ""
+
+    def texts(self, side, start, stop):
+        doc = self.docs[side]
+        return [doc[i] if i >= 0 else "" for i in self.index[side][start:stop]]
+
+    def tag(self, side, row):
+        return ROW_TAGS[self.tags[side][row]]
+
+    def row_tags(self, side, start, stop):
+        return [ROW_TAGS[t] for t in self.tags[side][start:stop]]
+
+    def line_numbers(self, side, start, stop):
+        """1-based document line per row, None for filler rows"""
+        return [i + 1 if i >= 0 else None for i in self.index[side][start:stop]]
+
+    def doc_pos(self, side, row):
+        """Document index of the first real row at or after row"""
+        idx = self.index[side]
+        for r in range(row, len(idx)):
+            if idx[r] >= 0:
+                return idx[r]
+        return len(self.docs[side])
+
+    def edit(self, side, start, stop, new):
+        """Replace rendered rows [start, stop) of one side with edited text
+
+        Unchanged rows keep their document line (or stay fillers); changed
+        and typed rows become document lines. Row counts stay in step: a
+        shrunk window is padded with fillers, a grown one inserts fillers
+        into the other side. Returns the number of rows inserted at stop.
+        """
+        idx, tags, doc = self.index[side], self.tags[side], self.docs[side]
+        old = self.texts(side, start, stop)
+
+        entries = []      # (old row or None, text) per new row
+        changed = []      # window rows of the edits
+        for op, i1, i2, j1, j2 in SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+            if op == "equal":
+                entries.extend((start + i, None) for i in range(i1, i2))
+            else:
+                entries.extend((None, new[j]) for j in range(j1, j2))
+                changed.append(j1)
+                changed.append(max(j2, j1 + 1))
+
+        real = [i for i in idx[start:stop] if i >= 0]
+        if real:
+            d0, d1 = real[0], real[-1] + 1
+        else:
+            d0 = d1 = self.doc_pos(side, stop)
+
+        added = max(0, len(entries) - (stop - start))
+        entries.extend((-1, None) for _ in range(stop - start - len(entries)))
+
+        new_doc = []
+        new_idx = array("i")
+        new_tags = array("b")
+        for row, text in entries:
+            if row is None:
+                new_idx.append(d0 + len(new_doc))
+                new_tags.append(0)
+                new_doc.append(text)
+            elif row < 0 or idx[row] < 0:
+                new_idx.append(-1)
+                new_tags.append(tags[row] if row >= 0 else 0)
+            else:
+                new_idx.append(d0 + len(new_doc))
+                new_tags.append(tags[row])
+                new_doc.append(doc[idx[row]])
+
+        doc[d0:d1] = new_doc
+        shift = len(new_doc) - (d1 - d0)
+        self._shift_doc(side, stop, shift)
+        idx[start:stop] = new_idx
+        tags[start:stop] = new_tags
+
+        if added:
+            other = 1 - side
+            self.index[other][stop:stop] = array("i", [-1] * added)
+            self.tags[other][stop:stop] = array("b", bytes(added))
+            self._shift_moves(stop, added)
+
+        if changed:
+            # Rows after an edit that changed the row count are out of step
+            lo = start + changed[0]
+            hi = start + changed[-1] if len(new) == stop - start else stop + added
+            if self.dirty:
+                dlo, dhi = self.dirty
+                lo = min(lo, dlo + added if dlo >= stop else dlo)
+                hi = max(hi, dhi + added if dhi > stop else dhi)
+            self.dirty = (lo, min(hi, len(self)))
+        return added
+
+    def snapshot(self, items):
+        """Copies of the rows and of items, to be read in another thread while editing goes on"""
+        al = Alignment(list(self.docs[0]), list(self.docs[1]))
+        for side in (0, 1):
+            al.index[side].extend(self.index[side])
+            al.tags[side].extend(self.tags[side])
+        sub = DiffItems(al)
+        sub.starts.extend(items.starts)
+        sub.stops.extend(items.stops)
+        sub.offsets.extend(items.offsets)
+        return al, sub
+
+    def _items(self, start, stop):
+        """DiffItems of rows [start, stop), counted from start, read off the tags"""
+        sub = Alignment(*self.docs)
+        for side in (0, 1):
+            sub.index[side].extend(self.index[side][start:stop])
+            sub.tags[side].extend(self.tags[side][start:stop])
+        items = DiffItems(sub)
+        same = _TAG_CODE["same"]
+        t0, t1 = self.tags
+        for r in range(start, stop):
+            if not t0[r] == t1[r] == same:
+                items.add_hunk(r - start, r - start + 1)
+        return items
+
+    def _shift_doc(self, side, row, n):
+        """Document lines of side shown at or after row moved by n"""
+        _shift_array(self.index[side], row, n, real_only=True)
+
+    def copy_rows(self, src, start, stop, items=None):
+        """Make rows [start, stop) of the other side a copy of side src
+
+        The other side's document lines on those rows are replaced by
+        src's and rows left blank on both sides are dropped, so the rows
+        come out the same and need no re-diff. items (a DiffItems) is
+        patched to match. Returns a RowCopy for undo_copy().
+        """
+        dst = 1 - src
+        keep = [r for r in range(start, stop) if self.index[src][r] >= 0]
+        real = [i for i in self.index[dst][start:stop] if i >= 0]
+        if real:
+            d0, d1 = real[0], real[-1] + 1
+        else:
+            d0 = d1 = self.doc_pos(dst, stop)
+        doc = self.docs[dst]
+        rec = RowCopy(src, start, stop, len(keep),
+                      (self.index[0][start:stop], self.index[1][start:stop]),
+                      (self.tags[0][start:stop], self.tags[1][start:stop]),
+                      d0, doc[d0:d1], [replace(mv) for mv in self.moves])
+
+        src_doc, src_idx = self.docs[src], self.index[src]
+        doc[d0:d1] = [src_doc[src_idx[r]] for r in keep]
+        self._shift_doc(dst, stop, len(keep) - (d1 - d0))
+        # Moves with a block in the copied rows are gone
+        self.moves = [mv for mv in self.moves
+                      if not (start - mv.size < mv.left_row < stop or start - mv.size < mv.right_row < stop)]
+        self._shift_moves(stop, len(keep) - (stop - start))
+        self.index[src][start:stop] = array("i", (src_idx[r] for r in keep))
+        self.index[dst][start:stop] = array("i", range(d0, d0 + len(keep)))
+        for side in (0, 1):
+            self.tags[side][start:stop] = array("b", [_TAG_CODE["same"]] * len(keep))
+        if items is not None:
+            items.splice(start, stop, self._items(start, start + len(keep)))
+        return rec
+
+    def undo_copy(self, rec, items=None):
+        """Reverse a copy_rows(); copies must be undone latest first"""
+        dst = 1 - rec.src
+        stop = rec.start + rec.rows
+        doc = self.docs[dst]
+        doc[rec.doc_start:rec.doc_start + rec.rows] = rec.lines
+        self._shift_doc(dst, stop, len(rec.lines) - rec.rows)
+        for side in (0, 1):
+            self.index[side][rec.start:stop] = rec.index[side]
+            self.tags[side][rec.start:stop] = rec.tags[side]
+        self.moves = rec.moves
+        if items is not None:
+            items.splice(rec.start, stop, self._items(rec.start, rec.stop))
+
+    def rediff(self, options=None, items=None):
+        """Re-diff the rows edited since the last call
+
+        The dirty rows are widened to the nearest rows that match on both
+        sides and only the document lines between those go through the
+        diff engine; items (a DiffItems) is patched to match. Returns the
+        rebuilt (start, stop) rows, or None if nothing was edited.
+        """
+        if self.dirty is None:
+            return None
+        options = options or DiffOptions()
+        lo, hi = self.dirty
+        self.dirty = None
+        same = _TAG_CODE["same"]
+        t0, t1 = self.tags
+        while lo > 0 and not t0[lo - 1] == t1[lo - 1] == same:
+            lo -= 1
+        while hi < len(self) and not t0[hi] == t1[hi] == same:
+            hi += 1
+
+        procs, idxs = [], []
+        for side in (0, 1):
+            real = [i for i in self.index[side][lo:hi] if i >= 0]
+            if real:
+                d0, d1 = real[0], real[-1] + 1
+            else:
+                d0 = d1 = self.doc_pos(side, hi)
+            proc, idx = process_lines(self.docs[side][d0:d1], options)
+            procs.append(proc)
+            idxs.append([d0 + i for i in idx])
+
+        sub = Alignment(*self.docs)
+        sub_items = DiffItems(sub)
+        _align_rows(sub, sub_items, get_opcodes(*procs, options.algorithm), *idxs)
+        # Moves with a block in the rebuilt rows are gone or no longer known
+        self.moves = [mv for mv in self.moves
+                      if not (lo - mv.size < mv.left_row < hi or lo - mv.size < mv.right_row < hi)]
+        self._shift_moves(hi, len(sub) - (hi - lo))
+        for side in (0, 1):
+            self.index[side][lo:hi] = sub.index[side]
+            self.tags[side][lo:hi] = sub.tags[side]
+        if items is not None:
+            items.splice(lo, hi, sub_items)
+        return lo, lo + len(sub)
+
+
+@dataclass
+class RowCopy:
+    """What Alignment.copy_rows() replaced, for undoing it"""
+    src: int
+    start: int
+    stop: int
+    rows: int              # rows (and copied lines) left in place of [start, stop)
+    index: tuple           # both sides' old index and tags of the rows
+    tags: tuple
+    doc_start: int         # where the copied lines went in the other side's
+    lines: list            # document, and the lines they replaced
+    moves: list
+
+
+class MergeJournal:
+    """Undo and redo history of the hunks copied between two documents
+
+    Entries refer to row positions, so the history only holds while the
+    alignment changes through it; clear() it after typed edits or a new
+    comparison.
+    """
+
+    def __init__(self):
+        self.done = []
+        self.undone = []
+
+    def copy(self, align, items, src, start, stop):
+        rec = align.copy_rows(src, start, stop, items)
+        self.done.append(rec)
+        self.undone.clear()
+        return rec
+
+    def undo(self, align, items):
+        """Reverse the latest copy; returns its RowCopy, or None if there is none"""
+        if not self.done:
+            return None
+        rec = self.done.pop()
+        align.undo_copy(rec, items)
+        self.undone.append(rec)
+        return rec
+
+    def redo(self, align, items):
+        if not self.undone:
+            return None
+        rec = self.undone.pop()
+        rec = align.copy_rows(rec.src, rec.start, rec.stop, items)
+        self.done.append(rec)
+        return rec
+
+    def clear(self):
+        self.done.clear()
+        self.undone.clear()
+
+
+@dataclass
+class TextDiff:
+    left: List[str]
+    right: List[str]
+    left_proc: List[str]
+    right_proc: List[str]
+    opcodes: List[Tuple[str, int, int, int, int]]
+    align: Optional[Alignment] = None
+    items: Optional[DiffItems] = None
+    algorithm: str = "myers"
+    moves: List[Move] = field(default_factory=list)
+
+    @property
+    def identical(self):
+        return not self.items
+
+    def unified(self, fromfile="", tofile="", n=3):
+        """Unified diff of the processed lines, reusing the stored opcodes"""
+        return _unified(self.left_proc, self.right_proc, self.opcodes, fromfile, tofile, n)
+
+
+@dataclass
+class BinaryDiff:
+    left_hash: str
+    right_hash: str
+
+    @property
+    def identical(self):
+        return self.left_hash == self.right_hash
+
+
+@dataclass
+class TreeEntry:
+    status: str               # "Only Left" | "Only Right" | "Identical" | "Different"
+    path: str
+    size: int
+    mtime: float
+
+
+@dataclass
+class TreeDiff:
+    left: str
+    right: str
+    entries: List[TreeEntry] = field(default_factory=list)
+
+    @property
+    def identical(self):
+        return all(e.status == "Identical" for e in self.entries)
+
+
+# ----------------------------------------------------------------------
+# Text compare
+# ----------------------------------------------------------------------
+
+def process_lines(lines, options):
+    """Apply comparison options; returns (processed, original index per line)"""
+    processed = []
+    index = []
+    for i, line in enumerate(lines):
+        if options.ignore_blank and not line.strip():
+            continue
+        pline = line
+        if options.ignore_ws:
+            pline = pline.strip()
+        if options.ignore_case:
+            pline = pline.lower()
+        processed.append(pline)
+        index.append(i)
+    return processed, index
+
+
+def _move_key(line):
+    # Moved code is often re-indented, so whitespace runs do not count
+    return " ".join(line.split())
+
+
+def find_moves(a, b, opcodes, min_lines=MIN_MOVE):
+    """Blocks of deleted lines of a that reappear among the inserted lines of b
+
+    Inserted lines are indexed by their whitespace-normalized text. Each
+    deleted line is looked up there and the longest run on which both
+    sides keep agreeing is taken if it has at least min_lines non-blank
+    lines. Blank lines, and lines inserted more than MAX_CHAIN times,
+    never start a block, which keeps the search near-linear.
+    """
+    removed, added = bytearray(len(a)), bytearray(len(b))
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag in ("delete", "replace"):
+            removed[i1:i2] = b"\1" * (i2 - i1)
+        if tag in ("insert", "replace"):
+            added[j1:j2] = b"\1" * (j2 - j1)
+    ka = {i: _move_key(a[i]) for i in range(len(a)) if removed[i]}
+    kb = {j: _move_key(b[j]) for j in range(len(b)) if added[j]}
+    index = {}
+    for j, key in kb.items():
+        if key:
+            index.setdefault(key, []).append(j)
+
+    moves = []
+    i, n, m = 0, len(a), len(b)
+    while i < n:
+        cands = index.get(ka.get(i)) if removed[i] else None
+        best = best_j = 0
+        if cands and len(cands) <= MAX_CHAIN:
+            for j in cands:
+                k = 0
+                while i + k < n and j + k < m and removed[i + k] and added[j + k] \
+                        and ka[i + k] == kb[j + k]:
+                    k += 1
+                if k > best:
+                    best, best_j = k, j
+        if best and sum(1 for x in range(i, i + best) if ka[x]) >= min_lines:
+            moves.append(Move(i, i + best, best_j, best_j + best))
+            # Matched lines cannot be part of another move
+            removed[i:i + best] = bytes(best)
+            added[best_j:best_j + best] = bytes(best)
+            i += best
+        else:
+            i += 1
+    return moves
+
+
+def _tokens(line):
+    return frozenset(t for t in _TOKEN.findall(line) if not t.isspace())
+
+
+def _pair_lines(a, b):
+    """Pair the lines of a replaced block by similarity
+
+    Returns (i, j) rows in order, with -1 for an unpaired side. The pairs
+    are the in-order matching with the largest total token similarity
+    (Dice coefficient of the token sets); blocks above PAIR_LIMIT pairs
+    are paired by position.
+    """
+    n, m = len(a), len(b)
+    if n * m > PAIR_LIMIT:
+        return [(k if k < n else -1, k if k < m else -1) for k in range(max(n, m))]
+
+    ta, tb = [_tokens(x) for x in a], [_tokens(y) for y in b]
+    best = [[0.0] * (m + 1) for _ in range(n + 1)]
+    for i in range(1, n + 1):
+        x, row, prev = ta[i - 1], best[i], best[i - 1]
+        for j in range(1, m + 1):
+            y = tb[j - 1]
+            v = max(prev[j], row[j - 1])
+            if x or y:
+                sim = 2 * len(x & y) / (len(x) + len(y))
+                if sim >= PAIR_CUTOFF and prev[j - 1] + sim > v:
+                    v = prev[j - 1] + sim
+            elif prev[j - 1] + 1 > v:
+                # Two blank lines
+                v = prev[j - 1] + 1
+            row[j] = v
+
+    pairs = []
+    i, j = n, m
+    while i and j:
+        if best[i][j] == best[i - 1][j]:
+            i -= 1
+        elif best[i][j] == best[i][j - 1]:
+            j -= 1
+        else:
+            pairs.append((i - 1, j - 1))
+            i -= 1
+            j -= 1
+    pairs.reverse()
+
+    rows = []
+    i = j = 0
+    for pi, pj in pairs + [(n, m)]:
+        rows.extend((k, -1) for k in range(i, pi))
+        rows.extend((-1, k) for k in range(j, pj))
+        if pi < n:
+            rows.append((pi, pj))
+        i, j = pi + 1, pj + 1
+    return rows
+
+
+@lru_cache(maxsize=4096)
+def inline_diff(a, b):
+    """Character spans that differ between two paired lines
+
+    Returns (left spans, right spans) of (start, end). The lines are
+    diffed as words, spaces and punctuation; short replaced runs are
+    narrowed to characters. Results are cached per line pair, so
+    rendering the same rows again costs nothing.
+    """
+    if a == b:
+        return (), ()
+    p = len(os.path.commonprefix((a, b)))
+    s = len(os.path.commonprefix((a[p:][::-1], b[p:][::-1])))
+    ea, eb = len(a) - s, len(b) - s
+    if max(len(a), len(b)) > INLINE_MAX:
+        return ((p, ea),) if ea > p else (), ((p, eb),) if eb > p else ()
+
+    ta, tb = _TOKEN.findall(a[p:ea]), _TOKEN.findall(b[p:eb])
+    oa, ob = [p], [p]
+    for t in ta:
+        oa.append(oa[-1] + len(t))
+    for t in tb:
+        ob.append(ob[-1] + len(t))
+
+    left, right = [], []
+
+    def add(spans, start, end):
+        if end > start:
+            if spans and spans[-1][1] == start:
+                spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((start, end))
+
+    for tag, i1, i2, j1, j2 in get_opcodes(ta, tb):
+        if tag == "equal":
+            continue
+        a0, a1, b0, b1 = oa[i1], oa[i2], ob[j1], ob[j2]
+        if tag == "replace" and (a1 - a0) + (b1 - b0) <= CHAR_LEVEL:
+            for op, x1, x2, y1, y2 in get_opcodes(a[a0:a1], b[b0:b1]):
+                if op != "equal":
+                    add(left, a0 + x1, a0 + x2)
+                    add(right, b0 + y1, b0 + y2)
+        else:
+            add(left, a0, a1)
+            add(right, b0, b1)
+    return tuple(left), tuple(right)
+
+
+def _align(res, l_idx, r_idx):
+    """Build the aligned side-by-side rows and the diff hunks"""
+    res.align = Alignment(res.left, res.right)
+    res.items = DiffItems(res.align)
+    res.align.moves = res.moves
+    _align_rows(res.align, res.items, res.opcodes, l_idx, r_idx, res.moves)
+
+
+def _align_rows(al, items, opcodes, l_idx, r_idx, moves=()):
+    """Append a row per aligned line pair to al and its hunks to items
+
+    l_idx and r_idx map processed line numbers to document lines. Lines
+    of moves are tagged "moved" and the moves get their rows.
+    """
+    moved_l, moved_r = set(), set()
+    starts_l, starts_r = {}, {}
+    for mv in moves:
+        moved_l.update(range(mv.i1, mv.i2))
+        moved_r.update(range(mv.j1, mv.j2))
+        starts_l[mv.i1] = starts_r[mv.j1] = mv
+
+    def left(i, tag):
+        if i in starts_l:
+            starts_l[i].left_row = len(al)
+        return "moved" if i in moved_l else tag
+
+    def right(j, tag):
+        if j in starts_r:
+            starts_r[j].right_row = len(al)
+        return "moved" if j in moved_r else tag
+
+    for op, i1, i2, j1, j2 in opcodes:
+        start = len(al)
+        if op == "equal":
+            for k in range(i2 - i1):
+                al.append(l_idx[i1 + k], r_idx[j1 + k], "same", "same")
+            continue
+
+        if op == "delete":
+            # Lines only in left
+            for k in range(i2 - i1):
+                al.append(l_idx[i1 + k], -1, left(i1 + k, "removed"), "")
+
+        elif op == "insert":
+            # Lines only in right
+            for k in range(j2 - j1):
+                al.append(-1, r_idx[j1 + k], "", right(j1 + k, "added"))
+
+        elif op == "replace":
+            # Lines are different - pair the most similar ones
+            a = [al.docs[0][l_idx[i]] for i in range(i1, i2)]
+            b = [al.docs[1][r_idx[j]] for j in range(j1, j2)]
+            for i, j in _pair_lines(a, b):
+                if i >= 0 and j >= 0:
+                    al.append(l_idx[i1 + i], r_idx[j1 + j],
+                              left(i1 + i, "changed"), right(j1 + j, "changed"))
+                elif i >= 0:
+                    al.append(l_idx[i1 + i], -1, left(i1 + i, "removed"), "")
+                else:
+                    al.append(-1, r_idx[j1 + j], "", right(j1 + j, "added"))
+
+        items.add_hunk(start, len(al))
+
+
+def compare_text(left, right, options=None, progress=None):
+    """Diff two texts (strings or line lists) and return a TextDiff
+
+    progress is passed on to get_opcodes.
+    """
+    options = options or DiffOptions()
+    l_lines = left.split("\n") if isinstance(left, str) else list(left)
+    r_lines = right.split("\n") if isinstance(right, str) else list(right)
+
+    l_proc, l_idx = process_lines(l_lines, options)
+    r_proc, r_idx = process_lines(r_lines, options)
+    opcodes = get_opcodes(l_proc, r_proc, options.algorithm, progress)
+
+    res = TextDiff(l_lines, r_lines, l_proc, r_proc, opcodes, algorithm=options.algorithm)
+    if options.detect_moves:
+        res.moves = find_moves(l_proc, r_proc, opcodes)
+    _align(res, l_idx, r_idx)
+    return res
+
+
+# ----------------------------------------------------------------------
+# Files
+# ----------------------------------------------------------------------
+
+def _text_cache(digest, kind, version):
+    return os.path.join(cache_dir(), "text", f"{digest}-{kind}-{version}.txt")
+
+
+def _prune_text_cache(folder):
+    """Drop the least recently used extracted texts over TEXT_CACHE_FILES"""
+    try:
+        entries = sorted(os.scandir(folder), key=lambda e: e.stat().st_atime)
+        for e in entries[:max(0, len(entries) - TEXT_CACHE_FILES)]:
+            os.remove(e.path)
+    except OSError:
+        pass
+
+
+def _load_text(target):
+    try:
+        with open(target, "r", encoding="utf-8", newline="\n") as f:
+            return tuple(f.read().split("\n"))
+    except OSError:
+        return None
+
+
+def _store_text(target, lines):
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            f.write("\n".join(lines))
+        os.replace(tmp, target)
+        _prune_text_cache(os.path.dirname(target))
+    except OSError:
+        pass
+
+
+class TextCache:
+    """Extracted texts held in memory, least recently used dropped first
+
+    Bounded by the total number of lines rather than entries, so a few
+    huge workbooks cannot crowd out memory for many small documents.
+    """
+
+    def __init__(self, max_lines=TEXT_CACHE_LINES):
+        self.max_lines = max_lines
+        self.lines = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            lines = self._items.get(key)
+            if lines is not None:
+                self._items.move_to_end(key)
+            return lines
+
+    def put(self, key, lines):
+        if len(lines) > self.max_lines:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.lines -= len(old)
+            self._items[key] = lines
+            self.lines += len(lines)
+            while self.lines > self.max_lines:
+                _, dropped = self._items.popitem(last=False)
+                self.lines -= len(dropped)
+
+
+text_cache = TextCache()
+
+
+def read_lines(path):
+    """Lines of a text file, split while reading so it is never held as one string"""
+    lines, line = [], ""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            lines.append(line[:-1] if line.endswith("\n") else line)
+    if not line or line.endswith("\n"):
+        lines.append("")
+    return lines
+
+
+def write_lines(path, lines):
+    """Write lines joined by newlines, as read_lines splits them, atomically
+
+    The text goes to a temporary file beside path, which is then renamed
+    over it, so a failed write never leaves a half-written file.
+    """
+    fd, tmp = tempfile.mkstemp(prefix=".codeCompare-", suffix=".tmp",
+                               dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as f:
+            first = True
+            for line in lines:
+                if not first:
+                    f.write("\n")
+                f.write(line)
+                first = False
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            shutil.copymode(path, tmp)
+        except OSError:
+            pass
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def extract_lines(path, kind=None, use_cache=True):
+    """A file as text lines, in the form its format handler gives (see formats.Format)
+
+    Expensive extractions (workbooks, office documents) are cached under
+    the file's content hash, in memory and on disk, so re-opening or
+    re-comparing a document, or a copy of it, skips the conversion and
+    does not even import its handler.
+    """
+    fmt = FORMATS[kind or detect_type(path)]
+    if not fmt.lines:
+        return read_lines(path)
+    if not (fmt.cached and use_cache):
+        return list(getattr(handler(fmt.kind), fmt.lines)(path))
+
+    cache = get_cache()
+    key = (file_hash(path, DEFAULT_HASH, cache), fmt.kind, fmt.version)
+    lines = text_cache.get(key)
+    if lines is None:
+        target = _text_cache(*key) if cache else None
+        lines = _load_text(target) if target else None
+        if lines is None:
+            # Split again so a cell or run holding a newline reads back the same
+            text = "\n".join(getattr(handler(fmt.kind), fmt.lines)(path))
+            lines = tuple(text.split("\n"))
+            if target:
+                _store_text(target, lines)
+        text_cache.put(key, lines)
+    return list(lines)
+
+
+def read_text(path):
+    """Read a text file, or the text of an office document, as a string"""
+    kind = detect_type(path)
+    if kind == "text":
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    try:
+        return "\n".join(extract_lines(path, kind))
+    except Exception as e:
+        raise ValueError(f"Cannot read document: {path}") from e
+
+
+def _hasher(algo):
+    if algo.startswith("xxh"):
+        if xxhash is None:
+            raise ValueError(f"{algo} needs the xxhash package")
+        return getattr(xxhash, algo)()
+    if algo == "blake2b":
+        return hashlib.blake2b(digest_size=16)
+    return hashlib.new(algo)
+
+
+def file_hash(p, algo=DEFAULT_HASH, cache=None):
+    """Hash a whole file, consulting an optional HashCache first"""
+    return _digest(p, os.stat(p), "full", algo, cache) if cache else _full_hash(p, algo)
+
+
+def _full_hash(p, algo):
+    h = _hasher(algo)
+    with open(p, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def edge_hash(p, size, algo=DEFAULT_HASH):
+    """Hash the first and last EDGE_SIZE bytes (the whole file if it is small)"""
+    h = _hasher(algo)
+    with open(p, "rb") as f:
+        if size <= 2 * EDGE_SIZE:
+            h.update(f.read())
+        else:
+            h.update(f.read(EDGE_SIZE))
+            f.seek(size - EDGE_SIZE)
+            h.update(f.read(EDGE_SIZE))
+    return h.hexdigest()
+
+
+def _digest(p, st, kind, algo, cache):
+    """Edge or full hash of p, served from the cache while the file is unchanged"""
+    digest = cache.get(p, st, kind, algo) if cache else None
+    if digest is None:
+        digest = _full_hash(p, algo) if kind == "full" else edge_hash(p, st.st_size, algo)
+        if cache:
+            cache.put(p, st, kind, algo, digest)
+    return digest
+
+
+def _cached_verdict(lp, ls, rp, rs, algo, cache):
+    """Settle a pair from sizes and cached digests alone; None if undecided"""
+    if ls.st_size != rs.st_size:
+        return False
+    if not ls.st_size:
+        return True
+    if cache:
+        for kind in ("full", "edge"):
+            a = cache.get(lp, ls, kind, algo)
+            b = cache.get(rp, rs, kind, algo)
+            if a and b:
+                if a != b:
+                    return False
+                if kind == "full" or ls.st_size <= 2 * EDGE_SIZE:
+                    return True
+    return None
+
+
+def same_content(lp, rp, algo=DEFAULT_HASH, cache=None, ls=None, rs=None):
+    """Staged content check: size, then head/tail hash, then full hash"""
+    ls = ls or os.stat(lp)
+    rs = rs or os.stat(rp)
+    verdict = _cached_verdict(lp, ls, rp, rs, algo, cache)
+    if verdict is not None:
+        return verdict
+    if _digest(lp, ls, "edge", algo, cache) != _digest(rp, rs, "edge", algo, cache):
+        return False
+    if ls.st_size <= 2 * EDGE_SIZE:
+        # The edge hash already covered every byte
+        return True
+    return _digest(lp, ls, "full", algo, cache) == _digest(rp, rs, "full", algo, cache)
+
+
+def compare_files(left_path, right_path, options=None, hash_algo=DEFAULT_HASH, use_cache=True):
+    """Compare two files: TextDiff for text/docx, BinaryDiff otherwise"""
+    types = {detect_type(left_path), detect_type(right_path)}
+    if types <= {"text", "docx"}:
+        return compare_text(read_text(left_path), read_text(right_path), options)
+    cache = get_cache() if use_cache else None
+    return BinaryDiff(file_hash(left_path, hash_algo, cache), file_hash(right_path, hash_algo, cache))
+
+
+# ----------------------------------------------------------------------
+# Folders
+# ----------------------------------------------------------------------
+
+def _walk(top):
+    """Yield (relative path, stat) for every file below top
+
+    Directories are read with scandir and visited in name order, so paths
+    come out sorted by their components. Symlinked directories are not
+    followed, as with os.walk.
+    """
+    stack = [(None, top)]
+    while stack:
+        rel, item = stack.pop()
+        if isinstance(item, os.stat_result):
+            yield rel, item
+            continue
+        for name, st in reversed(_list_dir(item)):
+            path = name if rel is None else os.path.join(rel, name)
+            stack.append((path, st if st else os.path.join(item, name)))
+
+
+def _list_dir(path):
+    """(name, stat) of the entries of one folder by name; stat is None for subfolders
+
+    Symlinked folders are skipped, as os.walk does not follow them.
+    """
+    try:
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return []
+    out = []
+    for e in entries:
+        try:
+            if e.is_dir():
+                if not e.is_symlink():
+                    out.append((e.name, None))
+                continue
+            st = e.stat()
+        except OSError:
+            try:
+                st = e.stat(follow_symlinks=False)
+            except OSError:
+                continue
+        out.append((e.name, st))
+    return out
+
+
+def _walk_async(top, batch=512):
+    """_walk(top) run in a background thread, so several trees are read at once"""
+    q = queue.Queue(maxsize=64)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def run():
+        try:
+            buf = []
+            for item in _walk(top):
+                buf.append(item)
+                if len(buf) >= batch:
+                    put(buf)
+                    buf = []
+            put(buf)
+            put(None)
+        except BaseException as e:
+            put(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            buf = q.get()
+            if buf is None:
+                return
+            if isinstance(buf, BaseException):
+                raise buf
+            yield from buf
+    finally:
+        stop.set()
+
+
+def _merge(left, right):
+    """Pair two sorted (path, stat) streams: yields (path, left stat, right stat)"""
+    end = (None, None)
+    l, r = next(left, end), next(right, end)
+    while l[0] is not None or r[0] is not None:
+        if r[0] is None or (l[0] is not None and l[0].split(os.sep) < r[0].split(os.sep)):
+            yield l[0], l[1], None
+            l = next(left, end)
+        elif l[0] is None or r[0].split(os.sep) < l[0].split(os.sep):
+            yield r[0], None, r[1]
+            r = next(right, end)
+        else:
+            yield l[0], l[1], r[1]
+            l, r = next(left, end), next(right, end)
+
+
+def _same_content(job):
+    """Content check for one file pair; top level so process pools can pickle it
+
+    Digests computed here are returned rather than cached, so the parent
+    process stays the only writer of the hash cache. A pair that cannot be
+    read counts as different, as in FolderCompare, rather than ending the
+    whole compare.
+    """
+    lp, rp, algo, ls, rs = job
+    rec = Recorder()
+    try:
+        return same_content(lp, rp, algo, rec, ls, rs), rec.records
+    except OSError:
+        return False, []
+
+
+def _same_contents(jobs):
+    """_same_content for a batch of pairs"""
+    return [_same_content(job) for job in jobs]
+
+
+def iter_tree(left, right, fast=False, jobs=1, hash_algo=DEFAULT_HASH, use_cache=True):
+    """Yield a TreeEntry per file of two folders, sorted by path components
+
+    Both folders are scanned concurrently and entries stream out while
+    the scan is still running. Pairs settled by size or by the hash cache
+    never reach a worker; with jobs > 1 the remaining content checks go
+    to a process pool in batches, and entries still come out in order.
+    """
+    cache = get_cache() if use_cache and not fast else None
+    pool = ProcessPoolExecutor(jobs) if jobs > 1 else None
+
+    pending = deque()   # TreeEntry, or [path, size, mtime, future, k] awaiting a check
+    batch = []          # checks not yet submitted, with their pending slots
+    started = 0.0
+
+    def submit():
+        fut = pool.submit(_same_contents, [job for job, _ in batch])
+        for k, (_, slot) in enumerate(batch):
+            slot[3:] = fut, k
+        batch.clear()
+
+    def resolve(item):
+        if isinstance(item, TreeEntry):
+            return item
+        path, size, mtime, fut, k = item
+        same, records = fut.result()[k]
+        if cache:
+            for rec in records:
+                cache.put(*rec)
+        return TreeEntry("Identical" if same else "Different", path, size, mtime)
+
+    def ready(item):
+        return isinstance(item, TreeEntry) or (len(item) == 5 and item[3].done())
+
+    try:
+        for path, ls, rs in _merge(_walk_async(left), _walk_async(right)):
+            if rs is None:
+                pending.append(TreeEntry("Only Left", path, ls.st_size, ls.st_mtime))
+            elif ls is None:
+                pending.append(TreeEntry("Only Right", path, rs.st_size, rs.st_mtime))
+            else:
+                lp, rp = os.path.join(left, path), os.path.join(right, path)
+                if fast:
+                    same = ls.st_size == rs.st_size and abs(ls.st_mtime - rs.st_mtime) < 2
+                else:
+                    same = _cached_verdict(lp, ls, rp, rs, hash_algo, cache)
+                if same is None:
+                    job = (lp, rp, hash_algo, ls, rs)
+                    if pool:
+                        slot = [path, ls.st_size, ls.st_mtime]
+                        if not batch:
+                            started = time.monotonic()
+                        batch.append((job, slot))
+                        pending.append(slot)
+                    else:
+                        same, records = _same_content(job)
+                        if cache:
+                            for rec in records:
+                                cache.put(*rec)
+                if same is not None:
+                    pending.append(TreeEntry("Identical" if same else "Different",
+                                             path, ls.st_size, ls.st_mtime))
+
+            if batch and (len(batch) >= CHECK_BATCH or time.monotonic() - started > CHECK_WAIT):
+                submit()
+            while pending and ready(pending[0]):
+                yield resolve(pending.popleft())
+            while len(pending) > MAX_PENDING:
+                # Let the checks catch up rather than queue the whole tree
+                if batch:
+                    submit()
+                yield resolve(pending.popleft())
+
+        if batch:
+            submit()
+        while pending:
+            yield resolve(pending.popleft())
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        if cache:
+            cache.flush()
+
+
+def compare_trees(left, right, fast=False, jobs=1, hash_algo=DEFAULT_HASH, use_cache=True):
+    """Compare two folders and return a TreeDiff"""
+    return TreeDiff(left, right, list(iter_tree(left, right, fast, jobs, hash_algo, use_cache)))
+
+
+class FolderNode:
+    """A file or folder of a lazily compared pair of trees
+
+    counts, left_bytes and right_bytes roll up every file settled below a
+    folder so far; complete is set once nothing below it is pending.
+    """
+
+    __slots__ = ("name", "path", "parent", "is_dir", "left", "right", "children",
+                 "file_status", "counts", "left_bytes", "right_bytes", "waiting", "complete")
+
+    def __init__(self, name, path, parent, is_dir, left, right):
+        self.name = name
+        self.path = path              # relative to the compared roots
+        self.parent = parent
+        self.is_dir = is_dir
+        self.left = left              # stat (files), True (folders) or None if absent
+        self.right = right
+        self.children = None          # folders: list once listed
+        self.file_status = None       # files: status once checked
+        self.counts = {}              # status -> files below
+        self.left_bytes = self.right_bytes = 0
+        self.waiting = 0              # children not yet complete
+        self.complete = False
+
+    @property
+    def status(self):
+        if self.left is None:
+            return "Only Right"
+        if self.right is None:
+            return "Only Left"
+        if not self.is_dir:
+            return self.file_status or "Pending"
+        if any(n for st, n in self.counts.items() if st != "Identical"):
+            return "Different"
+        return "Identical" if self.complete else "Pending"
+
+    @property
+    def files(self):
+        return sum(self.counts.values())
+
+    @property
+    def differences(self):
+        return self.files - self.counts.get("Identical", 0)
+
+
+class FolderCompare:
+    """Folder compare that lists and checks one folder at a time
+
+    Folders are processed in priority order: ones asked for with
+    prioritize() (e.g. expanded in a view) first, then, with background
+    set, all the others breadth-first. on_change(node) is called for every
+    node whose status or rollup changed, from the thread running run().
+    """
+
+    def __init__(self, left, right, fast=False, hash_algo=DEFAULT_HASH, use_cache=True,
+                 background=True, on_change=None):
+        self.left = left
+        self.right = right
+        self.fast = fast
+        self.hash_algo = hash_algo
+        self.cache = get_cache() if use_cache and not fast else None
+        self.background = background
+        self.on_change = on_change or (lambda node: None)
+        self.root = FolderNode("", "", None, True, True, True)
+        self._queue = queue.PriorityQueue()
+        self._seq = count()
+        self.prioritize(self.root)
+
+    def prioritize(self, node, priority=0):
+        """Queue a folder for listing and checking; lower priorities go first"""
+        if priority and not self.background:
+            return
+        if node.is_dir and node.children is None:
+            self._queue.put((priority, next(self._seq), node))
+
+    def run(self, stop=None):
+        """Process queued folders until stop is set or, in background mode, all are done"""
+        try:
+            while not (stop and stop.is_set()):
+                try:
+                    _, _, node = self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    if self.background or stop is None:
+                        break
+                    continue
+                if node.children is None:
+                    self.expand(node, stop)
+        finally:
+            if self.cache:
+                self.cache.flush()
+
+    def entries(self, node=None):
+        """A TreeEntry per file checked so far below node, in folder order"""
+        for ch in (node or self.root).children or ():
+            if ch.is_dir:
+                yield from self.entries(ch)
+            elif ch.file_status:
+                st = ch.left or ch.right
+                yield TreeEntry(ch.file_status, ch.path, st.st_size, st.st_mtime)
+
+    def expand(self, node, stop=None):
+        """List a folder on both sides and check the files directly in it"""
+        lpath = os.path.join(self.left, node.path) if node.left else None
+        rpath = os.path.join(self.right, node.path) if node.right else None
+        lside = dict(_list_dir(lpath)) if lpath else {}
+        rside = dict(_list_dir(rpath)) if rpath else {}
+
+        children = []
+        for name in sorted(lside.keys() | rside.keys()):
+            ls, rs = lside.get(name, False), rside.get(name, False)
+            if (ls is None) != (rs is None) and ls is not False and rs is not False:
+                # A folder on one side, a file on the other: show both
+                children.append(FolderNode(name, os.path.join(node.path, name), node,
+                                           ls is None, ls is None or ls, None))
+                children.append(FolderNode(name, os.path.join(node.path, name), node,
+                                           rs is None, None, rs is None or rs))
+                continue
+            is_dir = ls is None or rs is None
+            children.append(FolderNode(name, os.path.join(node.path, name), node, is_dir,
+                                       None if ls is False else (True if is_dir else ls),
+                                       None if rs is False else (True if is_dir else rs)))
+
+        node.waiting = len(children)
+        node.children = children
+        self.on_change(node)
+        if not children:
+            self._dir_done(node)
+
+        for child in children:
+            if child.is_dir:
+                # Shallow folders first
+                self.prioritize(child, child.path.count(os.sep) + 1)
+        for child in children:
+            if stop and stop.is_set():
+                return
+            if not child.is_dir:
+                self._file_done(child, self._check(child))
+
+    def _check(self, node):
+        if node.left is None:
+            return "Only Right"
+        if node.right is None:
+            return "Only Left"
+        ls, rs = node.left, node.right
+        if self.fast:
+            same = ls.st_size == rs.st_size and abs(ls.st_mtime - rs.st_mtime) < 2
+        else:
+            lp = os.path.join(self.left, node.path)
+            rp = os.path.join(self.right, node.path)
+            try:
+                same = same_content(lp, rp, self.hash_algo, self.cache, ls, rs)
+            except OSError:
+                same = False
+        return "Identical" if same else "Different"
+
+    def _file_done(self, node, status):
+        node.file_status = status
+        lb = node.left.st_size if node.left else 0
+        rb = node.right.st_size if node.right else 0
+        p = node
+        while p is not None:
+            if p is not node:
+                p.counts[status] = p.counts.get(status, 0) + 1
+                p.left_bytes += lb
+                p.right_bytes += rb
+            self.on_change(p)
+            p = p.parent
+        self._child_done(node)
+
+    def _child_done(self, node):
+        node.complete = True
+        parent = node.parent
+        if parent is not None:
+            parent.waiting -= 1
+            if not parent.waiting:
+                self._dir_done(parent)
+
+    def _dir_done(self, node):
+        self.on_change(node)
+        self._child_done(node)
+
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Office document text extraction for Beyond Compare + Meld Clone
+DOCX, PPTX, ODT and ODP parts are streamed through iterparse, one
+paragraph per line and one table row per line, so large documents never
+have to be held as a parsed tree
+"""
+
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+_TABLE = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+
+
+class _Format:
+    """Element names of one XML vocabulary
+
+    OOXML keeps text in dedicated run elements (w:t, a:t); ODF keeps it
+    as mixed content, in the text and tails of the paragraph's children.
+    """
+
+    def __init__(self, paragraphs, row, cell, text=None, tab=(), breaks=(), space=None):
+        self.paragraphs = paragraphs
+        self.row = row
+        self.cell = cell
+        self.text = text
+        self.tab = tab
+        self.breaks = breaks
+        self.space = space
+
+
+WORD = _Format({_W + "p"}, _W + "tr", _W + "tc", text={_W + "t"}, tab={_W + "tab"},
+               breaks={_W + "br", _W + "cr"})
+DRAWING = _Format({_A + "p"}, _A + "tr", _A + "tc", text={_A + "t"}, breaks={_A + "br"})
+ODF = _Format({_TEXT + "p", _TEXT + "h"}, _TABLE + "table-row", _TABLE + "table-cell",
+              tab={_TEXT + "tab"}, breaks={_TEXT + "line-break"}, space=_TEXT + "s")
+
+
+def _para_text(elem, fmt, out):
+    """Append the text of a paragraph element to out"""
+    for child in elem:
+        tag = child.tag
+        if tag in fmt.tab:
+            out.append("\t")
+        elif tag in fmt.breaks:
+            out.append("\n")
+        elif fmt.text is not None:
+            if tag in fmt.text:
+                out.append(child.text or "")
+            else:
+                _para_text(child, fmt, out)
+        else:
+            if tag == fmt.space:
+                out.append(" " * int(child.get(_TEXT + "c", 1)))
+            else:
+                out.append(child.text or "")
+                _para_text(child, fmt, out)
+        if fmt.text is None and child.tail:
+            out.append(child.tail)
+
+
+def part_lines(stream, fmt):
+    """Yield the lines of one XML part: paragraphs, and table rows as tab-separated cells"""
+    cells = []      # paragraphs of each open table cell
+    rows = []       # cell texts of each open table row
+    open_elems = []
+    pending = []
+
+    def emit(text):
+        if cells:
+            cells[-1].append(text)
+        else:
+            pending.extend(text.split("\n"))
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            open_elems.append(elem)
+            if tag == fmt.cell:
+                cells.append([])
+            elif tag == fmt.row:
+                rows.append([])
+            continue
+
+        open_elems.pop()
+        done = False
+        if tag in fmt.paragraphs:
+            out = [elem.text or ""] if fmt.text is None else []
+            _para_text(elem, fmt, out)
+            emit("".join(out))
+            done = True
+        elif tag == fmt.cell and cells:
+            # A cell is one column of its row, even if it holds a nested table
+            text = " ".join(cells.pop()).replace("\n", " ").replace("\t", " ")
+            if rows:
+                rows[-1].append(text)
+        elif tag == fmt.row and rows:
+            emit("\t".join(rows.pop()))
+            done = True
+
+        if done:
+            # Read elements are dropped so memory stays flat. One nested in
+            # a paragraph (a text box, a note) is only emptied: the paragraph
+            # around it must not read it again, but still needs its tail.
+            if any(e.tag in fmt.paragraphs for e in open_elems):
+                tail = elem.tail
+                elem.clear()
+                elem.tail = tail
+            elif open_elems:
+                open_elems[-1].remove(elem)
+        if pending:
+            yield from pending
+            pending.clear()
+
+
+def _number(name):
+    m = re.search(r"(\d+)\.xml$", name)
+    return int(m.group(1)) if m else 0
+
+
+def _parts(z, path):
+    """(title, member, format) of the text-bearing parts, in reading order
+
+    The kind of document is told from its members, not its extension, so
+    sniffed files without one are read too.
+    """
+    names = z.namelist()
+    if "word/document.xml" in names:
+        heads = sorted((n for n in names if re.match(r"word/header\d*\.xml$", n)), key=_number)
+        feet = sorted((n for n in names if re.match(r"word/footer\d*\.xml$", n)), key=_number)
+        parts = [(f"Header {_number(n)}", n, WORD) for n in heads]
+        parts.append(("Body", "word/document.xml", WORD))
+        for n, title in (("word/footnotes.xml", "Footnotes"), ("word/endnotes.xml", "Endnotes")):
+            if n in names:
+                parts.append((title, n, WORD))
+        parts += [(f"Footer {_number(n)}", n, WORD) for n in feet]
+        return parts
+    if "ppt/presentation.xml" in names:
+        parts = []
+        for n in sorted((n for n in names if re.match(r"ppt/slides/slide\d+\.xml$", n)), key=_number):
+            parts.append((f"Slide {_number(n)}", n, DRAWING))
+            notes = f"ppt/notesSlides/notesSlide{_number(n)}.xml"
+            if notes in names:
+                parts.append((f"Notes {_number(n)}", notes, DRAWING))
+        return parts
+    if "content.xml" in names:
+        return [("Content", "content.xml", ODF)]
+    raise ValueError(f"Not an office document: {path}")
+
+
+def document_lines(path):
+    """Yield the text lines of an office document
+
+    A document with more than one part (headers, footers, slides) gets a
+    [Title] line before each part, so moved text stays attributable.
+    """
+    with zipfile.ZipFile(path) as z:
+        parts = _parts(z, path)
+        for title, member, fmt in parts:
+            if len(parts) > 1:
+                yield f"[{title}]"
+            with z.open(member) as f:
+                yield from part_lines(f, fmt)
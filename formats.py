@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Format handlers for Beyond Compare + Meld Clone
+Each file type is registered with how to recognise it (extensions, then
+leading bytes) and the module handling it. Handler modules are imported
+on first use, so pandas and NumPy are only loaded once a table, image or
+binary file is actually opened
+"""
+
+import sys
+import zipfile
+import importlib
+import mimetypes
+
+# Extensions of the formats mimetypes does not classify
+DOC_EXTENSIONS = (".docx", ".docm", ".pptx", ".odt", ".odp")
+EXCEL_EXTENSIONS = (".xlsx", ".xls", ".xlsm")
+TABLE_EXTENSIONS = EXCEL_EXTENSIONS + (".csv", ".tsv")
+
+# Bytes read to sniff a file whose name does not give its type away
+SNIFF_SIZE = 8192
+
+_ZIP = b"PK\x03\x04"
+
+
+class Format:
+    """A file type: how to recognise it and which module handles it
+
+    magic holds leading byte strings that identify the type; for zip
+    based formats, members names entries one of which the archive must
+    hold, and an archive with a "mimetype" entry (OpenDocument) must also
+    name one of the mimetypes prefixes in it. lines names the handler function that yields a file as text
+    lines, the form every type is shown and diffed in (the plain text
+    reader if None). Expensive extractions set cached, and bump version
+    whenever their output changes, so stale cached text is not reused.
+    """
+
+    def __init__(self, kind, module=None, extensions=(), magic=(), members=(),
+                 mimetypes=(), lines=None, cached=False, version=1):
+        self.kind = kind
+        self.module = module
+        self.extensions = tuple(extensions)
+        self.magic = tuple(magic)
+        self.members = tuple(members)
+        self.mimetypes = tuple(mimetypes)
+        self.lines = lines
+        self.cached = cached
+        self.version = version
+
+
+# File type -> Format, in sniffing order ("table" is CSV/TSV, which
+# detect_type calls text; it is only handled as a table on request)
+FORMATS = {}
+
+
+def register(kind, module=None, **kwargs):
+    """Add or replace a file type; see Format for the arguments"""
+    FORMATS[kind] = Format(kind, module, **kwargs)
+    return FORMATS[kind]
+
+
+register("excel", "tabular", extensions=EXCEL_EXTENSIONS, magic=(_ZIP,),
+         members=("xl/workbook.xml",), lines="table_lines", cached=True)
+register("table", "tabular", lines="table_lines")
+register("docx", "doctext", extensions=DOC_EXTENSIONS, magic=(_ZIP,),
+         members=("word/document.xml", "ppt/presentation.xml", "content.xml"),
+         mimetypes=("application/vnd.oasis.opendocument.text",
+                    "application/vnd.oasis.opendocument.presentation"),
+         lines="document_lines", cached=True)
+register("image", "imagediff", magic=(b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"GIF87a",
+                                      b"GIF89a", b"II*\x00", b"MM\x00*"), lines="image_lines")
+register("text")
+register("binary", "bindiff")
+
+
+def handler(kind):
+    """The module handling a file type, imported on first use"""
+    return importlib.import_module(FORMATS[kind].module)
+
+
+def loaded(kind):
+    """Whether the handler of a file type has been imported yet"""
+    return FORMATS[kind].module in sys.modules
+
+
+def is_table(path):
+    return path.lower().endswith(TABLE_EXTENSIONS)
+
+
+def _zip_members(path):
+    """(entry names, text of the "mimetype" entry or None) of a zip archive"""
+    try:
+        with zipfile.ZipFile(path) as z:
+            names = set(z.namelist())
+            mime = None
+            if "mimetype" in names:
+                with z.open("mimetype") as f:
+                    mime = f.read(200).decode("ascii", "replace").strip()
+            return names, mime
+    except (OSError, RuntimeError, zipfile.BadZipFile):
+        return set(), None
+
+
+def sniff(path):
+    """Classify a file by its first bytes: a registered magic, else text or binary
+
+    As in git, a file is text unless a NUL byte shows up near its start.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_SIZE)
+    except OSError:
+        return "binary"
+    members = None
+    for fmt in FORMATS.values():
+        if not any(head.startswith(m) for m in fmt.magic):
+            continue
+        if not fmt.members:
+            return fmt.kind
+        if members is None:
+            members, mime = _zip_members(path)
+        if not members.intersection(fmt.members):
+            continue
+        if mime is None or not fmt.mimetypes or mime.startswith(fmt.mimetypes):
+            return fmt.kind
+    return "binary" if b"\0" in head else "text"
+
+
+def detect_type(path):
+    """Classify a file as text, excel, docx (any office document), image or binary
+
+    Known extensions decide first, then the mimetypes guess; files neither
+    settles (extensionless, .log, .json, ...) are sniffed.
+    """
+    low = path.lower()
+    for fmt in FORMATS.values():
+        if fmt.extensions and low.endswith(fmt.extensions):
+            return fmt.kind
+    mime, _ = mimetypes.guess_type(path)
+    if mime and mime.startswith("image"):
+        return "image"
+    if mime and mime.startswith("text"):
+        return "text"
+    return sniff(path)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent content-hash cache for Beyond Compare + Meld Clone
+SQLite in the user cache dir, keyed by (path, size, mtime_ns, inode), LRU-capped
+"""
+
+import os
+import sys
+import time
+import atexit
+import sqlite3
+import threading
+
+# Rows kept before the least recently used ones are evicted (~100 bytes each)
+MAX_ENTRIES = int(os.environ.get("CODECOMPARE_CACHE_ENTRIES", 1_000_000))
+
+# Pending writes are committed in batches of this size
+_COMMIT_EVERY = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path     TEXT    NOT NULL,
+    kind     TEXT    NOT NULL,
+    algo     TEXT    NOT NULL,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode    INTEGER NOT NULL,
+    digest   TEXT    NOT NULL,
+    used     REAL    NOT NULL,
+    PRIMARY KEY (path, kind, algo)
+);
+CREATE INDEX IF NOT EXISTS hashes_used ON hashes (used);
+"""
+
+
+def cache_dir():
+    """Per-user cache directory for codeCompare"""
+    if os.environ.get("CODECOMPARE_CACHE_DIR"):
+        return os.environ["CODECOMPARE_CACHE_DIR"]
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "codeCompare")
+
+
+class HashCache:
+    """Digest cache; an entry is valid while size, mtime_ns and inode match"""
+
+    def __init__(self, path=None, max_entries=MAX_ENTRIES):
+        if path is None:
+            os.makedirs(cache_dir(), exist_ok=True)
+            path = os.path.join(cache_dir(), "hashes.sqlite3")
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def get(self, path, st, kind, algo):
+        """Cached digest for path if the file is unchanged, else None"""
+        path = os.path.abspath(path)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest, size, mtime_ns, inode FROM hashes "
+                "WHERE path = ? AND kind = ? AND algo = ?", (path, kind, algo)).fetchone()
+            if not row or row[1:] != (st.st_size, st.st_mtime_ns, st.st_ino):
+                return None
+            self._db.execute(
+                "UPDATE hashes SET used = ? WHERE path = ? AND kind = ? AND algo = ?",
+                (time.time(), path, kind, algo))
+            self._touch()
+            return row[0]
+
+    def put(self, path, st, kind, algo, digest):
+        path = os.path.abspath(path)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, kind, algo, st.st_size, st.st_mtime_ns, st.st_ino, digest, time.time()))
+            self._touch()
+
+    def _touch(self):
+        self._pending += 1
+        if self._pending >= _COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
+
+    def flush(self):
+        """Commit pending writes and evict least recently used rows over the cap"""
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+            if count > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM hashes WHERE rowid IN "
+                    "(SELECT rowid FROM hashes ORDER BY used LIMIT ?)",
+                    (count - self.max_entries,))
+            self._db.commit()
+            self._pending = 0
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM hashes")
+            self._db.commit()
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+class Recorder:
+    """Stand-in cache for worker processes: never hits, records every put
+
+    The parent process replays the records into the real cache, so only
+    one process ever writes the SQLite file.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def get(self, path, st, kind, algo):
+        return None
+
+    def put(self, path, st, kind, algo, digest):
+        self.records.append((path, st, kind, algo, digest))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide HashCache, or None if disabled or unavailable"""
+    global _cache
+    if os.environ.get("CODECOMPARE_NO_CACHE"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = HashCache()
+            except (OSError, sqlite3.Error):
+                _cache = False
+            else:
+                atexit.register(_cache.close)
+        return _cache or None
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Pixel-level image compare for Beyond Compare + Meld Clone
+Both images are compared a tile at a time as NumPy arrays, so only the
+decoded images and one tile of each are ever in memory; the heatmap and
+previews are built at a reduced scale for display. Pillow decodes an image
+whole, so images above MAX_PIXELS are refused before they are decoded;
+below it, a compare is not held to Pillow's smaller bomb limit
+"""
+
+import os
+import math
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Side of the square tiles compared at once
+TILE = 512
+
+# Largest side of the heatmap and previews
+DISPLAY_SIZE = 1024
+
+# Largest image compared, in pixels. A decoded image takes up to 4 bytes a
+# pixel, so two at the limit need about 3 GB. Screenshots and renders
+# above Pillow's default bomb limit are expected.
+MAX_PIXELS = 400_000_000
+
+# SSIM constants for 8-bit data
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+_LUMA = np.array([0.299, 0.587, 0.114])
+
+
+@dataclass
+class ImageDiff:
+    """Result of compare_images
+
+    Tile statistics are (rows, cols) arrays over the TILE grid; the heat
+    map holds the largest channel difference of each display pixel.
+    """
+    left_size: Tuple[int, int]
+    right_size: Tuple[int, int]
+    tile: int
+    scale: int                               # full-size pixels per heatmap pixel
+    changed: int = 0                         # pixels differing beyond the threshold
+    total: int = 0
+    mse: float = 0.0
+    ssim: float = 1.0                        # mean of the tile SSIMs
+    tile_changed: Optional[np.ndarray] = None
+    tile_psnr: Optional[np.ndarray] = None
+    tile_ssim: Optional[np.ndarray] = None
+    boxes: List[Tuple[int, int, int, int]] = field(default_factory=list)
+    heat: Optional[np.ndarray] = None
+
+    @property
+    def identical(self):
+        return self.changed == 0
+
+    @property
+    def psnr(self):
+        return _psnr(self.mse)
+
+    def heatmap(self, base=None):
+        """Heatmap as an RGB image, drawn over a dimmed grey base image if given"""
+        h, w = self.heat.shape
+        if base is None:
+            out = np.zeros((h, w, 3), np.uint8)
+        else:
+            grey = np.asarray(base.convert("L").resize((w, h)), np.uint16) // 3
+            out = np.repeat(grey[:, :, None], 3, axis=2).astype(np.uint8)
+        hot = self.heat > 0
+        out[hot, 0] = np.maximum(self.heat[hot], 96)
+        out[hot, 1] = 0
+        out[hot, 2] = 0
+        return Image.fromarray(out, "RGB")
+
+
+def _psnr(mse):
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def _scale_for(width, height, size=DISPLAY_SIZE):
+    """Smallest power of two that brings the image within size"""
+    scale = 1
+    while max(width, height) > size * scale:
+        scale *= 2
+    return scale
+
+
+def preview(img, size=DISPLAY_SIZE):
+    """Display copy of an image, halved pyramid-style until it fits size"""
+    if img.mode not in ("RGB", "RGBA", "L"):
+        img = img.convert("RGBA")
+    while max(img.size) > size:
+        img = img.reduce(2)
+    return img
+
+
+def open_image(path):
+    """Image.open for a compare: sizes up to MAX_PIXELS, else ValueError
+
+    Pillow's own limit is lifted only while the header is read; nothing is
+    decoded until the size has been checked.
+    """
+    saved = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        img = Image.open(path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = saved
+    if img.width * img.height > MAX_PIXELS:
+        img.close()
+        raise ValueError(f"{path} is {img.width}x{img.height}, over the "
+                         f"{MAX_PIXELS:,} pixel limit for image compare")
+    return img
+
+
+def image_lines(path):
+    """Text stand-in for an image: its name, size and mode"""
+    with open_image(path) as img:
+        return [f"[Image] {os.path.basename(path)}", f"{img.width}x{img.height} {img.mode}"]
+
+
+def _tile_array(img, box):
+    """RGBA array of one tile; pixels outside the image are masked out"""
+    x0, y0, x1, y1 = box
+    w, h = img.size
+    part = img.crop((x0, y0, min(x1, w), min(y1, h))).convert("RGBA")
+    arr = np.zeros((y1 - y0, x1 - x0, 4), np.uint8)
+    valid = np.zeros((y1 - y0, x1 - x0), bool)
+    if part.width and part.height:
+        arr[:part.height, :part.width] = np.asarray(part)
+        valid[:part.height, :part.width] = True
+    return arr, valid
+
+
+def _ssim(a, b):
+    """SSIM of two grey tiles taken as one window"""
+    mx, my = a.mean(), b.mean()
+    vx, vy = a.var(), b.var()
+    cov = ((a - mx) * (b - my)).mean()
+    return ((2 * mx * my + _C1) * (2 * cov + _C2)) / ((mx * mx + my * my + _C1) * (vx + vy + _C2))
+
+
+def _block_max(a, f):
+    """Reduce a 2-D array by f in each direction, keeping the maximum"""
+    if f == 1:
+        return a
+    h, w = a.shape
+    ph, pw = -h % f, -w % f
+    if ph or pw:
+        a = np.pad(a, ((0, ph), (0, pw)))
+    return a.reshape((h + ph) // f, f, (w + pw) // f, f).max(axis=(1, 3))
+
+
+def _boxes(grid, tile_boxes):
+    """Bounding boxes of the groups of touching changed tiles"""
+    rows, cols = grid.shape
+    seen = np.zeros_like(grid, bool)
+    boxes = []
+    for r in range(rows):
+        for c in range(cols):
+            if not grid[r, c] or seen[r, c]:
+                continue
+            stack, box = [(r, c)], None
+            seen[r, c] = True
+            while stack:
+                y, x = stack.pop()
+                b = tile_boxes[y, x]
+                box = b if box is None else (min(box[0], b[0]), min(box[1], b[1]),
+                                             max(box[2], b[2]), max(box[3], b[3]))
+                for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                    if 0 <= ny < rows and 0 <= nx < cols and grid[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        stack.append((ny, nx))
+            boxes.append(box)
+    return boxes
+
+
+def compare_images(left_path, right_path, threshold=0, tile=TILE, progress=None):
+    """Compare two images pixel by pixel and return an ImageDiff
+
+    A pixel is changed when any channel (alpha included) differs by more
+    than threshold. Images of different sizes are compared over the
+    larger canvas, where pixels only one image has count as changed.
+    progress(done, total) is called after each tile. Raises ValueError for
+    an image above MAX_PIXELS, read from its header before decoding.
+    """
+    with open_image(left_path) as li, open_image(right_path) as ri:
+        li.load()
+        ri.load()
+        width, height = max(li.width, ri.width), max(li.height, ri.height)
+        scale = _scale_for(width, height)
+        # Tiles are a multiple of the scale, so heatmap blocks never straddle tiles
+        tile = max(tile, scale) // scale * scale
+        rows, cols = -(-height // tile), -(-width // tile)
+
+        res = ImageDiff(li.size, ri.size, tile, scale, total=width * height)
+        res.tile_changed = np.zeros((rows, cols), np.int64)
+        res.tile_psnr = np.full((rows, cols), math.inf)
+        res.tile_ssim = np.ones((rows, cols))
+        res.heat = np.zeros((-(-height // scale), -(-width // scale)), np.uint8)
+        tile_boxes = np.empty((rows, cols), object)
+        sq_sum, compared, ssim_sum = 0.0, 0, 0.0
+
+        for r in range(rows):
+            for c in range(cols):
+                box = (c * tile, r * tile, min(width, (c + 1) * tile), min(height, (r + 1) * tile))
+                a, va = _tile_array(li, box)
+                b, vb = _tile_array(ri, box)
+                if np.array_equal(va, vb) and np.array_equal(a, b):
+                    # Most tiles of near-identical images end here
+                    compared += int(va.sum()) * 4
+                    ssim_sum += 1.0
+                    if progress:
+                        progress(r * cols + c + 1, rows * cols)
+                    continue
+
+                a, b = a.astype(np.int16), b.astype(np.int16)
+                both = va & vb
+                diff = np.abs(a - b).max(axis=2)
+                diff[va != vb] = 255
+                changed = diff > threshold
+
+                n = int(changed.sum())
+                res.tile_changed[r, c] = n
+                res.changed += n
+                if n:
+                    ys, xs = np.nonzero(changed.any(axis=1))[0], np.nonzero(changed.any(axis=0))[0]
+                    tile_boxes[r, c] = (box[0] + int(xs[0]), box[1] + int(ys[0]),
+                                        box[0] + int(xs[-1]) + 1, box[1] + int(ys[-1]) + 1)
+                    hy, hx = box[1] // scale, box[0] // scale
+                    block = _block_max(np.where(changed, diff, 0).astype(np.uint8), scale)
+                    res.heat[hy:hy + block.shape[0], hx:hx + block.shape[1]] = block
+
+                if both.any():
+                    pa, pb = a[both], b[both]
+                    d = (pa - pb).astype(np.float64)
+                    sq = float((d * d).sum())
+                    sq_sum += sq
+                    compared += d.size
+                    res.tile_psnr[r, c] = _psnr(sq / d.size)
+                    # Luma as in ITU-R 601, on the part both images cover
+                    res.tile_ssim[r, c] = _ssim(pa[:, :3] @ _LUMA, pb[:, :3] @ _LUMA)
+                elif n:
+                    res.tile_psnr[r, c] = 0.0
+                    res.tile_ssim[r, c] = 0.0
+                ssim_sum += res.tile_ssim[r, c]
+
+                if progress:
+                    progress(r * cols + c + 1, rows * cols)
+
+        res.mse = sq_sum / compared if compared else 0.0
+        res.ssim = ssim_sum / (rows * cols) if rows * cols else 1.0
+        res.boxes = _boxes(res.tile_changed > 0, tile_boxes)
+    return res
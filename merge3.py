@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Three-way merge for Beyond Compare + Meld Clone
+Left and right are each diffed against their common ancestor, then one
+sweep over the base merges the two change lists into hunks. Hunks hold
+line ranges only, and the merged file is produced line by line, so large
+files are never copied to build the result
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from diffcore import get_opcodes, read_lines
+
+# Hunk kinds: unchanged, changed on one side, changed alike on both, or not
+HUNK_TAGS = ("same", "left", "right", "both", "conflict")
+
+# Ways to resolve a conflict hunk ("both" keeps left then right)
+CHOICES = ("left", "right", "base", "both")
+
+
+@dataclass
+class MergeHunk:
+    """Lines [b0, b1) of the base, against [l0, l1) of left and [r0, r1) of right"""
+    tag: str
+    b0: int
+    b1: int
+    l0: int
+    l1: int
+    r0: int
+    r1: int
+    choice: Optional[str] = None    # resolution of a conflict, one of CHOICES
+
+
+@dataclass
+class Merge3:
+    base: List[str]
+    left: List[str]
+    right: List[str]
+    hunks: List[MergeHunk] = field(default_factory=list)
+    names: tuple = ("left", "base", "right")   # conflict marker labels
+
+    @property
+    def conflicts(self):
+        return [h for h in self.hunks if h.tag == "conflict"]
+
+    @property
+    def unresolved(self):
+        return sum(1 for h in self.hunks if h.tag == "conflict" and h.choice is None)
+
+    def hunk_lines(self, h):
+        """The merged lines of one hunk; an open conflict comes out with diff3 markers"""
+        base, left, right = self.base, self.left, self.right
+        if h.tag == "same":
+            return (base[k] for k in range(h.b0, h.b1))
+        if h.tag in ("left", "both"):
+            return (left[k] for k in range(h.l0, h.l1))
+        if h.tag == "right":
+            return (right[k] for k in range(h.r0, h.r1))
+        return self._conflict_lines(h)
+
+    def _conflict_lines(self, h):
+        if h.choice in ("left", "both"):
+            yield from (self.left[k] for k in range(h.l0, h.l1))
+        if h.choice in ("right", "both"):
+            yield from (self.right[k] for k in range(h.r0, h.r1))
+        if h.choice == "base":
+            yield from (self.base[k] for k in range(h.b0, h.b1))
+        if h.choice is None:
+            yield f"<<<<<<< {self.names[0]}"
+            yield from (self.left[k] for k in range(h.l0, h.l1))
+            yield f"||||||| {self.names[1]}"
+            yield from (self.base[k] for k in range(h.b0, h.b1))
+            yield "======="
+            yield from (self.right[k] for k in range(h.r0, h.r1))
+            yield f">>>>>>> {self.names[2]}"
+
+    def lines(self):
+        """Yield the merged file line by line"""
+        for h in self.hunks:
+            yield from self.hunk_lines(h)
+
+    def write(self, out):
+        """Write the merged file to a text stream, lines joined as read_lines split them"""
+        first = True
+        for line in self.lines():
+            if not first:
+                out.write("\n")
+            out.write(line)
+            first = False
+
+
+def _changes(a, b, algorithm, progress):
+    return [(i1, i2, j1, j2) for tag, i1, i2, j1, j2 in get_opcodes(a, b, algorithm, progress)
+            if tag != "equal"]
+
+
+def merge3(base, left, right, algorithm="myers", progress=None):
+    """Merge two descendants of base; returns a Merge3 of hunks over the three lists
+
+    A change on one side only is taken as is, the same change on both
+    sides once. Changes of the two sides that overlap or touch in the
+    base form one conflict hunk, as in diff3 and git.
+    progress(done, total) covers both diffs and may raise to abort.
+    """
+    n = len(base)
+    half = len(base) + max(len(left), len(right))
+    tick_l = tick_r = None
+    if progress:
+        tick_l = lambda done, total: progress(done, 2 * half)
+        tick_r = lambda done, total: progress(half + done, 2 * half)
+    changes = (_changes(base, left, algorithm, tick_l), _changes(base, right, algorithm, tick_r))
+
+    res = Merge3(base, left, right)
+    hunks = res.hunks
+    idx = [0, 0]        # next change of each side
+    shift = [0, 0]      # side line minus base line, before the next change
+    pos = 0             # base lines before pos are in hunks
+
+    while idx[0] < len(changes[0]) or idx[1] < len(changes[1]):
+        # The region starts at the first pending change of either side ...
+        firsts = [changes[s][idx[s]][0] if idx[s] < len(changes[s]) else n + 1 for s in (0, 1)]
+        lo = hi = min(firsts)
+        taken = [[], []]
+        # ... and grows while a change of either side overlaps or touches it
+        grew = True
+        while grew:
+            grew = False
+            for s in (0, 1):
+                while idx[s] < len(changes[s]) and changes[s][idx[s]][0] <= hi:
+                    c = changes[s][idx[s]]
+                    taken[s].append(c)
+                    hi = max(hi, c[1])
+                    idx[s] += 1
+                    grew = True
+
+        if lo > pos:
+            hunks.append(MergeHunk("same", pos, lo, pos + shift[0], lo + shift[0],
+                                   pos + shift[1], lo + shift[1]))
+        spans = []
+        for s in (0, 1):
+            start = lo + shift[s]
+            for i1, i2, j1, j2 in taken[s]:
+                shift[s] = j2 - i2
+            spans.append((start, hi + shift[s]))
+        (l0, l1), (r0, r1) = spans
+        if not taken[1]:
+            tag = "left"
+        elif not taken[0]:
+            tag = "right"
+        elif l1 - l0 == r1 - r0 and left[l0:l1] == right[r0:r1]:
+            tag = "both"
+        else:
+            tag = "conflict"
+        hunks.append(MergeHunk(tag, lo, hi, l0, l1, r0, r1))
+        pos = hi
+
+    if pos < n or not hunks:
+        hunks.append(MergeHunk("same", pos, n, pos + shift[0], n + shift[0],
+                               pos + shift[1], n + shift[1]))
+    return res
+
+
+def merge_files(base_path, left_path, right_path, algorithm="myers", progress=None):
+    """Three-way merge of text files; conflict markers are labelled with the paths"""
+    res = merge3(read_lines(base_path), read_lines(left_path), read_lines(right_path),
+                 algorithm, progress)
+    res.names = (left_path, base_path, right_path)
+    return res
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming reports for Beyond Compare + Meld Clone
+Reports are written to a text stream while the diff result is walked row
+by row, never built up first, so a million-line diff or a large folder is
+reported in constant extra memory. Formats: unified patch, JSON lines (one
+record per line) and self-contained side-by-side HTML
+"""
+
+import os
+import json
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import asdict
+from html import escape
+
+from diffcore import (
+    DEFAULT_HASH, BinaryDiff, DiffOptions, _range, compare_files, detect_type, inline_diff
+)
+from streamdiff import LARGE_FILE, line_text, stream_opcodes, stream_unified
+
+# Report formats by file extension; anything else is written as a patch
+REPORT_FORMATS = {".patch": "patch", ".diff": "patch", ".jsonl": "jsonl",
+                  ".html": "html", ".htm": "html"}
+
+HTML_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ font-family: Consolas, monospace; font-size: 13px; background: #1e1e1e; color: #ddd; }}
+table {{ border-collapse: collapse; width: 100%; }}
+td, th {{ padding: 1px 6px; white-space: pre; vertical-align: top; }}
+th {{ text-align: left; background: #333; }}
+.added {{ background: #355E3B; }} .removed {{ background: #78281F; }}
+.changed {{ background: #5B4A8A; }} .moved {{ background: #D4AC0D; color: black; }}
+.inline {{ background: #8E6FD8; }} .num {{ color: #888; text-align: right; }}
+</style></head><body>
+<h3>{title}</h3>
+"""
+
+_ENTRY_CSS = {"Only Left": "removed", "Only Right": "added", "Different": "changed"}
+
+
+def report_format(path):
+    """Report format for a file name, from its extension"""
+    return REPORT_FORMATS.get(os.path.splitext(path)[1].lower(), "patch")
+
+
+def _record(out, **fields):
+    out.write(json.dumps(fields, ensure_ascii=False) + "\n")
+
+
+def _marked(text, spans):
+    """Escaped text with the given (start, end) spans wrapped for highlighting"""
+    parts, pos = [], 0
+    for a, b in spans:
+        parts.append(escape(text[pos:a]))
+        parts.append(f'<span class="inline">{escape(text[a:b])}</span>')
+        pos = b
+    parts.append(escape(text[pos:]))
+    return "".join(parts)
+
+
+def _html_row(out, ln, lt, ltag, rn, rt, rtag):
+    if ln and rn and ltag == rtag == "changed":
+        ls, rs = inline_diff(lt, rt)
+        lt, rt = _marked(lt, ls), _marked(rt, rs)
+    else:
+        lt, rt = escape(lt), escape(rt)
+    out.write(f'<tr><td class="num">{ln or ""}</td><td class="{ltag}">{lt}</td>'
+              f'<td class="num">{rn or ""}</td><td class="{rtag}">{rt}</td></tr>\n')
+
+
+def line_fields(li, lt, ltag, ri, rt, rtag):
+    """Fields of one changed line; li and ri are 0-based document lines, -1 if absent
+
+    Lines are reported 1-based, as in the files.
+    """
+    if li >= 0 and ri >= 0:
+        return dict(type="changed", left=li + 1, right=ri + 1, old=lt, new=rt)
+    if li >= 0:
+        return dict(type=ltag or "removed", left=li + 1, old=lt)
+    return dict(type=rtag or "added", right=ri + 1, new=rt)
+
+
+def _line_record(out, *line):
+    _record(out, record="line", **line_fields(*line))
+
+
+# ----------------------------------------------------------------------
+# Aligned diffs (TextDiff results and the side-by-side view)
+# ----------------------------------------------------------------------
+
+def _groups(rows, starts, stops, n):
+    """(first row, stop row, first hunk, stop hunk) of each unified diff hunk
+
+    Hunks less than 2 * n rows apart are shown together, as in difflib;
+    each group is widened by n context rows.
+    """
+    h0 = 0
+    for h in range(1, len(starts) + 1):
+        if h < len(starts) and starts[h] - stops[h - 1] <= 2 * n:
+            continue
+        yield max(0, starts[h0] - n), min(rows, stops[h - 1] + n), h0, h
+        h0 = h
+
+
+def _doc_end(doc):
+    """(lines, whether the last one lacks a line break) of a read_lines document
+
+    read_lines ends a document whose last line has a break with "", which
+    is not a line of the file.
+    """
+    if doc and doc[-1] == "":
+        return len(doc) - 1, False
+    return len(doc), bool(doc)
+
+
+def _last_row(al, side, i):
+    """Row of line i of a side, scanning back from the end"""
+    index = al.index[side]
+    r = len(index) - 1
+    while index[r] != i:
+        r -= 1
+    return r
+
+
+def changed_lines(al, items):
+    """(li, lt, ltag, ri, rt, rtag) of each changed row of an Alignment, for line_fields
+
+    The trailing "" of a read_lines document is not a line and is skipped.
+    """
+    index, docs = al.index, al.docs
+    nl, nr = _doc_end(docs[0])[0], _doc_end(docs[1])[0]
+    for s, e in zip(items.starts, items.stops):
+        for r in range(s, e):
+            li, ri = index[0][r], index[1][r]
+            li, ri = (li if li < nl else -1), (ri if ri < nr else -1)
+            if li < 0 and ri < 0:
+                continue
+            yield (li, docs[0][li] if li >= 0 else "", al.tag(0, r),
+                   ri, docs[1][ri] if ri >= 0 else "", al.tag(1, r))
+
+
+def align_unified(al, items, fromfile="", tofile="", n=3):
+    """Unified diff lines of an Alignment's documents, following its hunks
+
+    The lines are the documents' own, so whitespace and case are shown as
+    they are even when the diff ignored them. As in diff and git, a last
+    line without a line break is followed by a "\\ No newline at end of
+    file" line, and differs from the same text with a break.
+    """
+    index, docs = al.index, al.docs
+    (nl, noeol_l), (nr, noeol_r) = _doc_end(docs[0]), _doc_end(docs[1])
+    # Per side: line count, and the last line if it lacks a break (else -1)
+    count, noeol = (nl, nr), (nl - 1 if noeol_l else -1, nr - 1 if noeol_r else -1)
+    starts, stops = array("i", items.starts), array("i", items.stops)
+    # The last row of either document may pair a line with the other's
+    # trailing "", or a line without a break with one that has it; both
+    # are changes the diff saw as equal, so the row joins a hunk
+    for side in (0, 1):
+        if not docs[side]:
+            continue
+        r = _last_row(al, side, len(docs[side]) - 1)
+        li, ri = index[0][r], index[1][r]
+        li = li if 0 <= li < nl else -1
+        ri = ri if 0 <= ri < nr else -1
+        if li < 0 and ri < 0 or li >= 0 and ri >= 0 and (li == noeol[0]) == (ri == noeol[1]):
+            continue
+        k = bisect_left(starts, r + 1)
+        if k and stops[k - 1] > r:
+            continue
+        if k and stops[k - 1] == r:
+            stops[k - 1] = r + 1
+            if k < len(starts) and starts[k] == r + 1:
+                stops[k - 1] = stops.pop(k)
+                del starts[k]
+        elif k < len(starts) and starts[k] == r + 1:
+            starts[k] = r
+        else:
+            starts.insert(k, r)
+            stops.insert(k, r + 1)
+
+    def lines(prefix, side, i):
+        yield prefix + docs[side][i]
+        if i == noeol[side]:
+            yield "\\ No newline at end of file"
+
+    started = False
+    for a, b, h0, h1 in _groups(len(al), starts, stops, n):
+        if not started:
+            started = True
+            yield f"--- {fromfile}"
+            yield f"+++ {tofile}"
+        i1, i2 = min(al.doc_pos(0, a), nl), min(al.doc_pos(0, b), nl)
+        j1, j2 = min(al.doc_pos(1, a), nr), min(al.doc_pos(1, b), nr)
+        yield f"@@ -{_range(i1, i2)} +{_range(j1, j2)} @@"
+        row = a
+        for h in range(h0, h1 + 1):
+            stop = starts[h] if h < h1 else b
+            # Context rows; rows only one side has are still changes
+            for r in range(row, stop):
+                li, ri = index[0][r], index[1][r]
+                li = li if 0 <= li < nl else -1
+                ri = ri if 0 <= ri < nr else -1
+                if li >= 0 and ri >= 0:
+                    yield from lines(" ", 0, li)
+                    continue
+                if li >= 0:
+                    yield from lines("-", 0, li)
+                if ri >= 0:
+                    yield from lines("+", 1, ri)
+            if h == h1:
+                break
+            for side, prefix in ((0, "-"), (1, "+")):
+                for r in range(starts[h], stops[h]):
+                    i = index[side][r]
+                    if 0 <= i < count[side]:
+                        yield from lines(prefix, side, i)
+            row = stops[h]
+
+
+def write_diff(out, fmt, al, items, left, right, context=3):
+    """Report an aligned diff of the files left and right
+
+    The patch has context lines around each hunk, JSON lines a record per
+    changed line and the HTML every row side by side.
+    """
+    if fmt == "patch":
+        for line in align_unified(al, items, left, right, context):
+            out.write(line + "\n")
+        return
+
+    index, docs = al.index, al.docs
+    if fmt == "jsonl":
+        _record(out, record="file", left=left, right=right)
+        for line in changed_lines(al, items):
+            _line_record(out, *line)
+        _record(out, record="summary", identical=not items, differences=len(items))
+        return
+
+    out.write(HTML_HEAD.format(title=escape(f"{left} ↔ {right}")))
+    out.write("<table>\n")
+    for r in range(len(al)):
+        li, ri = index[0][r], index[1][r]
+        _html_row(out, li + 1 if li >= 0 else None, docs[0][li] if li >= 0 else "", al.tag(0, r),
+                  ri + 1 if ri >= 0 else None, docs[1][ri] if ri >= 0 else "", al.tag(1, r))
+    out.write("</table>\n")
+    out.write(f"<p>{len(items)} differences</p>\n" if items else "<p>Identical</p>\n")
+    out.write("</body></html>\n")
+
+
+def write_binary(out, fmt, res, left, right):
+    """Report a BinaryDiff: whether the contents differ, and their hashes"""
+    if fmt == "patch":
+        if not res.identical:
+            out.write(f"Binary files {left} and {right} differ\n")
+    elif fmt == "jsonl":
+        _record(out, record="file", left=left, right=right)
+        _record(out, record="summary", identical=res.identical,
+                left_hash=res.left_hash, right_hash=res.right_hash)
+    else:
+        out.write(HTML_HEAD.format(title=escape(f"{left} ↔ {right}")))
+        out.write(f"<p>{'Identical' if res.identical else 'Different'}</p>\n"
+                  f"<p>{escape(res.left_hash)}<br>{escape(res.right_hash)}</p>\n</body></html>\n")
+
+
+def write_result(out, fmt, res, left, right, context=3):
+    """Report a compare_files result, TextDiff or BinaryDiff"""
+    if isinstance(res, BinaryDiff):
+        write_binary(out, fmt, res, left, right)
+    else:
+        write_diff(out, fmt, res.align, res.items, left, right, context)
+    return res.identical
+
+
+# ----------------------------------------------------------------------
+# Large files, read as a stream
+# ----------------------------------------------------------------------
+
+def write_stream(out, fmt, left, right, options=None, context=3):
+    """Report two files of any size from stream_opcodes; returns True if identical
+
+    Only the changed hunks are shown, in every format.
+    """
+    if fmt == "patch":
+        same = True
+        for line in stream_unified(left, right, options, context):
+            out.write(line + "\n")
+            same = False
+        return same
+
+    ops = ((tag, i1, i2, j1, j2, [line_text(x) for x in la], [line_text(x) for x in lb])
+           for tag, i1, i2, j1, j2, la, lb in stream_opcodes(left, right, options, 0)
+           if tag != "equal")
+    count = 0
+    if fmt == "jsonl":
+        _record(out, record="file", left=left, right=right)
+        for tag, i1, i2, j1, j2, la, lb in ops:
+            for k in range(max(len(la), len(lb))):
+                _line_record(out, i1 + k if k < len(la) else -1, la[k] if k < len(la) else "",
+                             "removed", j1 + k if k < len(lb) else -1,
+                             lb[k] if k < len(lb) else "", "added")
+                count += 1
+        _record(out, record="summary", identical=not count, differences=count)
+        return not count
+
+    out.write(HTML_HEAD.format(title=escape(f"{left} ↔ {right}")))
+    out.write("<table>\n")
+    for tag, i1, i2, j1, j2, la, lb in ops:
+        out.write(f'<tr><th colspan="4">@@ -{i1 + 1},{i2 - i1} +{j1 + 1},{j2 - j1} @@</th></tr>\n')
+        for k in range(max(len(la), len(lb))):
+            lrow, rrow = k < len(la), k < len(lb)
+            pair = "changed" if lrow and rrow else ""
+            _html_row(out, i1 + k + 1 if lrow else None, la[k] if lrow else "",
+                      pair or ("removed" if lrow else ""), j1 + k + 1 if rrow else None,
+                      lb[k] if rrow else "", pair or ("added" if rrow else ""))
+            count += 1
+    out.write("</table>\n")
+    out.write(f"<p>{count} differences</p>\n" if count else "<p>Identical</p>\n")
+    out.write("</body></html>\n")
+    return not count
+
+
+# ----------------------------------------------------------------------
+# Folders
+# ----------------------------------------------------------------------
+
+def file_patch(left, right, options=None, context=3, hash_algo=DEFAULT_HASH, use_cache=True,
+               stream=False):
+    """Unified diff lines of a file pair; large text files (or all, with stream) are streamed"""
+    types = {detect_type(left), detect_type(right)}
+    if not types <= {"text", "docx"}:
+        return [f"Binary files {left} and {right} differ"]
+    large = max(os.path.getsize(left), os.path.getsize(right)) > LARGE_FILE
+    if types == {"text"} and (stream or large):
+        return stream_unified(left, right, options, context)
+    res = compare_files(left, right, options or DiffOptions(), hash_algo, use_cache)
+    return align_unified(res.align, res.items, left, right, context)
+
+
+def _only_in(root, path):
+    """diff -r's line for a file one folder lacks: its folder, then its name"""
+    folder, name = os.path.split(path)
+    return f"Only in {os.path.join(root, folder) if folder else root}: {name}\n"
+
+
+def write_tree(out, fmt, left, right, entries, patch=None):
+    """Report folder compare entries (TreeEntry) as they arrive; returns True if identical
+
+    The patch holds a diff of every differing file, made by patch(left
+    path, right path) (file_patch by default); JSON lines and HTML list the
+    entries, then a count per status.
+    """
+    patch = patch or file_patch
+    counts = Counter()
+    if fmt == "jsonl":
+        _record(out, record="folder", left=left, right=right)
+    elif fmt == "html":
+        out.write(HTML_HEAD.format(title=escape(f"{left} ↔ {right}")))
+        out.write("<table>\n<tr><th>Status</th><th>Path</th><th>Size</th></tr>\n")
+
+    for e in entries:
+        counts[e.status] += 1
+        if fmt == "jsonl":
+            _record(out, record="entry", **asdict(e))
+        elif fmt == "html":
+            out.write(f'<tr class="{_ENTRY_CSS.get(e.status, "")}"><td>{e.status}</td>'
+                      f'<td>{escape(e.path)}</td><td class="num">{e.size}</td></tr>\n')
+        elif e.status in ("Only Left", "Only Right"):
+            out.write(_only_in(left if e.status == "Only Left" else right, e.path))
+        elif e.status == "Different":
+            for line in patch(os.path.join(left, e.path), os.path.join(right, e.path)):
+                out.write(line + "\n")
+
+    same = set(counts) <= {"Identical"}
+    if fmt == "jsonl":
+        _record(out, record="summary", identical=same, counts=dict(counts))
+    elif fmt == "html":
+        out.write("</table>\n<p>" + (", ".join(f"{st}: {n}" for st, n in sorted(counts.items()))
+                                      or "Empty") + "</p>\n</body></html>\n")
+    return same
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming, memory-bounded compare for files larger than RAM
+Both files are mmapped; the common prefix and suffix are skipped bytewise
+and only the differing middle is split into lines and diffed, a window at
+a time
+"""
+
+import os
+import mmap
+from collections import deque
+
+from diffcore import DiffOptions, _range, get_opcodes
+
+# Files above this size are compared in streaming mode
+LARGE_FILE = 256 << 20
+
+# Lines per side handed to the diff engine at a time
+WINDOW = 20_000
+
+CHUNK = 1 << 20
+
+# Kept on the last line of a file without a final line break, so that line
+# never matches the same text followed by one; unified diffs print it as
+# the "\ No newline at end of file" line of diff and git
+NO_EOL = "\n\\ No newline at end of file"
+
+
+def line_text(line):
+    """A streamed line without the no-newline marker"""
+    return line[:-len(NO_EOL)] if line.endswith(NO_EOL) else line
+
+
+def _open_map(path):
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return b"", 0
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), size
+
+
+def _first_mismatch(x, y):
+    """Index of the first differing byte of two equal-length, unequal chunks"""
+    lo, hi = 0, len(x)
+    while hi - lo > 64:
+        mid = (lo + hi) // 2
+        if x[lo:mid] == y[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    while x[lo] == y[lo]:
+        lo += 1
+    return lo
+
+
+def _common_prefix(a, b, n):
+    pos = 0
+    while pos < n:
+        step = min(CHUNK, n - pos)
+        x, y = a[pos:pos + step], b[pos:pos + step]
+        if x != y:
+            return pos + _first_mismatch(x, y)
+        pos += step
+    return n
+
+
+def _common_suffix(a, na, b, nb, n):
+    pos = 0
+    while pos < n:
+        step = min(CHUNK, n - pos)
+        x, y = a[na - pos - step:na - pos], b[nb - pos - step:nb - pos]
+        if x != y:
+            return pos + _first_mismatch(x[::-1], y[::-1])
+        pos += step
+    return n
+
+
+def _count_lines(mm, stop):
+    count = 0
+    for pos in range(0, stop, CHUNK):
+        count += mm[pos:min(stop, pos + CHUNK)].count(b"\n")
+    return count
+
+
+def _middle(a, na, b, nb, context):
+    """Byte ranges and first line numbers of the differing middle of a and b
+
+    The ranges are widened by context lines so hunks can show them.
+    """
+    p = _common_prefix(a, b, min(na, nb))
+    s = _common_suffix(a, na, b, nb, min(na, nb) - p)
+
+    # Start of the line holding the first difference, minus context lines
+    start = a.rfind(b"\n", 0, p) + 1
+    for _ in range(context):
+        if not start:
+            break
+        start = a.rfind(b"\n", 0, start - 1) + 1
+
+    # First whole line of the common suffix, plus context lines
+    ta, tb = na - s, nb - s
+    if not (ta == 0 or a[ta - 1:ta] == b"\n") or not (tb == 0 or b[tb - 1:tb] == b"\n"):
+        q = a.find(b"\n", ta)
+        ta = na if q < 0 else q + 1
+        tb = nb - (na - ta)
+    for _ in range(context):
+        if ta == na:
+            break
+        q = a.find(b"\n", ta)
+        ta = na if q < 0 else q + 1
+        tb = nb - (na - ta)
+
+    line0 = _count_lines(a, start)
+    return (start, ta), (start, tb), line0
+
+
+class _Lines:
+    """Sliding buffer of decoded lines over a byte range of a mapped file"""
+
+    def __init__(self, mm, start, stop, line0, at_eof):
+        self.mm = mm
+        self.pos = start
+        self.stop = stop
+        self.base = line0         # line number of buf[0]
+        self.buf = []
+        self.at_eof = at_eof      # the range runs to the end of the file
+        self._tail = b""
+
+    @property
+    def end(self):
+        return self.base + len(self.buf)
+
+    @property
+    def done(self):
+        return self.pos >= self.stop
+
+    def fill(self, upto):
+        """Read until lines before upto are buffered or the range is exhausted
+
+        A range ends on a line break, or at the end of the file; a last
+        line without a break gets NO_EOL.
+        """
+        while self.end < upto and self.pos < self.stop:
+            end = min(self.stop, self.pos + CHUNK)
+            parts = (self._tail + self.mm[self.pos:end]).split(b"\n")
+            self.pos = end
+            self._tail = parts.pop() if end < self.stop else b""
+            last = parts.pop() if end == self.stop else b""
+            self.buf.extend(
+                (x[:-1] if x.endswith(b"\r") else x).decode("utf-8", "replace") for x in parts)
+            if last and self.at_eof:
+                self.buf.append((last[:-1] if last.endswith(b"\r") else last)
+                                .decode("utf-8", "replace") + NO_EOL)
+
+    def lines(self, i, j):
+        return self.buf[i - self.base:j - self.base]
+
+    def drop(self, upto):
+        del self.buf[:upto - self.base]
+        self.base = upto
+
+
+def _normalize(lines, options):
+    """Apply comparison options line by line
+
+    Blank lines cannot be skipped without materializing the whole file,
+    so ignore_blank only makes blank lines compare equal to each other.
+    """
+    if lines and lines[-1].endswith(NO_EOL):
+        return _normalize(lines[:-1], options) + [
+            _normalize([line_text(lines[-1])], options)[0] + NO_EOL]
+    if options.ignore_ws or options.ignore_blank:
+        lines = [l.strip() if options.ignore_ws or not l.strip() else l for l in lines]
+    if options.ignore_case:
+        lines = [l.lower() for l in lines]
+    return lines
+
+
+def stream_opcodes(left_path, right_path, options=None, context=3, window=WINDOW):
+    """Yield (tag, i1, i2, j1, j2, a_lines, b_lines) for two files of any size
+
+    Line numbers are 0-based and absolute. Only the differing middle of the
+    files is ever split into lines, at most window lines per side at a time,
+    so memory stays bounded no matter how large the files are.
+    """
+    options = options or DiffOptions()
+    a, na = _open_map(left_path)
+    b, nb = _open_map(right_path)
+    try:
+        (a0, a1), (b0, b1), line0 = _middle(a, na, b, nb, context)
+        if a0 == a1 and b0 == b1:
+            return
+        A = _Lines(a, a0, a1, line0, a1 == na)
+        B = _Lines(b, b0, b1, line0, b1 == nb)
+
+        i = j = line0
+        while True:
+            A.fill(i + window)
+            B.fill(j + window)
+            la = A.lines(i, i + window)
+            lb = B.lines(j, j + window)
+            last = A.done and B.done and i + len(la) == A.end and j + len(lb) == B.end
+            if not la and not lb:
+                break
+
+            codes = get_opcodes(_normalize(la, options), _normalize(lb, options), options.algorithm)
+            if not last:
+                # Commit up to the last matching run; the rest is re-diffed
+                # together with the next window
+                cut = max((k for k, op in enumerate(codes) if op[0] == "equal"), default=None)
+                if cut is not None:
+                    codes = codes[:cut + 1]
+                else:
+                    tag = "replace" if la and lb else ("delete" if la else "insert")
+                    codes = [(tag, 0, len(la), 0, len(lb))]
+
+            for tag, i1, i2, j1, j2 in codes:
+                yield tag, i + i1, i + i2, j + j1, j + j2, la[i1:i2], lb[j1:j2]
+
+            i += codes[-1][2]
+            j += codes[-1][4]
+            A.drop(i)
+            B.drop(j)
+            if last:
+                break
+    finally:
+        for mm in (a, b):
+            if isinstance(mm, mmap.mmap):
+                mm.close()
+
+
+def _unified_line(prefix, line):
+    if line.endswith(NO_EOL):
+        yield prefix + line_text(line)
+        yield NO_EOL[1:]
+    else:
+        yield prefix + line
+
+
+def _hunk(group):
+    first, last = group[0], group[-1]
+    yield f"@@ -{_range(first[1], last[2])} +{_range(first[3], last[4])} @@"
+    for tag, i1, i2, j1, j2, la, lb in group:
+        if tag == "equal":
+            for line in la:
+                yield from _unified_line(" ", line)
+            continue
+        if tag in ("replace", "delete"):
+            for line in la:
+                yield from _unified_line("-", line)
+        if tag in ("replace", "insert"):
+            for line in lb:
+                yield from _unified_line("+", line)
+
+
+def stream_unified(left_path, right_path, options=None, n=3, fromfile=None, tofile=None,
+                   window=WINDOW):
+    """Unified diff lines of two files of any size, produced as a stream
+
+    Long equal runs are never held in memory: only their first and last n
+    lines are kept for hunk context.
+    """
+    fromfile = left_path if fromfile is None else fromfile
+    tofile = right_path if tofile is None else tofile
+    group = []
+    eq = None           # [i1, i2, j1, j2, head lines, tail lines] of the equal run
+    started = False
+
+    def context(i1, j1, lines):
+        return ("equal", i1, i1 + len(lines), j1, j1 + len(lines), lines, lines)
+
+    for op in stream_opcodes(left_path, right_path, options, n, window):
+        tag, i1, i2, j1, j2, la, lb = op
+        if tag == "equal":
+            if eq and eq[1] == i1:
+                eq[1], eq[3] = i2, j2
+                eq[4].extend(la[:n - len(eq[4])])
+                eq[5].extend(la)
+            else:
+                eq = [i1, i2, j1, j2, list(la[:n]), deque(la, maxlen=n)]
+            continue
+
+        if eq:
+            e1, e2, f1, f2, head, tail = eq
+            cnt = e2 - e1
+            tail = list(tail)
+            if not group:
+                k = min(n, cnt)
+                if k:
+                    group.append(context(e2 - k, f2 - k, tail[len(tail) - k:]))
+            elif cnt > 2 * n:
+                group.append(context(e1, f1, head))
+                if not started:
+                    started = True
+                    yield f"--- {fromfile}"
+                    yield f"+++ {tofile}"
+                yield from _hunk(group)
+                group = [context(e2 - n, f2 - n, tail)] if n else []
+            else:
+                lines = head[:cnt] if cnt <= n else head + tail[len(tail) - (cnt - n):]
+                group.append(context(e1, f1, lines))
+            eq = None
+        group.append(op)
+
+    if group:
+        if eq:
+            k = min(n, eq[1] - eq[0])
+            if k:
+                group.append(context(eq[0], eq[2], eq[4][:k]))
+        if not started:
+            yield f"--- {fromfile}"
+            yield f"+++ {tofile}"
+        yield from _hunk(group)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Syntax highlighting for Beyond Compare + Meld Clone
+Precompiled per-language lexers and a line-state cache, so only the lines
+on screen are ever lexed
+"""
+
+import os
+import re
+
+# Tags a lexer can produce; the panes configure their colours
+TAGS = ("keyword", "string", "comment")
+
+# Line spans kept per document before the cache is dropped
+MAX_CACHED = 50_000
+
+
+class Lexer:
+    """Line lexer built from one compiled regex
+
+    Tokens that may run over several lines (block comments, triple-quoted
+    strings) are given as opener -> (closer, tag); the state carried from
+    one line to the next is the opener still waiting for its closer, or
+    None.
+    """
+
+    def __init__(self, name, keywords, comment=None, strings=('"', "'"), blocks=None,
+                 ignore_case=False):
+        self.name = name
+        self.blocks = blocks or {}
+        parts = []
+        for opener, (closer, _) in self.blocks.items():
+            o, c = re.escape(opener), re.escape(closer)
+            parts.append(f"(?P<b{len(parts)}>{o}.*?{c}|{o})")
+        self._openers = {f"b{i}": o for i, o in enumerate(self.blocks)}
+        if comment:
+            parts.append(f"(?P<comment>{re.escape(comment)}.*)")
+        for q in strings:
+            q = re.escape(q)
+            parts.append(f"(?P<s{len(parts)}>{q}(?:\\\\.|[^{q}\\\\])*{q})")
+        parts.append(r"(?P<keyword>\b(?:%s)\b)" % "|".join(keywords.split()))
+        self.pattern = re.compile("|".join(parts), re.IGNORECASE if ignore_case else 0)
+
+    def lex(self, line, state=None):
+        """(start, end, tag) spans of one line and the state after it"""
+        spans = []
+        pos = 0
+        if state:
+            closer, tag = self.blocks[state]
+            end = line.find(closer)
+            if end < 0:
+                return [(0, len(line), tag)] if line else [], state
+            pos = end + len(closer)
+            spans.append((0, pos, tag))
+
+        for m in self.pattern.finditer(line, pos):
+            kind = m.lastgroup
+            if kind in self._openers:
+                opener = self._openers[kind]
+                tag = self.blocks[opener][1]
+                if m.end() - m.start() == len(opener):
+                    # Not closed on this line: runs on into the next
+                    spans.append((m.start(), len(line), tag))
+                    return spans, opener
+                spans.append((m.start(), m.end(), tag))
+            elif kind[0] == "s":
+                spans.append((m.start(), m.end(), "string"))
+            else:
+                spans.append((m.start(), m.end(), kind))
+        return spans, None
+
+    def next_state(self, line, state):
+        """State after line, skipping the full lex when it cannot change"""
+        if state:
+            if self.blocks[state][0] not in line:
+                return state
+        elif not any(o in line for o in self.blocks):
+            return None
+        return self.lex(line, state)[1]
+
+
+_C_BLOCK = {"/*": ("*/", "comment")}
+
+LEXERS = {
+    "python": Lexer(
+        "python",
+        "def class if else elif for while try except finally with import from as return "
+        "yield lambda None True False and or not in is pass break continue raise global "
+        "nonlocal assert del async await match case",
+        comment="#",
+        blocks={'"""': ('"""', "string"), "'''": ("'''", "string")}),
+    "c": Lexer(
+        "c",
+        "auto break case char const continue default do double else enum extern float for "
+        "goto if inline int long register restrict return short signed sizeof static struct "
+        "switch typedef union unsigned void volatile while bool true false NULL "
+        "class namespace template typename public private protected virtual override new "
+        "delete this try catch throw using nullptr constexpr",
+        comment="//", blocks=_C_BLOCK),
+    "java": Lexer(
+        "java",
+        "abstract assert boolean break byte case catch char class const continue default do "
+        "double else enum extends final finally float for if implements import instanceof "
+        "int interface long native new package private protected public return short static "
+        "super switch synchronized this throw throws try void volatile while true false null "
+        "var record",
+        comment="//", blocks=_C_BLOCK),
+    "csharp": Lexer(
+        "csharp",
+        "abstract as base bool break byte case catch char class const continue decimal "
+        "default delegate do double else enum event explicit extern false finally float for "
+        "foreach if implicit in int interface internal is lock long namespace new null object "
+        "out override params private protected public readonly ref return sealed short static "
+        "string struct switch this throw true try typeof uint ulong using var virtual void "
+        "while async await",
+        comment="//", blocks=_C_BLOCK),
+    "javascript": Lexer(
+        "javascript",
+        "break case catch class const continue debugger default delete do else export extends "
+        "finally for function if import in instanceof let new return super switch this throw "
+        "try typeof var void while with yield async await of null undefined true false "
+        "interface type enum implements",
+        comment="//", strings=('"', "'", "`"), blocks=_C_BLOCK),
+    "go": Lexer(
+        "go",
+        "break case chan const continue default defer else fallthrough for func go goto if "
+        "import interface map package range return select struct switch type var nil true false",
+        comment="//", strings=('"', "`"), blocks=_C_BLOCK),
+    "rust": Lexer(
+        "rust",
+        "as break const continue crate else enum extern false fn for if impl in let loop match "
+        "mod move mut pub ref return self Self static struct super trait true type unsafe use "
+        "where while async await dyn",
+        comment="//", strings=('"',), blocks=_C_BLOCK),
+    "shell": Lexer(
+        "shell",
+        "if then else elif fi case esac for while until do done in function select return "
+        "local export",
+        comment="#"),
+    "sql": Lexer(
+        "sql",
+        "select from where and or not insert into values update set delete create table drop "
+        "alter index join left right inner outer on group by order having as distinct union "
+        "all null is in like between case when then else end primary key foreign references",
+        comment="--", strings=("'",), blocks=_C_BLOCK, ignore_case=True),
+}
+
+EXTENSIONS = {
+    ".py": "python", ".pyw": "python",
+    ".c": "c", ".h": "c", ".cc": "c", ".cpp": "c", ".cxx": "c", ".hpp": "c",
+    ".java": "java", ".kt": "java", ".scala": "java",
+    ".cs": "csharp",
+    ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript",
+    ".ts": "javascript", ".tsx": "javascript",
+    ".go": "go",
+    ".rs": "rust",
+    ".sh": "shell", ".bash": "shell", ".zsh": "shell",
+    ".sql": "sql",
+}
+
+
+def lexer_for(path):
+    """Lexer for a file name; Python for anything unknown"""
+    return LEXERS[EXTENSIONS.get(os.path.splitext(path or "")[1].lower(), "python")]
+
+
+class Highlighter:
+    """Lexes lines of one document on demand
+
+    states[i] is the lexer state at the start of line i, known for lines
+    up to len(states) - 1. An edit only has to invalidate from its first
+    line; lexed spans are cached and reused while a line and its state
+    are unchanged.
+    """
+
+    def __init__(self, doc, lexer):
+        self.doc = doc
+        self.lexer = lexer
+        self.states = [None]
+        self._spans = {}      # line -> (text, state, spans)
+
+    def invalidate(self, line):
+        """Line and everything after it may have changed"""
+        del self.states[line + 1:]
+
+    def state_at(self, line):
+        states, doc, next_state = self.states, self.doc, self.lexer.next_state
+        for i in range(len(states) - 1, min(line, len(doc))):
+            states.append(next_state(doc[i], states[i]))
+        return states[min(line, len(states) - 1)]
+
+    def spans(self, line):
+        """(start, end, tag) spans of a document line"""
+        text, state = self.doc[line], self.state_at(line)
+        hit = self._spans.get(line)
+        if hit and hit[0] is text and hit[1] == state:
+            return hit[2]
+        spans = self.lexer.lex(text, state)[0]
+        if len(self._spans) >= MAX_CACHED:
+            self._spans.clear()
+        self._spans[line] = (text, state, spans)
+        return spans
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Cell-level spreadsheet compare for Beyond Compare + Meld Clone
+Sheets are read as columns of strings, rows are aligned by a key column or
+by row hash, and cells are compared a whole block at a time
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from diffcore import _pair_lines, get_opcodes
+
+
+def read_sheets(path):
+    """{sheet name: DataFrame of str} for a workbook or a CSV/TSV file
+
+    Every cell is read as text, so "1" and "1.0" only match if the files
+    agree, and empty cells are "". Sheets are held whole in memory.
+    """
+    if path.lower().endswith((".csv", ".tsv")):
+        sep = "\t" if path.lower().endswith(".tsv") else ","
+        try:
+            df = pd.read_csv(path, sep=sep, dtype=str, keep_default_na=False,
+                             encoding_errors="replace")
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame()
+        return {os.path.basename(path): df}
+    return pd.read_excel(path, sheet_name=None, dtype=str, keep_default_na=False)
+
+
+def sheet_lines(sheets):
+    """Tab-separated lines of every sheet, for showing a workbook as text"""
+    lines = []
+    for name, df in sheets.items():
+        if len(sheets) > 1:
+            lines.append(f"## {name}")
+        lines.append("\t".join(map(str, df.columns)))
+        lines.extend("\t".join(row) for row in df.itertuples(index=False, name=None))
+    return lines
+
+
+def table_lines(path):
+    """Lines of a workbook or CSV/TSV file, as the format handler's text"""
+    return sheet_lines(read_sheets(path))
+
+
+@dataclass
+class CellChange:
+    row: str                  # key value, or "left row → right row" (1-based)
+    column: str
+    left: str
+    right: str
+
+
+@dataclass
+class SheetDiff:
+    name: str
+    columns_added: List[str] = field(default_factory=list)
+    columns_removed: List[str] = field(default_factory=list)
+    rows_added: List[str] = field(default_factory=list)       # keys or right rows
+    rows_removed: List[str] = field(default_factory=list)     # keys or left rows
+    cells: List[CellChange] = field(default_factory=list)
+
+    @property
+    def identical(self):
+        return not (self.columns_added or self.columns_removed or self.rows_added
+                    or self.rows_removed or self.cells)
+
+
+@dataclass
+class TableDiff:
+    left: str
+    right: str
+    key: Optional[str] = None
+    sheets_added: List[str] = field(default_factory=list)
+    sheets_removed: List[str] = field(default_factory=list)
+    sheets: List[SheetDiff] = field(default_factory=list)
+
+    @property
+    def identical(self):
+        return not (self.sheets_added or self.sheets_removed) and all(s.identical for s in self.sheets)
+
+    def changes(self):
+        """(sheet, change, row, column, left, right) for every difference"""
+        for name in self.sheets_removed:
+            yield name, "Sheet removed", "", "", "", ""
+        for name in self.sheets_added:
+            yield name, "Sheet added", "", "", "", ""
+        for s in self.sheets:
+            for c in s.columns_removed:
+                yield s.name, "Column removed", "", c, "", ""
+            for c in s.columns_added:
+                yield s.name, "Column added", "", c, "", ""
+            for r in s.rows_removed:
+                yield s.name, "Row removed", r, "", "", ""
+            for r in s.rows_added:
+                yield s.name, "Row added", r, "", "", ""
+            for c in s.cells:
+                yield s.name, "Cell changed", c.row, c.column, c.left, c.right
+
+    def report(self):
+        """Plain-text report lines"""
+        for name in self.sheets_removed:
+            yield f"Sheet removed: {name}"
+        for name in self.sheets_added:
+            yield f"Sheet added: {name}"
+        for s in self.sheets:
+            if s.identical:
+                continue
+            yield f"[{s.name}]"
+            for c in s.columns_removed:
+                yield f"  column removed: {c}"
+            for c in s.columns_added:
+                yield f"  column added: {c}"
+            for r in s.rows_removed:
+                yield f"  - row {r}"
+            for r in s.rows_added:
+                yield f"  + row {r}"
+            for c in s.cells:
+                yield f"  ~ row {c.row}, {c.column}: {c.left!r} → {c.right!r}"
+
+
+def _values(df, cols):
+    return df[cols].to_numpy(dtype=object)
+
+
+def _cells(sheet, lv, rv, cols, labels):
+    """Record the differing cells of two equally shaped value blocks"""
+    rows, cidx = np.nonzero(lv != rv)
+    for i, j in zip(rows.tolist(), cidx.tolist()):
+        sheet.cells.append(CellChange(labels[i], cols[j], lv[i, j], rv[i, j]))
+
+
+def _by_key(sheet, left, right, key, cols):
+    # Repeated keys are told apart by their order of appearance
+    lk = pd.MultiIndex.from_arrays([left[key], left.groupby(key, sort=False).cumcount()])
+    rk = pd.MultiIndex.from_arrays([right[key], right.groupby(key, sort=False).cumcount()])
+    left, right = left.set_axis(lk), right.set_axis(rk)
+
+    def label(k):
+        return str(k[0]) if not k[1] else f"{k[0]} #{k[1] + 1}"
+
+    sheet.rows_removed = [label(k) for k in lk.difference(rk, sort=False)]
+    sheet.rows_added = [label(k) for k in rk.difference(lk, sort=False)]
+    common = lk.intersection(rk, sort=False)
+    cols = [c for c in cols if c != key]
+    if len(common) and cols:
+        _cells(sheet, _values(left.loc[common], cols), _values(right.loc[common], cols), cols,
+               [label(k) for k in common])
+
+
+def _by_hash(sheet, left, right, cols):
+    hl = pd.util.hash_pandas_object(left[cols], index=False).tolist() if cols else [0] * len(left)
+    hr = pd.util.hash_pandas_object(right[cols], index=False).tolist() if cols else [0] * len(right)
+    lv, rv = _values(left, cols), _values(right, cols)
+    for tag, i1, i2, j1, j2 in get_opcodes(hl, hr, algorithm="histogram"):
+        if tag == "equal":
+            continue
+        # Rows of a replaced block are paired by similarity and compared cell
+        # by cell; rows left without a partner were removed or added
+        if tag == "replace" and cols:
+            rows = _pair_lines(["\t".join(row) for row in lv[i1:i2]],
+                               ["\t".join(row) for row in rv[j1:j2]])
+        else:
+            rows = [(i, -1) for i in range(i2 - i1)] + [(-1, j) for j in range(j2 - j1)]
+        pairs = [(i1 + i, j1 + j) for i, j in rows if i >= 0 and j >= 0]
+        if pairs:
+            li, ri = zip(*pairs)
+            _cells(sheet, lv[list(li)], rv[list(ri)], cols,
+                   [f"{i + 2} → {j + 2}" for i, j in pairs])
+        sheet.rows_removed.extend(str(i1 + i + 2) for i, j in rows if j < 0)
+        sheet.rows_added.extend(str(j1 + j + 2) for i, j in rows if i < 0)
+
+
+def compare_sheet(name, left, right, key=None):
+    """Compare two DataFrames; rows align on key if both have it, else by content"""
+    sheet = SheetDiff(name)
+    lcols, rcols = list(map(str, left.columns)), list(map(str, right.columns))
+    left, right = left.set_axis(lcols, axis=1), right.set_axis(rcols, axis=1)
+    sheet.columns_removed = [c for c in lcols if c not in rcols]
+    sheet.columns_added = [c for c in rcols if c not in lcols]
+    cols = [c for c in lcols if c in rcols]
+    if key and key in cols:
+        _by_key(sheet, left, right, key, cols)
+    else:
+        _by_hash(sheet, left, right, cols)
+    return sheet
+
+
+def compare_tables(left_path, right_path, key=None):
+    """Compare every sheet of two workbooks or CSV files and return a TableDiff"""
+    ls, rs = read_sheets(left_path), read_sheets(right_path)
+    res = TableDiff(left_path, right_path, key)
+    if len(ls) == len(rs) == 1:
+        # Single sheets (CSV files) are compared whatever they are called
+        (ln, ldf), (rn, rdf) = next(iter(ls.items())), next(iter(rs.items()))
+        res.sheets.append(compare_sheet(ln if ln == rn else f"{ln} ↔ {rn}", ldf, rdf, key))
+        return res
+    res.sheets_removed = [n for n in ls if n not in rs]
+    res.sheets_added = [n for n in rs if n not in ls]
+    for name, df in ls.items():
+        if name in rs:
+            res.sheets.append(compare_sheet(name, df, rs[name], key))
+    return res
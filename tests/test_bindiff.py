@@ -0,0 +1,56 @@
+import random
+import time
+
+from bindiff import diff_maps
+
+
+def rebuild(a, b, res):
+    """Apply the regions of a BinDiff to a, taking the new bytes from b"""
+    out, pos = bytearray(), 0
+    for r in res.regions:
+        assert pos <= r.a0 <= r.a1
+        out += a[pos:r.a0] + b[r.b0:r.b1]
+        pos = r.a1
+    return bytes(out + a[pos:])
+
+
+def test_random_replacement_is_one_region():
+    rnd = random.Random(1)
+    a = rnd.randbytes(1 << 20)
+    b = a[:400_000] + rnd.randbytes(3000) + a[404_096:]
+    start = time.perf_counter()
+    res = diff_maps(a, b)
+    assert time.perf_counter() - start < 2
+    assert len(res.regions) == 1
+    assert rebuild(a, b, res) == b
+
+
+def test_small_edits_are_narrowed_down():
+    rnd = random.Random(2)
+    a = rnd.randbytes(1 << 20)
+    b = bytearray(a)
+    b[600_000:600_003] = b"XYZW"
+    b[600_100] ^= 1
+    b = bytes(b)
+    res = diff_maps(a, b)
+    assert [(r.a0, r.a1, r.b0, r.b1) for r in res.regions] == [
+        (600_000, 600_003, 600_000, 600_004), (600_099, 600_100, 600_100, 600_101)]
+    assert rebuild(a, b, res) == b
+
+
+def test_regions_cover_every_difference():
+    rnd = random.Random(3)
+    for _ in range(50):
+        a = rnd.randbytes(rnd.randint(0, 100_000))
+        b = bytearray(a)
+        for _ in range(rnd.randint(0, 5)):
+            k = rnd.randint(0, len(b))
+            n = rnd.randint(1, 5000)
+            op = rnd.random()
+            if op < 0.3:
+                b[k:k] = rnd.randbytes(n)
+            elif op < 0.6:
+                del b[k:k + n]
+            else:
+                b[k:k + n] = rnd.randbytes(rnd.randint(1, 5000))
+        assert rebuild(a, bytes(b), diff_maps(a, bytes(b))) == bytes(b)
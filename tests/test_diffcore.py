@@ -0,0 +1,162 @@
+import os
+import random
+import time
+
+import pytest
+
+import diffcore
+from diffcore import (DIFF_ALGORITHMS, Alignment, DiffItems, MergeJournal, compare_text,
+                      get_opcodes, iter_tree)
+
+
+def apply_opcodes(a, b, codes):
+    """Rebuild b from a and the opcodes, checking equal runs really match"""
+    out = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal":
+            assert a[i1:i2] == b[j1:j2]
+            out.extend(a[i1:i2])
+        else:
+            out.extend(b[j1:j2])
+    return out
+
+
+def test_myers_divergent_input_is_fast():
+    rnd = random.Random(7)
+    a = [f"line {rnd.randrange(10 ** 9)}" for _ in range(50_000)]
+    b = list(a)
+    for k in rnd.sample(range(len(b)), len(b) // 10):
+        b[k] = f"changed {rnd.randrange(10 ** 9)}"
+    start = time.perf_counter()
+    codes = get_opcodes(a, b, "myers")
+    assert time.perf_counter() - start < 5
+    assert apply_opcodes(a, b, codes) == b
+
+
+def test_myers_shuffled_input_is_fast():
+    # Every line has a match somewhere, so nothing is discarded up front
+    rnd = random.Random(3)
+    a = [str(rnd.randrange(50)) for _ in range(20_000)]
+    b = [str(rnd.randrange(50)) for _ in range(20_000)]
+    start = time.perf_counter()
+    codes = get_opcodes(a, b, "myers")
+    assert time.perf_counter() - start < 10
+    assert apply_opcodes(a, b, codes) == b
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_unreadable_pair_is_different(tmp_path, jobs):
+    left, right = tmp_path / "l", tmp_path / "r"
+    for side in (left, right):
+        side.mkdir()
+        (side / "ok.txt").write_text("same\n")
+        # Dangling links of equal length get past the size check, then fail to open
+        os.symlink(side / "missing", side / "broken")
+    entries = list(iter_tree(str(left), str(right), jobs=jobs, use_cache=False))
+    assert [(e.status, e.path) for e in entries] == [
+        ("Different", "broken"), ("Identical", "ok.txt")]
+
+
+def hunks(items):
+    return list(zip(items.starts, items.stops, items.offsets))
+
+
+def expected_offsets(spans):
+    out, total = [], 0
+    for s, e in spans:
+        out.append((s, e, total))
+        total += e - s
+    return out
+
+
+@pytest.mark.parametrize("shift_rows", [0, 10 ** 9])
+def test_hunks_shift_and_splice(monkeypatch, shift_rows):
+    # SHIFT_ROWS 0 takes the NumPy path for every shift
+    monkeypatch.setattr(diffcore, "SHIFT_ROWS", shift_rows)
+    rnd = random.Random(3)
+    for _ in range(300):
+        spans, row = [], 0
+        for _ in range(rnd.randint(0, 8)):
+            row += rnd.randint(1, 5)
+            spans.append((row, row + rnd.randint(1, 4)))
+            row = spans[-1][1]
+        items = DiffItems(Alignment([], []))
+        for s, e in spans:
+            items.add_hunk(s, e)
+
+        at, n = rnd.randint(0, row + 2), rnd.randint(1, 5)
+        items.shift(at, n)
+        spans = [(s + n, e + n) if s >= at else (s, e + n if e > at else e) for s, e in spans]
+        assert hunks(items) == expected_offsets(spans)
+
+        # Replace the hunks on rows [a, b) with one hunk of new length
+        a = rnd.randint(0, row)
+        b = rnd.randint(a, row + n)
+        sub = DiffItems(Alignment([""] * 4, []))
+        sub.align.index[0].extend(range(rnd.randint(0, 4)))
+        if len(sub.align.index[0]) > 1:
+            sub.add_hunk(1, len(sub.align.index[0]))
+        items.splice(a, b, sub)
+        grow = len(sub.align) - (b - a)
+        spans = ([(s, e) for s, e in spans if e <= a] + [(s + a, e + a) for s, e in zip(sub.starts, sub.stops)]
+                 + [(s + grow, e + grow) for s, e in spans if s >= b])
+        assert hunks(items) == expected_offsets(spans)
+
+
+def edited(rnd, a, alphabet):
+    b = list(a)
+    for _ in range(rnd.randint(0, 6)):
+        k = rnd.randint(0, len(b))
+        op = rnd.random()
+        if op < 0.4:
+            b.insert(k, rnd.choice(alphabet))
+        elif op < 0.8:
+            del b[k:k + rnd.randint(1, 3)]
+        elif b:
+            b[min(k, len(b) - 1)] = rnd.choice(alphabet)
+    return b
+
+
+@pytest.mark.parametrize("algorithm", DIFF_ALGORITHMS)
+def test_opcodes_rebuild_b(algorithm):
+    rnd = random.Random(11)
+    for _ in range(500):
+        alphabet = [str(k) for k in range(rnd.choice((3, 10, 1000)))]
+        a = [rnd.choice(alphabet) for _ in range(rnd.randint(0, 30))]
+        b = edited(rnd, a, alphabet) if rnd.random() < 0.8 else [rnd.choice(alphabet) for _ in a]
+        codes = get_opcodes(a, b, algorithm)
+        assert apply_opcodes(a, b, codes) == b
+        # The opcodes cover both sides end to end, without gaps
+        assert [c[1] for c in codes[1:]] == [c[2] for c in codes[:-1]]
+        assert [c[3] for c in codes[1:]] == [c[4] for c in codes[:-1]]
+        if a or b:
+            assert (codes[0][1], codes[0][3], codes[-1][2], codes[-1][4]) == (0, 0, len(a), len(b))
+
+
+def state(res):
+    al, items = res.align, res.items
+    return (list(al.docs[0]), list(al.docs[1]), [list(x) for x in al.index + al.tags],
+            hunks(items))
+
+
+def test_journal_undo_redo_round_trips():
+    rnd = random.Random(5)
+    alphabet = [f"line {k}" for k in range(40)]
+    for _ in range(100):
+        a = [rnd.choice(alphabet) for _ in range(rnd.randint(1, 40))]
+        res = compare_text(a, edited(rnd, a, alphabet) + edited(rnd, [], alphabet))
+        journal = MergeJournal()
+        states = [state(res)]
+        while res.items and len(states) < 4:
+            h = rnd.randrange(len(res.items.starts))
+            journal.copy(res.align, res.items, rnd.randint(0, 1),
+                         res.items.starts[h], res.items.stops[h])
+            states.append(state(res))
+        for expect in reversed(states[:-1]):
+            journal.undo(res.align, res.items)
+            assert state(res) == expect
+        assert journal.undo(res.align, res.items) is None
+        for expect in states[1:]:
+            journal.redo(res.align, res.items)
+            assert state(res) == expect
+        assert journal.redo(res.align, res.items) is None
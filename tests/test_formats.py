@@ -0,0 +1,28 @@
+import zipfile
+
+import pytest
+
+from formats import detect_type
+
+ODF = "application/vnd.oasis.opendocument."
+
+
+def write_zip(path, entries):
+    with zipfile.ZipFile(path, "w") as z:
+        for name, data in entries:
+            z.writestr(name, data)
+    return str(path)
+
+
+@pytest.mark.parametrize("entries, kind", [
+    ([("[Content_Types].xml", "<Types/>"), ("word/document.xml", "<w:document/>")], "docx"),
+    ([("[Content_Types].xml", "<Types/>"), ("ppt/presentation.xml", "<p:presentation/>")], "docx"),
+    ([("mimetype", ODF + "text"), ("content.xml", "<office:document-content/>")], "docx"),
+    ([("mimetype", ODF + "presentation"), ("content.xml", "<office:document-content/>")], "docx"),
+    ([("[Content_Types].xml", "<Types/>"), ("xl/workbook.xml", "<workbook/>")], "excel"),
+    # A spreadsheet's content.xml is not read as a document
+    ([("mimetype", ODF + "spreadsheet"), ("content.xml", "<office:document-content/>")], "binary"),
+    ([("readme.txt", "hello")], "binary"),
+])
+def test_extensionless_archives_are_sniffed(tmp_path, entries, kind):
+    assert detect_type(write_zip(tmp_path / "document", entries)) == kind
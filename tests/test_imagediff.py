@@ -0,0 +1,35 @@
+import pytest
+from PIL import Image
+
+import imagediff
+
+
+def save(path, color, size=(300, 200)):
+    Image.new("RGB", size, color).save(path)
+    return str(path)
+
+
+def test_changed_pixels_are_counted(tmp_path):
+    left = save(tmp_path / "l.png", "red")
+    right = save(tmp_path / "r.png", "red", (300, 210))
+    res = imagediff.compare_images(left, right)
+    assert (res.changed, res.total) == (3000, 63000)
+    assert res.boxes == [(0, 200, 300, 210)]
+
+
+def test_images_over_the_limit_are_refused(tmp_path, monkeypatch):
+    left, right = save(tmp_path / "l.png", "red"), save(tmp_path / "r.png", "blue")
+    monkeypatch.setattr(imagediff, "MAX_PIXELS", 50_000)
+    with pytest.raises(ValueError, match="pixel limit"):
+        imagediff.compare_images(left, right)
+
+
+def test_pillow_limit_is_left_alone(tmp_path, monkeypatch):
+    # Above Pillow's limit, but within MAX_PIXELS
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 10_000)
+    left, right = save(tmp_path / "l.png", "red"), save(tmp_path / "r.png", "red")
+    # Tiles are cropped under Pillow's limit as usual
+    assert imagediff.compare_images(left, right, tile=100).identical
+    assert Image.MAX_IMAGE_PIXELS == 10_000
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(left)
@@ -0,0 +1,37 @@
+from merge3 import merge3
+
+BASE = ["a", "b", "c", "d", "e"]
+
+
+def tags(res):
+    return [h.tag for h in res.hunks]
+
+
+def test_one_sided_changes_merge_cleanly():
+    res = merge3(BASE, ["a", "B", "c", "d", "e"], ["a", "b", "c", "d", "E", "f"])
+    assert not res.conflicts
+    assert list(res.lines()) == ["a", "B", "c", "d", "E", "f"]
+
+
+def test_same_change_on_both_sides_is_taken_once():
+    side = ["a", "b", "X", "d", "e"]
+    res = merge3(BASE, side, list(side))
+    assert tags(res) == ["same", "both", "same"]
+    assert list(res.lines()) == side
+
+
+def test_conflicting_edits_are_reported():
+    res = merge3(BASE, ["a", "L", "c", "d", "e"], ["a", "R", "c", "d", "e"])
+    assert tags(res) == ["same", "conflict", "same"]
+    assert res.unresolved == 1
+    assert list(res.lines()) == ["a", "<<<<<<< left", "L", "||||||| base", "b", "=======",
+                                 "R", ">>>>>>> right", "c", "d", "e"]
+    res.conflicts[0].choice = "both"
+    assert res.unresolved == 0
+    assert list(res.lines()) == ["a", "L", "R", "c", "d", "e"]
+
+
+def test_touching_edits_conflict():
+    # Changes to adjacent base lines overlap, as in diff3
+    res = merge3(BASE, ["a", "B", "c", "d", "e"], ["a", "b", "C", "d", "e"])
+    assert tags(res) == ["same", "conflict", "same"]
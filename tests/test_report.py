@@ -0,0 +1,118 @@
+import difflib
+import json
+import os
+import random
+import shutil
+import subprocess
+
+import pytest
+
+from cli import main
+from report import file_patch
+from streamdiff import stream_unified
+
+CASES = [
+    ("a\nb\nc\n", "a\nB\nc\n"),
+    ("a\nb\nc\n", "a\nB\nc"),
+    ("a\nb\nc", "a\nB\nc\n"),
+    ("a\nb\nc\n", "a\nb\nc"),
+    ("a\nb\nc", "a\nb\nc\n"),
+    ("a\n", "a\nb"),
+    ("", "a\n"),
+    ("a", ""),
+    ("", "\n"),
+    ("x\n" * 20 + "y", "x\n" * 10 + "z\n" + "x\n" * 9 + "y\n"),
+]
+
+
+def expected(x, y, left, right):
+    """difflib's unified diff, with the markers it leaves out"""
+    out = []
+    for line in difflib.unified_diff(x.splitlines(True), y.splitlines(True), left, right):
+        if line.startswith(("---", "+++")):
+            out.append(line.rstrip("\n"))
+        elif line.endswith("\n"):
+            out.append(line[:-1])
+        else:
+            out += [line, "\\ No newline at end of file"]
+    return out
+
+
+def write_pair(tmp_path, x, y):
+    left, right = tmp_path / "left.txt", tmp_path / "right.txt"
+    left.write_bytes(x.encode())
+    right.write_bytes(y.encode())
+    return str(left), str(right)
+
+
+@pytest.mark.parametrize("x, y", CASES)
+def test_cli_unified_matches_difflib(tmp_path, capsys, x, y):
+    left, right = write_pair(tmp_path, x, y)
+    code = main(["--left", left, "--right", right, "--no-cache"])
+    assert code == (0 if x == y else 1)
+    assert capsys.readouterr().out.splitlines() == expected(x, y, left, right)
+
+
+def test_cli_exit_codes(tmp_path, capsys):
+    same, other = write_pair(tmp_path, "a\nb\n", "a\nc\n")
+    assert main(["--left", same, "--right", same, "--no-cache"]) == 0
+    assert main(["--left", same, "--right", other, "--no-cache"]) == 1
+    assert main(["--left", same, "--right", str(tmp_path / "missing"), "--no-cache"]) == 2
+    assert main(["--left", same, "--right", str(tmp_path), "--no-cache"]) == 2
+    assert "codeCompare:" in capsys.readouterr().err
+
+
+def test_cli_json_reports_file_lines(tmp_path, capsys):
+    # A deletion then an insertion: d is line 3 of the right file, on pane row 4
+    left, right = write_pair(tmp_path, "a\nb\nc\n", "a\nc\nd\n")
+    assert main(["--left", left, "--right", right, "--format", "json", "--no-cache"]) == 1
+    diffs = json.loads(capsys.readouterr().out)["differences"]
+    assert diffs == [{"type": "removed", "left": 2, "old": "b"},
+                     {"type": "added", "right": 3, "new": "d"}]
+    main(["--left", left, "--right", right, "--format", "jsonl", "--no-cache"])
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [{k: v for k, v in r.items() if k != "record"} for r in records[1:-1]] == diffs
+
+
+def test_cli_folder_patch_names_files_like_diff(tmp_path, capsys):
+    left, right = tmp_path / "L", tmp_path / "R"
+    for path, text in ((left / "top.txt", "x\n"), (right / "new" / "n.txt", "y\n"),
+                       (left / "a.txt", "1\n"), (right / "a.txt", "2\n")):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    assert main(["--left", str(left), "--right", str(right), "--no-cache"]) == 1
+    out = capsys.readouterr().out.splitlines()
+    assert f"Only in {os.path.join(right, 'new')}: n.txt" in out
+    assert f"Only in {left}: top.txt" in out
+    assert f"--- {os.path.join(left, 'a.txt')}" in out
+
+
+@pytest.mark.parametrize("window", [20_000, 64])
+def test_stream_unified_matches_difflib(tmp_path, window):
+    rnd = random.Random(9)
+    for _ in range(200):
+        # Unique lines, so there is only one shortest diff to find
+        a = sorted(rnd.sample(range(200), rnd.randint(0, 60)))
+        b = [k for k in a if rnd.random() > 0.2]
+        for k in rnd.sample(range(1000, 2000), rnd.randint(0, 4)):
+            b.insert(rnd.randint(0, len(b)), k)
+        x = "".join(f"{k}\n" for k in a)
+        y = "".join(f"{k}\n" for k in b)
+        if rnd.random() < 0.3:
+            y = y[:-1]
+        left, right = write_pair(tmp_path, x, y)
+        got = list(stream_unified(left, right, window=window))
+        assert got == expected(x, y, left, right)
+
+
+@pytest.mark.skipif(not shutil.which("patch"), reason="needs patch")
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("x, y", CASES)
+def test_patch_applies(tmp_path, x, y, stream):
+    left, right = write_pair(tmp_path, x, y)
+    diff = tmp_path / "diff.patch"
+    diff.write_text("".join(line + "\n" for line in file_patch(left, right, use_cache=False,
+                                                              stream=stream)))
+    out = tmp_path / "out.txt"
+    subprocess.run(["patch", "-s", "-o", str(out), left, str(diff)], check=True)
+    assert out.read_bytes() == y.encode()
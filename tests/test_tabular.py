@@ -0,0 +1,25 @@
+import pandas as pd
+
+from tabular import compare_sheet
+
+
+def frame(names, values):
+    return pd.DataFrame({"name": names, "value": values})
+
+
+def test_replaced_rows_pair_by_similarity():
+    left = frame(["alpha", "beta", "gamma ray", "delta"], ["1", "2", "3", "4"])
+    right = frame(["alpha", "gamma ray", "delta"], ["1", "33", "4"])
+    sheet = compare_sheet("s", left, right)
+    # beta is gone; gamma ray moved up a row and changed its value
+    assert sheet.rows_removed == ["3"]
+    assert sheet.rows_added == []
+    assert [(c.row, c.column, c.left, c.right) for c in sheet.cells] == [
+        ("4 → 3", "value", "3", "33")]
+
+
+def test_unrelated_rows_are_removed_and_added():
+    left = frame(["alpha", "beta"], ["1", "2"])
+    right = frame(["alpha", "omega"], ["1", "9"])
+    sheet = compare_sheet("s", left, right)
+    assert (sheet.rows_removed, sheet.rows_added, sheet.cells) == (["3"], ["3"], [])